@@ -0,0 +1,95 @@
+"""
+Throughput of the concurrent inference dispatch in detection.py against a local stub inference server.
+
+The stub answers every request after --latency seconds, like a remote GPU server would. Batches of BATCH_SIZE
+frames are sent one request at a time (the old behaviour) and through run_inference_batch_, and frames per
+second are compared. --hang makes every Nth request never answer in time, to check a hung request is retried
+without the frames queued behind it timing out.
+
+Usage: python benchmarks/inference_benchmark.py [--frames N] [--latency SECONDS] [--hang N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detection
+from detection import run_workflow_, run_inference_batch_, BATCH_SIZE, MAX_IN_FLIGHT
+
+RESPONSE = json.dumps([{'consensus_predictions': {'predictions': []}}]).encode()
+
+
+def start_stub_server(latency, hang_every):
+    """Start the stub inference server on a free port, returns the server."""
+    counter = itertools.count(1)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            request_number = next(counter)
+            time.sleep(latency * (20 if hang_every and request_number % hang_every == 0 else 1))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(RESPONSE)))
+            self.end_headers()
+            self.wfile.write(RESPONSE)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StubClient:
+    """The part of InferenceHTTPClient detection.py uses, posting to the stub server."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def run_workflow(self, workspace_name, workflow_id, images):
+        body = json.dumps({'workspace': workspace_name, 'workflow': workflow_id, 'images': images}).encode()
+        with urllib.request.urlopen(urllib.request.Request(self.url, data=body, method='POST')) as response:
+            return json.load(response)
+
+
+def batches(frames):
+    image = 'A' * 200_000  # about the base64 size of a camera JPEG
+    return [[image] * min(BATCH_SIZE, frames - start) for start in range(0, frames, BATCH_SIZE)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent inference dispatch against a stub server")
+    parser.add_argument('--frames', type=int, default=48)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds the stub takes per request")
+    parser.add_argument('--hang', type=int, default=0, help="every Nth request takes 20x the latency")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency, args.hang)
+    client = StubClient(f"http://127.0.0.1:{server.server_port}/")
+    if args.hang:
+        detection.INFERENCE_TIMEOUT = args.latency * 5  # the hung requests time out, the queued ones must not
+
+    print(f"{args.frames} frames, {args.latency * 1000:.0f} ms per request, {MAX_IN_FLIGHT} in flight")
+    start = time.perf_counter()
+    for batch in batches(args.frames):
+        for image in batch:
+            run_workflow_(image, client)
+    sequential = time.perf_counter() - start
+    print(f"{'sequential':<12}{args.frames / sequential:>8.1f} frames/s")
+
+    start = time.perf_counter()
+    failed = 0
+    for batch in batches(args.frames):
+        failed += sum(result is None for result in run_inference_batch_(batch, client))
+    concurrent = time.perf_counter() - start
+    print(f"{'concurrent':<12}{args.frames / concurrent:>8.1f} frames/s  ({sequential / concurrent:.1f}x, {failed} failed)")
+    server.shutdown()
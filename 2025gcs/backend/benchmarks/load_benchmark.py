@@ -0,0 +1,137 @@
+"""
+Load test of the backend as served by the Flask development server and by serve.py (waitress).
+
+Starts the server on a local port, holds --streams /stream connections open like operator browsers do, then has
+--clients threads hammer a mix of heartbeat polls, gallery listings, thumbnails and full images for --duration
+seconds. Reports throughput and latency per endpoint. Only GET endpoints are used, nothing is written.
+
+Usage: python benchmarks/load_benchmark.py [--mode dev|waitress|both] [--clients 16] [--streams 4] [--duration 10]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import subprocess
+import statistics
+from threading import Thread, Event
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("dev", "waitress")
+STARTUP_TIMEOUT = 30  # seconds to wait for the server to answer
+THUMBNAILS = 50  # distinct images requested, their previews are generated during warm-up
+
+# (endpoint label, weight) of the request mix, roughly what the frontend sends
+REQUEST_MIX = (("heartbeat", 6), ("getImages", 2), ("thumb", 8), ("image", 1))
+
+def start_server(mode, port, threads):
+    if mode == "dev":
+        code = f"import server; server.start_services(); server.app.run(host='127.0.0.1', port={port})"
+        command = [sys.executable, "-c", code]
+    else:
+        command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--threads", str(threads)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/get_heartbeat", timeout=1)
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{mode} server did not start on port {port}")
+
+
+def hold_stream(base_url, stop):
+    """Keep an SSE connection open and drain it, like a browser tab."""
+    try:
+        with requests.get(f"{base_url}/stream", stream=True, timeout=(5, 30)) as response:
+            for _ in response.iter_lines():
+                if stop.is_set():
+                    break
+    except requests.exceptions.RequestException:
+        pass
+
+
+def client(base_url, images, deadline, results, seed):
+    rng = random.Random(seed)
+    labels = [label for label, _ in REQUEST_MIX]
+    weights = [weight for _, weight in REQUEST_MIX]
+    session = requests.Session()
+    while time.time() < deadline:
+        label = rng.choices(labels, weights)[0]
+        if label == "heartbeat":
+            url = f"{base_url}/get_heartbeat"
+        elif label == "getImages":
+            url = f"{base_url}/getImages"
+        elif label == "thumb":
+            url = f"{base_url}/images/{rng.choice(images)}?size=thumb"
+        else:
+            url = f"{base_url}/images/{rng.choice(images)}"
+
+        start = time.perf_counter()
+        try:
+            ok = session.get(url, timeout=30).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        results.append((label, time.perf_counter() - start, ok))
+
+
+def run(mode, args):
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_server(mode, port, args.threads)
+    stop = Event()
+    try:
+        images = requests.get(f"{base_url}/getImages", timeout=30).json().get("images", [])[:THUMBNAILS]
+        if not images:
+            raise SystemExit("The active session has no images to serve")
+        for name in images:  # warm-up, generates the thumbnails
+            requests.get(f"{base_url}/images/{name}?size=thumb", timeout=30)
+
+        streams = [Thread(target=hold_stream, args=(base_url, stop), daemon=True) for _ in range(args.streams)]
+        for thread in streams:
+            thread.start()
+        time.sleep(0.5)
+
+        results = []  # list.append is atomic, shared by every client thread
+        deadline = time.time() + args.duration
+        clients = [Thread(target=client, args=(base_url, images, deadline, results, seed)) for seed in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return results
+    finally:
+        stop.set()
+        process.terminate()
+        process.wait()
+
+
+def report(mode, results, duration):
+    print(f"\n{mode}: {len(results) / duration:.0f} requests/s")
+    print(f"{'endpoint':<12}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'errors':>8}")
+    for label, _ in REQUEST_MIX:
+        latencies = sorted(latency * 1000 for name, latency, _ in results if name == label)
+        errors = sum(1 for name, _, ok in results if name == label and not ok)
+        if not latencies:
+            continue
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{label:<12}{len(latencies) / duration:>8.0f}{statistics.median(latencies):>10.1f}{p95:>10.1f}"
+              f"{latencies[-1]:>10.1f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the dev server and serve.py under load")
+    parser.add_argument('--mode', choices=MODES + ("both",), default="both")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--streams', type=int, default=4, help="open /stream connections, one per operator browser")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=32, help="waitress request threads")
+    parser.add_argument('--port', type=int, default=5090)
+    args = parser.parse_args()
+
+    for mode in (MODES if args.mode == "both" else (args.mode,)):
+        report(mode, run(mode, args), args.duration)
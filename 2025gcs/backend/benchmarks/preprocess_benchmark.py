@@ -0,0 +1,47 @@
+"""
+Compares the inference preprocessing modes in detection.py: CPU time and upload bytes per frame.
+
+Usage: python benchmarks/preprocess_benchmark.py [image folder] [--repeat N]
+The image folder defaults to the active session's images.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection import encode_batch, PREPROCESS_MODES, BATCH_SIZE
+from sessions import session_manager
+
+
+def benchmark_mode(paths, mode, repeat):
+    """Encodes every image in batches of BATCH_SIZE, returns (wall seconds, CPU seconds, total bytes) per pass."""
+    wall, cpu, total_bytes = 0.0, 0.0, 0
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        encoded = []
+        for i in range(0, len(paths), BATCH_SIZE):
+            encoded.extend(encode_batch(paths[i:i + BATCH_SIZE], mode))
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+        total_bytes = sum(len(item[0]) for item in encoded if item is not None)
+    return wall / repeat, cpu / repeat, total_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inference preprocessing modes")
+    parser.add_argument('folder', nargs='?')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    args.folder = args.folder or session_manager.active().images_dir
+
+    paths = sorted(os.path.join(args.folder, name) for name in os.listdir(args.folder) if name.endswith('.jpg'))
+    if not paths:
+        sys.exit(f"No .jpg images in {args.folder}")
+    print(f"{len(paths)} images, {args.repeat} passes per mode")
+    print(f"{'mode':<10}{'wall ms/frame':>15}{'CPU ms/frame':>15}{'upload KB/frame':>18}")
+    for mode in PREPROCESS_MODES:
+        wall, cpu, total_bytes = benchmark_mode(paths, mode, args.repeat)
+        print(f"{mode:<10}{wall / len(paths) * 1000:>15.1f}{cpu / len(paths) * 1000:>15.1f}"
+              f"{total_bytes / len(paths) / 1024:>18.1f}")
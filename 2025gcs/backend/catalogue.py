@@ -0,0 +1,166 @@
+import os
+import json
+from bisect import bisect_left, insort
+from collections import deque
+from threading import Lock
+
+DELETED_HISTORY = 10000  # deleted names remembered for since= queries
+
+class ImageCatalogue:
+    """
+    In-memory index of the captured images and their telemetry JSON, keyed by file stem (00001 for 00001.jpg).
+
+    Built once from disk and then updated by the upload and delete endpoints, so listing images never touches
+    the disk. Every change bumps a revision number; clients pass the last revision they saw as since= and get
+    only entries changed after it, plus the images deleted since. If more deletions happened than
+    DELETED_HISTORY remembers, the result is flagged reset and the client should refetch everything.
+    """
+
+    def __init__(self, images_dir, image_data_dir):
+        self.images_dir = images_dir
+        self.image_data_dir = image_data_dir
+        self.lock = Lock()
+        self.entries = {}  # stem -> entry
+        self.stems = []  # sorted stems
+        self.revision = 0
+        self.deleted = deque(maxlen=DELETED_HISTORY)  # (revision, image name)
+        self.deleted_floor = 0  # deletions at or before this revision have been forgotten
+        self.rebuild()
+
+    # ========================= Indexing =========================
+    def entry_(self, stem):
+        """Return the entry for a stem, creating it if needed, the caller must hold the lock."""
+        entry = self.entries.get(stem)
+        if entry is None:
+            entry = {'image': stem + '.jpg', 'has_image': False, 'size': None, 'mtime': None, 'data': None, 'revision': 0}
+            self.entries[stem] = entry
+            insort(self.stems, stem)
+        return entry
+
+    def drop_(self, stem):
+        """Remove an entry that has neither image nor data, the caller must hold the lock."""
+        entry = self.entries.get(stem)
+        if entry is not None and not entry['has_image'] and entry['data'] is None:
+            del self.entries[stem]
+            del self.stems[bisect_left(self.stems, stem)]
+
+    def index_image_(self, file_name):
+        path = os.path.join(self.images_dir, file_name)
+        stat = os.stat(path)
+        entry = self.entry_(os.path.splitext(file_name)[0])
+        entry.update(has_image=True, size=stat.st_size, mtime=stat.st_mtime)
+        return entry
+
+    def index_data_(self, file_name):
+        with open(os.path.join(self.image_data_dir, file_name), 'r') as file:
+            data = json.load(file)
+        if not isinstance(data, dict):
+            print(f"Ignoring image data {file_name}, expected a JSON object but got {type(data).__name__}")
+            data = None
+        stem = os.path.splitext(file_name)[0]
+        entry = self.entry_(stem)
+        entry['data'] = data
+        self.drop_(stem)
+        return entry
+
+    def rebuild(self):
+        """Index everything on disk, used at startup."""
+        with self.lock:
+            self.entries = {}
+            self.stems = []
+            if os.path.isdir(self.images_dir):
+                with os.scandir(self.images_dir) as scan:
+                    for item in scan:
+                        if item.name.endswith('.jpg') and item.is_file():
+                            self.index_image_(item.name)
+            if os.path.isdir(self.image_data_dir):
+                with os.scandir(self.image_data_dir) as scan:
+                    for item in scan:
+                        if item.name.endswith('.json'):
+                            try:
+                                self.index_data_(item.name)
+                            except (OSError, ValueError) as e:
+                                print(f"Skipping unreadable image data {item.name}: {e}")
+            self.revision += 1
+            for entry in self.entries.values():
+                entry['revision'] = self.revision
+            # Anything deleted before the rebuild is unknown, force clients to refetch
+            self.deleted.clear()
+            self.deleted_floor = self.revision
+
+    # ========================= Updates =========================
+    def add_image(self, file_name):
+        """Index an image that has been written to the images folder, returns its mtime."""
+        with self.lock:
+            self.revision += 1
+            entry = self.index_image_(file_name)
+            entry['revision'] = self.revision
+            return entry['mtime']
+
+    def add_data(self, file_name):
+        """Index a telemetry JSON that has been written to the image data folder."""
+        with self.lock:
+            # Parsed before the revision is bumped, so an unreadable file changes nothing
+            entry = self.index_data_(file_name)
+            self.revision += 1
+            entry['revision'] = self.revision
+
+    def remove(self, image_name, data=True):
+        """Forget an image (and by default its telemetry) after it has been deleted from disk."""
+        stem = os.path.splitext(image_name)[0]
+        with self.lock:
+            entry = self.entries.get(stem)
+            if entry is None:
+                return
+            self.revision += 1
+            if entry['has_image']:
+                if len(self.deleted) == self.deleted.maxlen:
+                    self.deleted_floor = self.deleted[0][0]
+                self.deleted.append((self.revision, entry['image']))
+            entry.update(has_image=False, size=None, mtime=None, revision=self.revision)
+            if data:
+                entry['data'] = None
+            self.drop_(stem)
+
+    # ========================= Queries =========================
+    def query_(self, since, offset, limit, include):
+        with self.lock:
+            matches = [self.entries[stem] for stem in self.stems
+                       if include(self.entries[stem]) and (since is None or self.entries[stem]['revision'] > since)]
+            result = {
+                'revision': self.revision,
+                'total': len(matches),
+                'entries': matches[offset:offset + limit if limit is not None else None],
+            }
+            if since is not None:
+                result['reset'] = since < self.deleted_floor
+                result['deleted'] = [name for revision, name in self.deleted if revision > since]
+            return result
+
+    def images(self, since=None, offset=0, limit=None):
+        """Sorted images changed after revision since, as dicts with image, size and mtime."""
+        result = self.query_(since, offset, limit, lambda entry: entry['has_image'])
+        result['entries'] = [{'image': entry['image'], 'size': entry['size'], 'mtime': entry['mtime']}
+                             for entry in result['entries']]
+        return result
+
+    def image_data(self, since=None, offset=0, limit=None):
+        """Telemetry of the images changed after revision since, each with its image name added."""
+        result = self.query_(since, offset, limit, lambda entry: entry['data'] is not None)
+        result['entries'] = [dict(entry['data'], image=entry['image']) for entry in result['entries']]
+        return result
+
+    def get_data(self, image_name):
+        """Return a copy of the telemetry of one image, or None if it has none."""
+        with self.lock:
+            entry = self.entries.get(os.path.splitext(image_name)[0])
+            return dict(entry['data']) if entry is not None and entry['data'] is not None else None
+
+    def image_count(self):
+        with self.lock:
+            return sum(1 for entry in self.entries.values() if entry['has_image'])
+
+    def data_count(self):
+        with self.lock:
+            return sum(1 for entry in self.entries.values() if entry['data'] is not None)
+
@@ -0,0 +1,206 @@
+import numpy as np
+from collections import defaultdict
+from threading import Lock
+from geo import get_transformer
+
+CLUSTER_RADIUS = 6.0  # m, detections closer than this are neighbours (DBSCAN eps)
+MIN_DETECTIONS = 3  # detections within CLUSTER_RADIUS, itself included, that make a detection a core point (DBSCAN min_samples)
+
+class ClassClusters:
+    """
+    Incremental DBSCAN over the detections of one class, in UTM metres of the zone of its first detection.
+
+    Detections are hashed into a grid of CLUSTER_RADIUS cells, so finding the neighbours of a detection only
+    looks at the 3x3 cells around it. Core points are joined with a union-find as detections arrive, adding A
+    detection can only grow or merge clusters. Border points join the cluster of their nearest core point.
+    Detections in no cluster that are within CLUSTER_RADIUS of each other (too few to make a core point) are
+    grouped into one unclustered hypothesis, so two agreeing detections outrank a single stray one. Hypotheses
+    are ranked by total confidence, so a confident unclustered group beats a weak cluster.
+    """
+
+    def __init__(self, zone, northern):
+        self.zone = zone
+        self.northern = northern
+        self.to_utm = get_transformer(zone, northern, to_utm=True)
+        self.points = []  # (easting, northing, confidence) in detection store order
+        self.grid = defaultdict(list)  # (column, row) -> point indices
+        self.neighbours = []  # points within CLUSTER_RADIUS of each point, itself included
+        self.parent = []  # union-find over core points
+        self.summaries = None  # hypotheses, rebuilt after every change
+
+    def cell_(self, easting, northing):
+        return int(easting // CLUSTER_RADIUS), int(northing // CLUSTER_RADIUS)
+
+    def near_(self, easting, northing):
+        """Indices of the points within CLUSTER_RADIUS of a position."""
+        column, row = self.cell_(easting, northing)
+        found = []
+        for dc in (-1, 0, 1):
+            for dr in (-1, 0, 1):
+                for index in self.grid.get((column + dc, row + dr), ()):
+                    other_e, other_n, _ = self.points[index]
+                    if (other_e - easting) ** 2 + (other_n - northing) ** 2 <= CLUSTER_RADIUS ** 2:
+                        found.append(index)
+        return found
+
+    def is_core_(self, index):
+        return self.neighbours[index] >= MIN_DETECTIONS
+
+    def find_(self, index):
+        while self.parent[index] != index:
+            self.parent[index] = self.parent[self.parent[index]]  # path halving
+            index = self.parent[index]
+        return index
+
+    def union_(self, a, b):
+        root_a, root_b = self.find_(a), self.find_(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def add(self, lat, lon, confidence):
+        """Add one detection and update the clusters around it."""
+        easting, northing = self.to_utm.transform(lon, lat)
+        near = self.near_(easting, northing)
+        index = len(self.points)
+        self.points.append((easting, northing, confidence))
+        self.grid[self.cell_(easting, northing)].append(index)
+        self.neighbours.append(len(near) + 1)
+        self.parent.append(index)
+
+        # Points that just reached MIN_DETECTIONS join every core point within their radius
+        became_core = [index] if self.is_core_(index) else []
+        for other in near:
+            self.neighbours[other] += 1
+            if self.neighbours[other] == MIN_DETECTIONS:
+                became_core.append(other)
+        for core in became_core:
+            for other in self.near_(*self.points[core][:2]):
+                if other != core and self.is_core_(other):
+                    self.union_(core, other)
+        self.summaries = None
+
+    def hypotheses(self):
+        """Return every hypothesis of the class, highest total confidence first, clusters first on a tie."""
+        if self.summaries is not None:
+            return self.summaries
+
+        members = defaultdict(list)  # cluster root, or -(root + 1) for a group of detections in no cluster -> indices
+        unclustered = []
+        for index, (easting, northing, _) in enumerate(self.points):
+            if self.is_core_(index):
+                members[self.find_(index)].append(index)
+                continue
+            cores = [other for other in self.near_(easting, northing) if self.is_core_(other)]
+            if cores:
+                nearest = min(cores, key=lambda other: (self.points[other][0] - easting) ** 2 + (self.points[other][1] - northing) ** 2)
+                members[self.find_(nearest)].append(index)
+            else:
+                unclustered.append(index)
+
+        # Single linkage over the detections in no cluster, they have fewer than MIN_DETECTIONS neighbours each
+        group = {index: index for index in unclustered}
+        def root(index):
+            while group[index] != index:
+                group[index] = group[group[index]]
+                index = group[index]
+            return index
+        for index in unclustered:
+            for other in self.near_(*self.points[index][:2]):
+                if other in group:
+                    root_a, root_b = root(index), root(other)
+                    if root_a != root_b:
+                        group[max(root_a, root_b)] = min(root_a, root_b)
+        for index in unclustered:
+            members[-(root(index) + 1)].append(index)
+
+        to_lat_lon = get_transformer(self.zone, self.northern, to_utm=False)
+        summaries = []
+        for key, indices in members.items():
+            points = np.array([self.points[index] for index in indices])
+            position, weights = points[:, :2], points[:, 2]
+            # Confidence weighted centroid and covariance, unweighted if every confidence is zero
+            weights = weights if weights.sum() > 0 else np.ones(len(weights))
+            centroid = weights @ position / weights.sum()
+            offsets = position - centroid
+            covariance = (weights[:, None] * offsets).T @ offsets / weights.sum()
+            lon, lat = to_lat_lon.transform(centroid[0], centroid[1])
+            summaries.append({
+                'lat': lat,
+                'lon': lon,
+                'covariance': covariance.tolist(),  # m^2, [[east, east-north], [east-north, north]]
+                'count': len(indices),
+                'confidence': float(points[:, 2].sum()),
+                'mean_confidence': float(points[:, 2].mean()),
+                'clustered': key >= 0,
+                'detections': sorted(indices),  # indices into the class's detections
+            })
+        # Total confidence already weighs support, being a DBSCAN cluster only breaks ties
+        summaries.sort(key=lambda summary: (summary['confidence'], summary['clustered']), reverse=True)
+        self.summaries = summaries
+        return summaries
+
+
+class DetectionClusters:
+    """
+    Target hypotheses for every class of a detection store, kept in step with the store's journal records.
+
+    Register apply() as a store listener after rebuilding from the store's contents. Appends are clustered
+    incrementally, a deleted detection rebuilds only its class.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.classes = {}  # class name -> ClassClusters
+        self.detections = {}  # class name -> [(lat, lon, confidence)] mirroring the store
+
+    def rebuild(self, detections_by_class):
+        """Cluster a full copy of the store, e.g. DetectionStore.get_all()."""
+        with self.lock:
+            self.classes = {}
+            self.detections = {}
+            for class_name, detections in detections_by_class.items():
+                for detection in detections:
+                    self.add_(class_name, (detection['lat'], detection['lon'], detection.get('confidence', 1.0)))
+
+    def add_(self, class_name, detection):
+        """The caller must hold the lock."""
+        lat, lon, confidence = detection
+        self.detections.setdefault(class_name, []).append(detection)
+        clusters = self.classes.get(class_name)
+        if clusters is None:
+            clusters = self.classes[class_name] = ClassClusters(int((lon + 180) / 6) + 1, lat >= 0)
+        clusters.add(lat, lon, confidence)
+
+    def apply(self, record):
+        """Apply a detection store journal record."""
+        op = record['op']
+        with self.lock:
+            if op == 'append':
+                detection = record['detection']
+                self.add_(record['class'], (detection['lat'], detection['lon'], detection.get('confidence', 1.0)))
+            elif op == 'delete':
+                class_name = record['class']
+                remaining = self.detections.pop(class_name, [])
+                if 0 <= record['index'] < len(remaining):
+                    del remaining[record['index']]
+                self.classes.pop(class_name, None)
+                for detection in remaining:
+                    self.add_(class_name, detection)
+            elif op == 'clear':
+                self.classes = {}
+                self.detections = {}
+
+    def hypotheses(self, class_name=None):
+        """Return the hypotheses of one class as a list, or of every class as a dict of lists."""
+        with self.lock:
+            if class_name is not None:
+                clusters = self.classes.get(class_name)
+                return list(clusters.hypotheses()) if clusters is not None else []
+            return {name: list(clusters.hypotheses()) for name, clusters in self.classes.items()}
+
+    def best(self, class_name):
+        """Return the hypothesis to fly to for a class: the cluster with the highest total confidence, or None."""
+        if class_name is None:
+            return None
+        hypotheses = self.hypotheses(class_name)
+        return hypotheses[0] if hypotheses else None
@@ -5,91 +5,253 @@ import cv2
 import numpy as np
 import json
 from queue import Queue, Empty
-from threading import Thread, Event, enumerate
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from threading import Thread, Event, Lock
 from inference_sdk import InferenceHTTPClient
 from PIL import Image
 from dotenv import load_dotenv
-from helper import serialize, IMAGE_FOLDER, IMAGE_DATA_FOLDER
+from helper import serialize
+from geo import locate_target
+from sessions import session_manager
+from history import telemetry_history
 
-LAST_SCANNED_INDEX = 0
 BATCH_SIZE = 12
+POLL_INTERVAL = 2  # seconds between fallback scans of the image folder
+MAX_IN_FLIGHT = 4  # concurrent requests to the inference server
+INFERENCE_TIMEOUT = 30  # seconds a single request may run, not counting time queued
+INFERENCE_RETRIES = 2  # retries per image after the first attempt
+RETRY_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+PREPROCESS_MODES = ("original", "resize", "png")
+PREPROCESS_MODE = "original"  # default mode, "original" sends the camera JPEG as-is, "resize" downscales and re-encodes, "png" is the old path
+RESIZE_MAX_DIMENSION = 2048  # px, longest side of an image in "resize" mode
+RESIZE_JPEG_QUALITY = 90  # JPEG quality in "resize" mode
+STOP_TIMEOUT = 5  # seconds /AI-Shutdown waits for the workers, a batch in flight finishes in the background
+PREPROCESS_WORKERS = 4  # threads encoding images, cv2 releases the GIL while resizing and encoding
 THREAD_NAMES = ["ImageWatcher", "InferenceWorker", "GeomaticsWorker"]
 
 image_queue = Queue()
+inference_pool = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="InferenceRequest")
+preprocess_pool = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="Preprocess")
 detection_queue = Queue()
 stop_event = Event()  # Used to signal threads to stop
+watcher_active = Event()  # Set while the image watcher is running
+
+seen_images = set()  # Paths of images already queued for inference
+seen_images_lock = Lock()
 
 load_dotenv()
 
+def run_workflow_(base64_image : str, client : InferenceHTTPClient) -> list:
+    """Runs the detection workflow on a single image."""
+    return client.run_workflow(
+        workspace_name="suavcoco",
+        workflow_id="combined-models",
+        images={"image": base64_image}
+    )
+
+
+def request_inference_(base64_image : str, client : InferenceHTTPClient, started : Event, attempts : int) -> list:
+    """Pooled inference request, errors are retried in the same pool slot instead of queueing again."""
+    started.set()
+    backoff = RETRY_BACKOFF
+    for attempt in range(attempts):
+        try:
+            return run_workflow_(base64_image, client)
+        except Exception as e:
+            print(f"Inference attempt {attempt + 1} failed: {e!r}")
+            if attempt == attempts - 1 or stop_event.is_set():
+                raise
+            time.sleep(backoff)
+            backoff *= 2
+
+
+def submit_inference_(base64_image : str, client : InferenceHTTPClient, attempts : int = INFERENCE_RETRIES + 1) -> tuple:
+    """Queues an inference request, returns its future and an event set once it leaves the pool's queue."""
+    started = Event()
+    return inference_pool.submit(request_inference_, base64_image, client, started, attempts), started
+
+
+def await_inference_(request : tuple, base64_image : str, client : InferenceHTTPClient):
+    """Waits for an inference request, resubmitting it if it hangs. Returns None if every attempt fails.
+
+    INFERENCE_TIMEOUT counts from when the request starts, time spent queued behind other requests does not count.
+    A hung request keeps its pool slot (the HTTP call cannot be interrupted), so it uses up one of the attempts.
+    """
+    attempts = INFERENCE_RETRIES + 1
+    while True:
+        future, started = request
+        while not started.wait(0.1) and not future.done() and not stop_event.is_set():
+            pass
+        if stop_event.is_set() and not future.done():
+            future.cancel()  # Never runs if it is still queued
+            return None
+        try:
+            return future.result(timeout=INFERENCE_TIMEOUT)
+        except FuturesTimeoutError:
+            future.cancel()
+            attempts -= 1
+            print(f"Inference request timed out after {INFERENCE_TIMEOUT} s")
+            if attempts <= 0 or stop_event.is_set():
+                return None
+            request = submit_inference_(base64_image, client, attempts)
+        except Exception as e:
+            print(f"Inference failed: {e!r}")  # request_inference_ already retried it
+            return None
+
+
 def run_inference_batch_(base64_images : list[str], client : InferenceHTTPClient) -> list:
-    """Runs inference on a batch of images using the detection workflow."""
+    """Runs inference on a batch of images concurrently, results are in the same order as the images.
+    A frame that fails every attempt has a result of None."""
+    print(f"Workflow started for batch of {len(base64_images)} images")
+    start_time = time.time()
+
+    # At most MAX_IN_FLIGHT requests run at once, the rest wait in the pool's queue
+    requests = [submit_inference_(img, client) for img in base64_images]
+    results_total = [await_inference_(request, img, client) for request, img in zip(requests, base64_images)]
+
+    print(f"Workflow finished. Execution time: {time.time() - start_time:.2f} seconds")
+    return results_total
+
+
+def encode_original_(img_path : str) -> tuple[str, float]:
+    """Base64 encodes the image file unchanged."""
+    with open(img_path, 'rb') as file:
+        return base64.b64encode(file.read()).decode('utf-8'), 1.0
+
+
+def encode_resized_(img_path : str) -> tuple[str, float]:
+    """Downscales the image to RESIZE_MAX_DIMENSION and re-encodes it as JPEG.
+    Returns the base64 image and the factor mapping its pixels back to the original image."""
+    # Ignore EXIF orientation so pixel coordinates match the camera frame used by geo
+    image = cv2.imread(img_path, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("could not decode image")
+    height, width = image.shape[:2]
+    factor = 1.0
+    if max(height, width) > RESIZE_MAX_DIMENSION:
+        scale = RESIZE_MAX_DIMENSION / max(height, width)
+        new_width = round(width * scale)
+        image = cv2.resize(image, (new_width, round(height * scale)), interpolation=cv2.INTER_AREA)
+        factor = width / new_width
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, RESIZE_JPEG_QUALITY])
+    return base64.b64encode(buffer).decode('utf-8'), factor
+
+
+def encode_png_(img_path : str) -> tuple[str, float]:
+    """Decodes the image and re-encodes it as PNG (the original preprocessing, kept for comparison)."""
+    pil_image = Image.open(img_path)
+    cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    _, buffer = cv2.imencode('.png', cv_image)
+    return base64.b64encode(buffer).decode('utf-8'), 1.0
+
+
+ENCODERS = {"original": encode_original_, "resize": encode_resized_, "png": encode_png_}
+preprocess_mode = PREPROCESS_MODE  # mode used by the inference worker, see set_preprocess_mode
+
+
+def set_preprocess_mode(mode : str) -> None:
+    """Selects how the inference worker encodes images, one of PREPROCESS_MODES. Takes effect from the next batch."""
+    global preprocess_mode
+    if mode not in ENCODERS:
+        raise ValueError(f"Unknown preprocessing mode {mode!r}, expected one of {PREPROCESS_MODES}")
+    preprocess_mode = mode
+
+
+# GCS_PREPROCESS_MODE in the environment or .env overrides the default, e.g. "resize" on a slow uplink.
+# A typo falls back to the default rather than stopping the server from importing
+try:
+    set_preprocess_mode(os.getenv('GCS_PREPROCESS_MODE', PREPROCESS_MODE))
+except ValueError as e:
+    print(f"Warning: ignoring GCS_PREPROCESS_MODE. {e}, using {PREPROCESS_MODE!r}.")
+
+
+def encode_image_(img_path : str, mode : str) -> tuple:
+    """Encodes one image for inference, returns None if it cannot be read."""
     try:
-        print(f"Workflow started for batch of {len(base64_images)} images")
-        start_time = time.time()
-
-        results_total = []
-        for img in base64_images:
-            results = client.run_workflow(
-                workspace_name="suavcoco",
-                workflow_id="combined-models",
-                images={"image": img}
-            )
-            results_total.append(results)
-
-        print(f"Workflow finished. Execution time: {time.time() - start_time:.2f} seconds")
-        return results_total
+        return ENCODERS[mode](img_path)
     except Exception as e:
-        print(f"Inference error: {e}")
+        print(f"Error processing image {img_path}: {e}")
         return None
-    
+
+
+def encode_batch(batch : list[str], mode : str = None) -> list:
+    """Encodes a batch of images in the preprocessing pool, results are in the same order as the images.
+    mode defaults to the current preprocess_mode."""
+    mode = mode or preprocess_mode
+    if mode not in ENCODERS:
+        raise ValueError(f"Unknown preprocessing mode {mode!r}, expected one of {PREPROCESS_MODES}")
+    return list(preprocess_pool.map(lambda img_path: encode_image_(img_path, mode), batch))
+
 
 def pre_process_detect_batch_(
-        batch : list[Image.Image], 
+        batch : list[str], 
         client : InferenceHTTPClient
     ) -> None:
     """Pre-processes images in a batch before running inference."""
-    base64_images = []
-    for img_path in batch:   # Convert images to base64
-        try:
-            pil_image = Image.open(img_path)
-            cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            _, buffer = cv2.imencode('.png', cv_image)
-            base64_image = base64.b64encode(buffer).decode('utf-8')
-            base64_images.append(base64_image)
-        except Exception as e:
-            print(f"Error processing image {img_path}: {e}")
-        finally:
+    base64_images, paths, factors = [], [], []
+    try:
+        for img_path, encoded in zip(batch, encode_batch(batch)):
+            if encoded is None:
+                continue    # Skip unreadable images so results stay aligned with their paths
+            base64_images.append(encoded[0])
+            paths.append(img_path)
+            factors.append(encoded[1])
+    finally:
+        for _ in batch:
             image_queue.task_done()
-    detect_batch_(base64_images, batch, client)
+    detect_batch_(base64_images, paths, client, factors)
+
+
+def rescale_detection_(detection : dict, factor : float) -> dict:
+    """Maps a detection on a downscaled image back to original image pixels."""
+    detection = dict(detection)
+    for key in ('x', 'y', 'width', 'height'):
+        if key in detection:
+            detection[key] = detection[key] * factor
+    return detection
 
 
 def detect_batch_(
         base64_images : list[str], 
-        batch : list[Image.Image], 
-        client : InferenceHTTPClient
+        batch : list[str], 
+        client : InferenceHTTPClient,
+        factors : list[float] = None
     ) -> None:
     """Detects objects in a batch of images."""
     if base64_images:
+        factors = factors or [1.0] * len(batch)
         results = run_inference_batch_(base64_images, client)
-        if not results:
+        if stop_event.is_set():
+            # Frames cut off by the stop were never inferred, let the watcher queue them again after a restart
+            with seen_images_lock:
+                seen_images.difference_update(path for path, result in zip(batch, results) if result is None)
+        if not any(results):
             print("No detections found...")
             return
-        for img_path, result in zip(batch, results):
+        for img_path, result, factor in zip(batch, results, factors):
+            if result is None:
+                print(f"Inference failed for {img_path} - Skipping image.")
+                continue
             for detection in result[0]['consensus_predictions']['predictions']:
+                if factor != 1.0:
+                    detection = rescale_detection_(detection, factor)
                 detection_queue.put((img_path, detection))
 
 
 def process_data_and_locate_target_(detection : dict, path : str) -> None:
     """Processes detection data and performs geomatics calculations."""
+    session = session_manager.session_for(path)  # the session the image was captured in
     json_file_name = os.path.basename(path).replace('.jpg', '.json')  # Get corresponding JSON file
-    json_file_path = os.path.join(IMAGE_DATA_FOLDER, json_file_name)
+    json_file_path = os.path.join(session.image_data_dir, json_file_name)
     if os.path.exists(json_file_path):
         with open(json_file_path, 'r') as json_file:
             json_data = json.load(json_file)
+        json_data = telemetry_history.align(json_data)  # time-aligned pose if the image has a capture_time
         json_data['x'] = detection['x']
         json_data['y'] = detection['y']
         lat, lon = locate_target(json_data)
-        serialize(detection['class'], detection['confidence'], lat, lon)
+        serialize(detection['class'], detection['confidence'], lat, lon, session.detection_store)
+        session.detection_estimates.add(detection['class'], json_data)
     else:
         print(f"JSON file not found for {path} - Skipping detection.")
 
@@ -147,48 +309,118 @@ def geomatics_worker() -> None:
 
 
 # Image watcher thread
-# Infinitely run and monitor image folder for new images, add them to the queue until stop event is set.
+# Images are pushed in by notify_image as soon as an upload finishes. The active session's folder is also
+# scanned every POLL_INTERVAL seconds as a fallback for images that arrive some other way, until stop event is set.
+def enqueue_image_(image_path : str) -> bool:
+    """Queues an image for inference unless it has been queued before."""
+    if not image_path.endswith('.jpg'):
+        return False
+    with seen_images_lock:
+        if image_path in seen_images:
+            return False
+        seen_images.add(image_path)
+    image_queue.put(image_path)
+    print(f"{os.path.basename(image_path)} added to queue")
+    return True
+
+
+def forget_images(images_dir : str) -> None:
+    """Forget which images in a folder have been queued, after the folder has been cleared."""
+    with seen_images_lock:
+        seen_images.difference_update([path for path in seen_images if os.path.dirname(path) == images_dir])
+
+
+def notify_image(image_path : str) -> None:
+    """Called once an image and its telemetry have been uploaded, queues it immediately if the AI workers are running."""
+    if watcher_active.is_set():
+        enqueue_image_(image_path)
+
+
 def image_watcher() -> None:
-    """Continuously monitors the folder for new images and adds them to the queue."""
-    if not os.path.exists(IMAGE_FOLDER):
-        print(f"Error: Directory '{IMAGE_FOLDER}' does not exist.")
-        return
-    
-    global LAST_SCANNED_INDEX
-    while not stop_event.is_set():
-        try:
-            new_files = sorted(os.listdir(IMAGE_FOLDER))[LAST_SCANNED_INDEX:]
-            if new_files:
-                for file in new_files:
-                    file_path = os.path.join(IMAGE_FOLDER, file)
-                    image_queue.put(file_path)
-                    print(f"{file} added to queue")
-                    LAST_SCANNED_INDEX += 1
-            
-            time.sleep(2)  # wait before scanning again to reduce CPU usage
-        except FileNotFoundError as e:
-            print(f"Error accessing directory: {e}")
-            break
+    """Queues new images as they are announced, falling back to periodically scanning the active session."""
+    watcher_active.set()
+    try:
+        while not stop_event.is_set():
+            session = session_manager.active()
+            try:
+                with os.scandir(session.images_dir) as entries:
+                    names = [entry.name for entry in entries if entry.is_file()]
+                # Only frames whose telemetry has arrived, the rest are picked up on a later scan
+                with os.scandir(session.image_data_dir) as entries:
+                    paired = {os.path.splitext(entry.name)[0] for entry in entries if entry.name.endswith('.json')}
+                paths = [os.path.join(session.images_dir, name) for name in sorted(names)
+                         if os.path.splitext(name)[0] in paired]
+                with seen_images_lock:
+                    new_files = [path for path in paths if path not in seen_images]
+                for path in new_files:
+                    enqueue_image_(path)
+            except FileNotFoundError as e:
+                print(f"Error accessing directory: {e}")  # e.g. mid-way through clearing, retried next scan
+
+            stop_event.wait(POLL_INTERVAL)  # wait before scanning again, returns early on stop
+    finally:
+        watcher_active.clear()
 
 #========================= Endpoint Utilities =========================
-def start_threads() -> None:
-    threads = [
-        Thread(target=image_watcher, daemon=True, name=THREAD_NAMES[0]),
-        Thread(target=inference_worker, daemon=True, name=THREAD_NAMES[1]),
-        Thread(target=geomatics_worker, daemon=True, name=THREAD_NAMES[2]),
-    ]
-    # Start worker threads
-    for thread in threads:
-        thread.start()
-
-def stop_threads() -> None:
-    """Sets the stop event to stop all threads."""
-    print("Workflow stop signaled...")
-    stop_event.set()     # Signal threads to stop
-    # Clean up queues
-    image_queue.put(None)
-    detection_queue.put(None)
-    for thread in enumerate():
-        if thread.name in THREAD_NAMES:
-            thread.join()
-    stop_event.clear()
\ No newline at end of file
+class AIWorkers:
+    """
+    Starts and stops the image watcher, inference and geomatics threads as one unit.
+
+    Requests may call start() and stop() concurrently, e.g. from two operator laptops. Starting while running
+    or stopping while stopped does nothing, so the workers are never started twice. Workers that were stopped
+    but are still finishing a batch also block start(), since they share stop_event with the new ones.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.threads = []
+        self.stopping = []  # threads signalled to stop, possibly still finishing a batch
+
+    def running(self) -> bool:
+        with self.lock:
+            return any(thread.is_alive() for thread in self.threads)
+
+    def start(self) -> bool:
+        """Start the worker threads, returns False if they were already running."""
+        with self.lock:
+            if any(thread.is_alive() for thread in self.threads):
+                return False
+            if any(thread.is_alive() for thread in self.stopping):
+                raise RuntimeError("the previous AI workers are still finishing their batch")
+            self.stopping = []
+            stop_event.clear()
+            self.threads = [
+                Thread(target=image_watcher, daemon=True, name=THREAD_NAMES[0]),
+                Thread(target=inference_worker, daemon=True, name=THREAD_NAMES[1]),
+                Thread(target=geomatics_worker, daemon=True, name=THREAD_NAMES[2]),
+            ]
+            for thread in self.threads:
+                thread.start()
+            return True
+
+    def stop(self, timeout : float = STOP_TIMEOUT) -> bool:
+        """Signal the worker threads to stop and wait up to timeout seconds for them, returns False if they were
+        not running. The lock is only held while the threads are swapped out, so start(), stop() and running()
+        never wait behind a batch of inference requests."""
+        with self.lock:
+            if not self.threads:
+                return False
+            print("Workflow stop signaled...")
+            threads, self.threads = self.threads, []
+            stop_event.set()     # Signal threads to stop
+            # Wake the workers blocked on their queues
+            image_queue.put(None)
+            detection_queue.put(None)
+            self.stopping = threads
+
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        stuck = [thread.name for thread in threads if thread.is_alive()]
+        if stuck:
+            print(f"Still finishing after {timeout} s: {', '.join(stuck)}")
+        return True
+
+
+# Process-wide AI workers controlled by the /AI endpoints
+ai_workers = AIWorkers()
@@ -0,0 +1,80 @@
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+def lttb(x, y, points):
+    """
+    Largest Triangle Three Buckets: pick the points that best preserve the visual shape of a line.
+
+    The first and last points are always kept, the rest are split into points - 2 buckets by index and from
+    each bucket the point forming the largest triangle with the previously kept point and the average of
+    the next bucket is kept. Works for any ordered path, e.g. (time, value) series or (lon, lat) tracks.
+
+    Parameters:
+    x, y (np.ndarray): Coordinates of the points in order.
+    points (int): Number of points to keep, at least 3.
+
+    Returns:
+    np.ndarray: Sorted indices of the points kept.
+    """
+    n = len(x)
+    if points >= n or n <= 2:
+        return np.arange(n)
+    points = max(points, 3)
+
+    # Bucket b covers indices edges[b]:edges[b + 1], the first and last points are buckets of their own
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Average of every bucket, the last point stands in for the bucket after the final one
+    sums_x, sums_y = np.add.reduceat(x[1:n - 1], edges[:-1] - 1), np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Twice the area of the triangle (previous kept point, candidate, next bucket average) for every candidate
+        areas = np.abs((x[previous] - mean_x[bucket + 1]) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (mean_y[bucket + 1] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def min_max(y, points):
+    """
+    Keep the minimum and maximum of each bucket, so spikes (e.g. current draw on a payload release) survive.
+
+    Parameters:
+    y (np.ndarray): Values in order.
+    points (int): Upper bound on the number of points kept, two per bucket.
+
+    Returns:
+    np.ndarray: Sorted indices of the points kept.
+    """
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    buckets = max(points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    # Pad to a rectangle so every bucket is reduced in one call, padding never wins argmin or argmax
+    width = int(np.max(np.diff(edges)))
+    offsets = edges[:-1, None] + np.arange(width)
+    in_bucket = offsets < edges[1:, None]
+    offsets = np.where(in_bucket, offsets, edges[:-1, None])
+    values = y[offsets]
+    lowest = np.argmin(np.where(in_bucket, values, np.inf), axis=1)
+    highest = np.argmax(np.where(in_bucket, values, -np.inf), axis=1)
+    rows = np.arange(buckets)
+    return np.unique(np.concatenate((offsets[rows, lowest], offsets[rows, highest])))
+
+
+def downsample(x, y, points, method="lttb"):
+    """Return the indices of at most points samples of the series y over x, see DOWNSAMPLE_METHODS."""
+    if method == "lttb":
+        return lttb(x, y, points)
+    if method == "minmax":
+        return min_max(y, points)
+    raise ValueError(f"Unknown downsampling method {method!r}, expected one of {DOWNSAMPLE_METHODS}")
@@ -0,0 +1,114 @@
+import json
+import itertools
+from collections import deque
+from queue import Queue, Empty, Full
+from threading import Lock
+
+EVENT_HISTORY = 1000  # recent events kept so a reconnecting client can catch up from Last-Event-ID
+SUBSCRIBER_QUEUE_SIZE = 500  # events buffered per client before it is disconnected as too slow
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments that keep idle connections open
+MAX_SUBSCRIBERS = 24  # open streams, each holds a request thread (serve.py sizes this from --threads)
+
+class SubscriberLimitError(Exception):
+    """Raised by subscribe when max_subscribers streams are already open."""
+
+class Subscription:
+    """A client's queue of pending events, closed by the broker if the client falls too far behind."""
+
+    def __init__(self):
+        self.queue = Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+
+class EventBroker:
+    """
+    Fans out server events to Server-Sent Events clients.
+
+    Every event gets an increasing id. Recent events are kept in a bounded history so a client that reconnects
+    with Last-Event-ID receives what it missed. If the id is older than the history the client is sent A
+    'reset' event and should refetch the full state from the GET endpoints.
+
+    Every open stream holds a server thread, so at most max_subscribers clients are subscribed at once and the
+    remaining threads stay free for the other endpoints.
+    """
+
+    def __init__(self, history=EVENT_HISTORY, max_subscribers=MAX_SUBSCRIBERS):
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self.max_subscribers = max_subscribers
+
+    def publish(self, event, data):
+        """Send an event to every subscriber, never blocks."""
+        with self.lock:
+            item = (next(self.ids), event, data)
+            self.history.append(item)
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(item)
+                except Full:
+                    # Too slow, drop it, the client reconnects with Last-Event-ID
+                    subscription.closed = True
+                    self.subscribers.discard(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a new subscriber, returns (subscription, missed events or None if a reset is needed).
+
+        Raises SubscriberLimitError if max_subscribers are already subscribed.
+        """
+        subscription = Subscription()
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise SubscriberLimitError(f"All {self.max_subscribers} event streams are in use")
+            missed = []
+            if last_event_id is not None:
+                oldest = self.history[0][0] if self.history else None
+                if oldest is not None and last_event_id + 1 < oldest:
+                    missed = None
+                else:
+                    missed = [item for item in self.history if item[0] > last_event_id]
+            self.subscribers.add(subscription)
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def stream(self, subscription, missed, initial=()):
+        """
+        Generator of SSE text for one client, from the result of subscribe. initial is a list of (event, data)
+        sent first without ids, e.g. the current telemetry snapshot. Unsubscribes when the client disconnects,
+        a response that is closed before it starts should call unsubscribe itself.
+        """
+        try:
+            for event, data in initial:
+                yield format_sse(event, data)
+            if missed is None:
+                yield format_sse('reset', {})
+            else:
+                for event_id, event, data in missed:
+                    yield format_sse(event, data, event_id)
+
+            while not subscription.closed:
+                try:
+                    event_id, event, data = subscription.queue.get(timeout=KEEPALIVE_INTERVAL)
+                except Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event, data, event_id)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_sse(event, data, event_id=None):
+    """Format one Server-Sent Event."""
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n" + message
+    return message
+
+
+# Process-wide broker shared by the Flask endpoints, the telemetry poller and the stores
+broker = EventBroker()
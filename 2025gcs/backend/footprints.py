@@ -0,0 +1,129 @@
+import numpy as np
+from collections import defaultdict
+from threading import Lock
+from geo import (get_transformer, image_to_object_space_batch, object_to_image_space_batch,
+                 IMAGE_WIDTH, IMAGE_HEIGHT)
+
+GRID_CELL = 50.0  # m, side of a grid cell, about one footprint at survey altitude
+MIN_ALTITUDE = 5.0  # m above ground, frames below this (e.g. on the runway) are not indexed
+MAX_EXTENT = 1000.0  # m, footprints reaching further than this from the drone (near the horizon) are not indexed
+POSE_KEYS = ("lat", "lon", "rel_alt", "yaw", "pitch", "roll")
+
+# Image corners in pixels, in order around the frame
+CORNERS = np.array([(0, 0), (IMAGE_WIDTH, 0), (IMAGE_WIDTH, IMAGE_HEIGHT), (0, IMAGE_HEIGHT)], dtype=float)
+
+class FootprintIndex:
+    """
+    Ground footprints of the captured frames in a uniform grid, to find the frames that see a point.
+
+    Each frame's corners are projected onto the ground with the camera model in geo, in UTM metres of the zone
+    of the first frame indexed. A frame is listed in every grid cell its footprint's bounding box touches.
+    A query only tests the frames listed in the point's cell, by projecting the point back into each of them,
+    so it also returns where in the image the point appears.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every frame, e.g. after the images have been cleared."""
+        with self.lock:
+            self.zone = None
+            self.frames = {}  # image name -> (pose array, corner eastings, corner northings)
+            self.grid = defaultdict(set)  # (column, row) -> image names
+
+    def rebuild(self, entries):
+        """Index a batch of image JSON entries that have an image key, e.g. ImageCatalogue.image_data()['entries']."""
+        self.reset()
+        self.add_batch_(entries)
+
+    def add(self, image_name, data):
+        """Index one frame from its image JSON, returns False if it has no usable pose (or the JSON is not an object)."""
+        if not isinstance(data, dict):
+            return False
+        return self.add_batch_([dict(data, image=image_name)]) == 1
+
+    def add_batch_(self, entries):
+        entries = [entry for entry in entries
+                   if isinstance(entry, dict) and all(isinstance(entry.get(key), (int, float)) for key in POSE_KEYS)
+                   and entry['rel_alt'] >= MIN_ALTITUDE]
+        if not entries:
+            return 0
+        poses = np.array([[entry[key] for key in POSE_KEYS] for entry in entries], dtype=float)
+
+        with self.lock:
+            if self.zone is None:
+                self.zone = (int((poses[0, 1] + 180) / 6) + 1, poses[0, 0] >= 0)
+            to_utm = get_transformer(*self.zone, to_utm=True)
+        easting, northing = to_utm.transform(poses[:, 1], poses[:, 0])
+        poses = np.column_stack([easting, northing, poses[:, 2:]])  # easting, northing, agl, yaw, pitch, roll
+
+        # Every corner of every frame in one call
+        repeated = np.repeat(poses, len(CORNERS), axis=0)
+        corners = np.tile(CORNERS, (len(entries), 1))
+        corner_e, corner_n = image_to_object_space_batch(repeated[:, 0], repeated[:, 1], repeated[:, 2],
+                                                         corners[:, 0], corners[:, 1],
+                                                         repeated[:, 3], repeated[:, 4], repeated[:, 5])
+        corner_e = corner_e.reshape(len(entries), len(CORNERS))
+        corner_n = corner_n.reshape(len(entries), len(CORNERS))
+        reach = np.hypot(corner_e - poses[:, :1], corner_n - poses[:, 1:2]).max(axis=1)
+        usable = np.isfinite(reach) & (reach <= MAX_EXTENT)
+
+        with self.lock:
+            for index in np.flatnonzero(usable):
+                name = entries[index]['image']
+                self.remove_(name)
+                self.frames[name] = (poses[index], corner_e[index], corner_n[index])
+                for cell in self.cells_(corner_e[index], corner_n[index]):
+                    self.grid[cell].add(name)
+        return int(usable.sum())
+
+    def cells_(self, eastings, northings):
+        columns = range(int(eastings.min() // GRID_CELL), int(eastings.max() // GRID_CELL) + 1)
+        rows = range(int(northings.min() // GRID_CELL), int(northings.max() // GRID_CELL) + 1)
+        return [(column, row) for column in columns for row in rows]
+
+    def remove_(self, image_name):
+        """The caller must hold the lock."""
+        frame = self.frames.pop(image_name, None)
+        if frame is not None:
+            for cell in self.cells_(frame[1], frame[2]):
+                self.grid[cell].discard(image_name)
+                if not self.grid[cell]:
+                    del self.grid[cell]
+
+    def remove(self, image_name):
+        with self.lock:
+            self.remove_(image_name)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.frames)
+
+    def query(self, lat, lon, limit=None):
+        """
+        Return the frames whose footprint contains a point, closest nadir first.
+
+        Returns:
+        list: Dicts with the image name, nadir_distance (m from the point to the ground below the drone) and
+        the pixel x, y the point appears at.
+        """
+        with self.lock:
+            if self.zone is None:
+                return []
+            easting, northing = get_transformer(*self.zone, to_utm=True).transform(lon, lat)
+            names = sorted(self.grid.get((int(easting // GRID_CELL), int(northing // GRID_CELL)), ()))
+            if not names:
+                return []
+            poses = np.array([self.frames[name][0] for name in names])
+
+        x_pix, y_pix = object_to_image_space_batch(poses[:, 0], poses[:, 1], poses[:, 2],
+                                                   np.full(len(names), easting), np.full(len(names), northing),
+                                                   poses[:, 3], poses[:, 4], poses[:, 5])
+        inside = (x_pix >= 0) & (x_pix < IMAGE_WIDTH) & (y_pix >= 0) & (y_pix < IMAGE_HEIGHT)
+        distance = np.hypot(poses[:, 0] - easting, poses[:, 1] - northing)
+
+        order = [index for index in np.argsort(distance, kind='stable') if inside[index]]
+        return [{'image': names[index], 'nadir_distance': float(distance[index]),
+                 'x': float(x_pix[index]), 'y': float(y_pix[index])} for index in order[:limit]]
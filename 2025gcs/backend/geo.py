@@ -3,10 +3,20 @@ import scipy.stats as stats
 from pyproj import CRS, Transformer
 import json
 import os
+from collections import OrderedDict
+from threading import Lock
 
 # Utilities
 DATA_DIR = os.path.join(os.path.dirname(__file__), '.', 'data')
 
+# Geographic coordinate system (WGS84)
+WGS84 = CRS.from_epsg(4326)
+
+# Maximum number of cached UTM transformers
+TRANSFORMER_CACHE_SIZE = 16
+_transformer_cache = OrderedDict()
+_transformer_lock = Lock()
+
 #--------------------------------------------------Functions-----------------------------------------------------
 def parse_json_to_vectors(file_path):
     with open(file_path, 'r') as f:
@@ -36,83 +46,148 @@ def parse_json_to_vectors(file_path):
     
     return vectors
 
+def get_transformer(zone, northern, to_utm):
+    """
+    Return a cached Transformer between WGS84 and the given UTM zone.
+
+    Transformers are cached by (zone, hemisphere, direction) and the least recently used entry is
+    evicted once the cache holds TRANSFORMER_CACHE_SIZE entries. pyproj Transformers are thread-safe
+    (pyproj >= 3.1), so a cached instance can be shared by the geomatics worker and Flask threads.
+
+    Parameters:
+    zone (int): UTM zone number (1 through 60).
+    northern (bool): True for the northern hemisphere; False for southern.
+    to_utm (bool): True for WGS84 -> UTM; False for UTM -> WGS84.
+
+    Returns:
+    Transformer: A transformer with always_xy=True.
+    """
+    key = (zone, northern, to_utm)
+    with _transformer_lock:
+        transformer = _transformer_cache.get(key)
+        if transformer is not None:
+            _transformer_cache.move_to_end(key)
+            return transformer
+
+    # Determine the correct EPSG code for UTM based on hemisphere:
+    # - Northern Hemisphere: EPSG:326XX (where XX is the zone)
+    # - Southern Hemisphere: EPSG:327XX
+    utm_crs = CRS.from_epsg((32600 if northern else 32700) + zone)
+    if to_utm:
+        transformer = Transformer.from_crs(WGS84, utm_crs, always_xy=True)
+    else:
+        transformer = Transformer.from_crs(utm_crs, WGS84, always_xy=True)
+
+    # Built outside the lock, another thread may have cached the same key in the meantime
+    with _transformer_lock:
+        transformer = _transformer_cache.setdefault(key, transformer)
+        _transformer_cache.move_to_end(key)
+        while len(_transformer_cache) > TRANSFORMER_CACHE_SIZE:
+            _transformer_cache.popitem(last=False)
+    return transformer
+
 def lat_long_to_utm(lat, lon):
     """
-    Convert geographic coordinates (latitude, longitude, and altitude) to UTM coordinates.
+    Convert geographic coordinates (latitude, longitude) to UTM coordinates.
     
     Parameters:
     lat (float): Latitude in decimal degrees.
     lon (float): Longitude in decimal degrees.
-    MSL (float): Altitude (e.g., Mean Sea Level height, usually in meters).
     
     Returns:
     (easting, northing, zone): A three-element tuple, easting/northing (meters), zone (1-60).
     """
-    # Define the geographic coordinate system (WGS84)
-    wgs84 = CRS.from_epsg(4326)
-    
     # Determine the UTM zone from the longitude
     # UTM zones are 6° wide; zone calculation: zone = int((lon + 180)/6) + 1
     zone = int((lon + 180) / 6) + 1
-    
-    # Determine the correct EPSG code for UTM based on hemisphere:
-    # - Northern Hemisphere: EPSG:326XX (where XX is the zone)
-    # - Southern Hemisphere: EPSG:327XX
-    if lat >= 0:
-        utm_epsg = 32600 + zone
-    else:
-        utm_epsg = 32700 + zone
 
-    # Define UTM coordinate system for the calculated zone
-    utm_crs = CRS.from_epsg(utm_epsg)
-    
-    # Create A Transformer from geographic coordinates (WGS84) to UTM
-    transformer = Transformer.from_crs(wgs84, utm_crs, always_xy=True)
-    
-    # Transform (lon, lat), while passing MSL as the vertical coordinate.
-    # Note: UTM is typically 2D but if you pass A third coordinate, it will usually apply an identity transformation on it.
+    transformer = get_transformer(zone, lat >= 0, to_utm=True)
     easting, northing = transformer.transform(lon, lat)
     
     return easting, northing, zone
 
+def lat_long_to_utm_array(lat, lon):
+    """
+    Convert arrays of geographic coordinates to UTM coordinates with one transform per zone.
+
+    Parameters:
+    lat (array-like): Latitudes in decimal degrees, shape (n,).
+    lon (array-like): Longitudes in decimal degrees, shape (n,).
+
+    Returns:
+    (easting, northing, zone): Three arrays of shape (n,), easting/northing (meters), zone (1-60).
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    zone = ((lon + 180) // 6).astype(int) + 1
+    northern = lat >= 0
+
+    easting = np.empty_like(lon)
+    northing = np.empty_like(lat)
+
+    # A sortie almost always sits in one zone, so this is normally a single transform call
+    for zone_value, northern_value in set(zip(zone.tolist(), northern.tolist())):
+        mask = (zone == zone_value) & (northern == northern_value)
+        transformer = get_transformer(zone_value, northern_value, to_utm=True)
+        easting[mask], northing[mask] = transformer.transform(lon[mask], lat[mask])
+
+    return easting, northing, zone
+
 def utm_to_lat_long(easting, northing, zone, northern=True):
     """
-    Convert UTM coordinates (easting, northing, and vert value) back to geographic coordinates (latitude and longitude).
+    Convert UTM coordinates (easting, northing) back to geographic coordinates (latitude and longitude).
     
     Parameters:
     easting (float): Easting in meters.
     northing (float): Northing in meters.
-    vert (float): Vertical component (altitude), in meters.
     zone (int): UTM zone number (1 through 60).
     northern (bool): True if the coordinates are in the northern hemisphere; False for southern.
     
     Returns:
-    (lat, lon, altitude): A tuple containing latitude, longitude (in decimal degrees), and altitude (in meters).
+    (lat, lon): A tuple containing latitude, longitude (in decimal degrees).
     """
-    # Select the appropriate EPSG code for the UTM CRS:
-    # For the northern hemisphere, the EPSG code is 32600 + zone,
-    # For the southern hemisphere, it’s 32700 + zone.
-    if northern:
-        utm_epsg = 32600 + zone
-    else:
-        utm_epsg = 32700 + zone
-
-    # Define the UTM coordinate system for the given zone.
-    utm_crs = CRS.from_epsg(utm_epsg)
-    
-    # Define WGS84 geographic coordinate system.
-    wgs84 = CRS.from_epsg(4326)
-    
-    # Create A Transformer to convert UTM coordinates back to WGS84.
     # Note: Transformer with always_xy=True expects the input order to be (easting, northing),
-    # and returns coordinates in the order (lon, lat, altitude).
-    transformer = Transformer.from_crs(utm_crs, wgs84, always_xy=True)
-    
-    # Perform the transformation.
+    # and returns coordinates in the order (lon, lat).
+    transformer = get_transformer(zone, northern, to_utm=False)
     lon, lat = transformer.transform(easting, northing)
     
     return lat, lon
 
+def utm_to_lat_long_array(easting, northing, zone, northern=True):
+    """
+    Convert arrays of UTM coordinates in a single zone back to geographic coordinates.
+
+    Parameters:
+    easting (array-like): Eastings in meters, shape (n,).
+    northing (array-like): Northings in meters, shape (n,).
+    zone (int): UTM zone number (1 through 60).
+    northern (bool): True if the coordinates are in the northern hemisphere; False for southern.
+
+    Returns:
+    (lat, lon): Two arrays of shape (n,) in decimal degrees.
+    """
+    transformer = get_transformer(zone, northern, to_utm=False)
+    lon, lat = transformer.transform(np.asarray(easting, dtype=float), np.asarray(northing, dtype=float))
+
+    return lat, lon
+
+# Camera constants
+FOCAL_LENGTH = 0.002845 # meters (m)
+PIXEL_SPACING = 0.00345 # mm per pix
+IMAGE_WIDTH = 1456 # pix
+IMAGE_HEIGHT = 1088 # pix
+
+# fiducial centre (mm)
+X_FIDUCIAL = 2.5116
+Y_FIDUCIAL = -1.8768
+
+# Boresight offsets between the camera and the autopilot attitude (radians)
+PITCH_OFFSET = 0.04
+ROLL_OFFSET = 0.02
+
+# Lever arm along the direction of travel (m)
+Y_OFFSET = 9
+
 # fiducial centre pix (728, 544)
 # x rotation(pitch)
 # y rotation(roll)
@@ -125,66 +200,139 @@ def utm_to_lat_long(easting, northing, zone, northern=True):
 # positive roll is right bank, i.e. right wing down
 # positive yaw is right turn, i.e. nose of UAV turns right relative to positive north
 def image_to_object_space(easting_drone, northing_drone, agl, x_pix, y_pix, yaw, pitch, roll): 
-    focal_length = 0.002845 # meters (m)
-    pixel_spacing = 0.00345 # mm per pix
+    easting_target, northing_target = image_to_object_space_batch(
+        [easting_drone], [northing_drone], [agl], [x_pix], [y_pix], [yaw], [pitch], [roll]
+    )
+    return easting_target[0], northing_target[0]
 
-    pitch += 0.04
-    roll += 0.02
+def rotation_matrices(yaw, pitch, roll):
+    """
+    Build the stacked image to object space rotation matrices R = Rz @ Ry @ Rx.
 
-    # fiducial centre (mm)
-    x_fiducial = 2.5116
-    y_fiducial = -1.8768
+    Parameters:
+    yaw, pitch, roll (np.ndarray): Attitude angles in radians, each of shape (n,).
 
-    scale = agl / focal_length
+    Returns:
+    np.ndarray: Rotation matrices of shape (n, 3, 3).
+    """
+    n = yaw.size
+    cos_p, sin_p = np.cos(pitch), np.sin(pitch)
+    cos_r, sin_r = np.cos(roll), np.sin(roll)
+    cos_y, sin_y = np.cos(yaw), np.sin(yaw)
+
+    # y is direction of travel therefore conventional roll and pitch rotations are swapped
+    # roll is rotation about y axis, pitch is rotation about x axis
+    Rx = np.zeros((n, 3, 3))
+    Rx[:, 0, 0] = 1
+    Rx[:, 1, 1] = cos_p
+    Rx[:, 1, 2] = -sin_p
+    Rx[:, 2, 1] = sin_p
+    Rx[:, 2, 2] = cos_p
+
+    Ry = np.zeros((n, 3, 3))
+    Ry[:, 0, 0] = cos_r
+    Ry[:, 0, 2] = sin_r
+    Ry[:, 1, 1] = 1
+    Ry[:, 2, 0] = -sin_r
+    Ry[:, 2, 2] = cos_r
+
+    Rz = np.zeros((n, 3, 3))
+    Rz[:, 0, 0] = cos_y
+    Rz[:, 0, 1] = sin_y
+    Rz[:, 1, 0] = -sin_y
+    Rz[:, 1, 1] = cos_y
+    Rz[:, 2, 2] = 1
+
+    return Rz @ Ry @ Rx
+
+def image_to_object_space_batch(easting_drone, northing_drone, agl, x_pix, y_pix, yaw, pitch, roll):
+    """
+    Vectorized image_to_object_space, projects n pixel observations onto the ground plane in one call.
+
+    Parameters:
+    easting_drone, northing_drone (array-like): Drone UTM position in meters, shape (n,).
+    agl (array-like): Drone height above ground level in meters, shape (n,).
+    x_pix, y_pix (array-like): Pixel coordinates of the target, shape (n,).
+    yaw, pitch, roll (array-like): Drone attitude in radians, shape (n,).
+
+    Returns:
+    (easting_target, northing_target): Two arrays of shape (n,) in meters.
+    """
+    easting_drone = np.asarray(easting_drone, dtype=float)
+    northing_drone = np.asarray(northing_drone, dtype=float)
+    agl = np.asarray(agl, dtype=float)
+    x_pix = np.asarray(x_pix, dtype=float)
+    y_pix = np.asarray(y_pix, dtype=float)
+    yaw = np.asarray(yaw, dtype=float)
+    pitch = np.asarray(pitch, dtype=float) + PITCH_OFFSET
+    roll = np.asarray(roll, dtype=float) + ROLL_OFFSET
+
+    scale = agl / FOCAL_LENGTH
 
     # image x and y (mm)
-    image = np.array([(x_pix * pixel_spacing) - x_fiducial, ((-y_pix * pixel_spacing) - y_fiducial)])
+    image_x = (x_pix * PIXEL_SPACING) - X_FIDUCIAL
+    image_y = (-y_pix * PIXEL_SPACING) - Y_FIDUCIAL
 
-    # object x and y in m relative to drone
+    # object x and y in m relative to drone, shape (n, 3)
     #                                        check if agl should be negative or positive (was originally positive)
-    obj = np.array([((scale * image[0]) / 1000), ((scale * image[1]) / 1000) - 9, agl])
-    
-    # y is direction of travel therefore conventional roll and pitch rotations are swapped
-    # roll is rotation about y axis, pitch is rotation about x axis
-    Rx = np.array([
-        [1, 0, 0],
-        [0, np.cos(pitch), -np.sin(pitch)],
-        [0, np.sin(pitch), np.cos(pitch)]
-    ])
-
-    Ry = np.array([
-        [np.cos(roll), 0, np.sin(roll)],
-        [0, 1, 0],
-        [-np.sin(roll), 0, np.cos(roll)]
-    ])
-
-    Rz = np.array([
-        [np.cos(yaw), np.sin(yaw), 0],
-        [-np.sin(yaw), np.cos(yaw), 0],
-        [0, 0, 1]
-    ])
-
-    R = Rz @ Ry @ Rx
+    obj = np.stack([(scale * image_x) / 1000, ((scale * image_y) / 1000) - Y_OFFSET, agl], axis=-1)
+
+    R = rotation_matrices(yaw, pitch, roll)
 
     # Target coordinates relative to drone position, not intersecting ground plane though
     # Therefore must compute intersection coordinates with ground plane by scaling by t
-    
-    target = R @ obj.transpose()
+    target = np.einsum('nij,nj->ni', R, obj)
 
+    vertical_depth = target[:, 2]
 
-    vertical_depth = target[2]
-    
     #                                        check if agl should be negative or positive (was originally positive)
     t = agl / vertical_depth
 
-    target[0] = target[0] * t
-    target[1] = target[1] * t
-
-    easting_target = easting_drone + target[0]
-    northing_target = northing_drone + target[1]
+    easting_target = easting_drone + target[:, 0] * t
+    northing_target = northing_drone + target[:, 1] * t
 
     return easting_target, northing_target
 
+def object_to_image_space_batch(easting_drone, northing_drone, agl, easting_target, northing_target, yaw, pitch, roll):
+    """
+    Inverse of image_to_object_space_batch, finds the pixel each ground point appears at in its image.
+
+    The ground offset from the drone is parallel to the rotated image ray, so the ray in image space is
+    R^T applied to the offset, rescaled so its depth is agl.
+
+    Parameters:
+    easting_drone, northing_drone (array-like): Drone UTM position in meters, shape (n,).
+    agl (array-like): Drone height above ground level in meters, shape (n,).
+    easting_target, northing_target (array-like): Ground point UTM position in meters, shape (n,).
+    yaw, pitch, roll (array-like): Drone attitude in radians, shape (n,).
+
+    Returns:
+    (x_pix, y_pix): Two arrays of shape (n,), NaN where the point is behind the camera.
+    """
+    agl = np.asarray(agl, dtype=float)
+    yaw = np.asarray(yaw, dtype=float)
+    pitch = np.asarray(pitch, dtype=float) + PITCH_OFFSET
+    roll = np.asarray(roll, dtype=float) + ROLL_OFFSET
+
+    offset = np.stack([
+        np.asarray(easting_target, dtype=float) - np.asarray(easting_drone, dtype=float),
+        np.asarray(northing_target, dtype=float) - np.asarray(northing_drone, dtype=float),
+        agl,
+    ], axis=-1)
+    R = rotation_matrices(yaw, pitch, roll)
+    ray = np.einsum('nji,nj->ni', R, offset)  # R^T @ offset
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth = np.where(ray[:, 2] > 0, agl / ray[:, 2], np.nan)
+    obj = ray * depth[:, None]
+
+    scale = agl / FOCAL_LENGTH
+    image_x = obj[:, 0] * 1000 / scale
+    image_y = (obj[:, 1] + Y_OFFSET) * 1000 / scale
+    x_pix = (image_x + X_FIDUCIAL) / PIXEL_SPACING
+    y_pix = -(image_y + Y_FIDUCIAL) / PIXEL_SPACING
+    return x_pix, y_pix
+
 # Functional parametric model
 def model(easting_drone, northing_drone, easting_target, northing_target, agl_drone):
     x_delta = easting_drone - easting_target
@@ -210,116 +358,220 @@ def covariance_matrix_obs(obs_std, n):
     np.fill_diagonal(Cl, obs_std**2)
     return Cl
 
-def parametric_adjustment(easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std):
+# Minimum threshold value before adjustment completes (m)
+ADJUSTMENT_THRESHOLD = 0.0001
+
+# Maximum Gauss-Newton iterations per adjustment
+MAX_ADJUSTMENT_ITERATIONS = 50
+
+# Maximum outlier rejection passes, each pass re-runs the adjustment
+MAX_OUTLIER_ITERATIONS = 10
+
+# Factor applied to the standard deviation of an observation flagged by data snooping
+OUTLIER_STD_INFLATION = 8
+
+# Significance level (alpha) used for data snooping
+SNOOPING_ALPHA = 0.15
+
+def design_matrix(easting_drone, northing_drone, agl_drone, easting_target_est, northing_target_est):
+    """
+    Vectorized design matrix A (n x 2) of the range model evaluated at the current estimate.
+    """
+    A = np.empty((easting_drone.size, 2))
+    A[:, 0] = f_dx_target(easting_drone, northing_drone, easting_target_est, northing_target_est, agl_drone)
+    A[:, 1] = f_dy_target(easting_drone, northing_drone, easting_target_est, northing_target_est, agl_drone)
+    return A
+
+def solve_normal_equations(A, w, weights):
+    """
+    Solve the 2 x 2 normal equations (A^T P A) d = A^T P w in closed form for a diagonal P.
+
+    Parameters:
+    A (np.ndarray): Design matrix, shape (n, 2).
+    w (np.ndarray): Misclosure vector, shape (n,).
+    weights (np.ndarray): Diagonal of the weight matrix P, shape (n,).
+
+    Returns:
+    (d_hat, N_inv): Parameter correction, shape (2,), and inverse normal matrix, shape (2, 2).
+    """
+    pa_x = weights * A[:, 0]
+    pa_y = weights * A[:, 1]
+
+    n_xx = pa_x @ A[:, 0]
+    n_xy = pa_x @ A[:, 1]
+    n_yy = pa_y @ A[:, 1]
+
+    det = n_xx * n_yy - n_xy * n_xy
+    N_inv = np.array([[n_yy, -n_xy], [-n_xy, n_xx]]) / det
+
+    U = np.array([pa_x @ w, pa_y @ w])
+    return N_inv @ U, N_inv
+
+def least_squares_adjustment(easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std,
+                             easting_target_est=None, northing_target_est=None, max_iterations=MAX_ADJUSTMENT_ITERATIONS):
+    """
+    One Gauss-Newton least squares adjustment of the target position followed by data snooping.
+
+    Weights are kept as a vector (P = diag(1 / obs_std^2)), so memory is O(n) and time is O(n) per iteration.
+    Only the diagonal of the residual covariance Cr_hat is formed.
+
+    Parameters:
+    easting_drone, northing_drone, agl_drone (np.ndarray): Drone positions in meters, shape (n,).
+    easting_target, northing_target (np.ndarray): Georeferenced target observations in meters, shape (n,).
+    obs_std (np.ndarray): Observation standard deviations in meters, shape (n,).
+    easting_target_est, northing_target_est (float): Optional initial estimate, defaults to the mean of the observations.
+    max_iterations (int): Maximum number of Gauss-Newton iterations.
+
+    Returns:
+    (easting_target_est, northing_target_est, standardized_r_hat, critical_value, converged)
+    """
     # Defining u(# of parameters) and n (# of observations)
     # Assuming number of observed horizontal distances is equal to n where A distance is calculating using the 2D range equation (refer to function name 'model')
     u = 2
     n = easting_target.size
-    
+
     # Degrees of freedom
     dof = n - u
 
-    # Compute standard deviation of observations
-    
-    # Create covariance matrix
-    Cl = covariance_matrix_obs(obs_std, n)
-
-    # Compute weight matrix P
-    P = np.linalg.inv(Cl)
-
-    # Declaring design matrix A and misclosure vector w dimensions
-    A = np.zeros((n, u))
-    w = np.zeros((n))
-
-    # Declaring threshold vector (how much each parameter changes given an iteration)
-    d_hat = np.array([])
-
+    # Weight vector, the diagonal of P = inv(Cl)
+    variances = obs_std**2
+    weights = 1 / variances
 
     # Estimating target coordinates by mean of target coordinate observations
     # Assuming flat plane of operation z-component will near 0m AGL
-    easting_target_est = np.mean(easting_target)
-    northing_target_est = np.mean(northing_target)
+    if easting_target_est is None or northing_target_est is None:
+        easting_target_est = np.mean(easting_target)
+        northing_target_est = np.mean(northing_target)
 
-    # Iteration count
-    iteration = 0
+    # Observed ranges do not change between iterations
+    observed_range = model(easting_drone, northing_drone, easting_target, northing_target, agl_drone)
 
-    # Minimum threshold value before adjustment completes (m)
-    threshold = 0.0001
-
-    while iteration == 0 or abs(np.max(d_hat)) > threshold:
-        # Populating design matrix A
-        for i in range(A.shape[0]):
-            A[i, 0] = f_dx_target(easting_drone[i], northing_drone[i], easting_target_est, northing_target_est, agl_drone[i])
-            A[i, 1] = f_dy_target(easting_drone[i], northing_drone[i], easting_target_est, northing_target_est, agl_drone[i])
+    iteration = 0
+    converged = False
 
-        # Populating misclosure vector w (w = l - f(xo)) convention
-        for i in range(w.size):
-            w[i] = (model(easting_drone[i], northing_drone[i], easting_target[i], northing_target[i], agl_drone[i]) - model(easting_drone[i], northing_drone[i], easting_target_est, northing_target_est, agl_drone[i]))
+    while not converged and iteration < max_iterations:
+        A = design_matrix(easting_drone, northing_drone, agl_drone, easting_target_est, northing_target_est)
 
-        N = (A.transpose()) @ P @ A
-        U = (A.transpose()) @ P @ w
+        # Misclosure vector w (w = l - f(xo)) convention
+        w = observed_range - model(easting_drone, northing_drone, easting_target_est, northing_target_est, agl_drone)
 
-        d_hat = (np.linalg.inv(N)) @ U
+        d_hat, N_inv = solve_normal_equations(A, w, weights)
 
         easting_target_est += d_hat[0]
         northing_target_est += d_hat[1]
         iteration += 1
+        converged = np.max(np.abs(d_hat)) <= ADJUSTMENT_THRESHOLD
 
     # Residuals
     r = A @ d_hat + w
 
     # Computed post adjustment (ensures Cl is scaled properly)
-    a_posteriori_variance_factor = ((r.transpose()) @ P @ r ) / dof
-    
-    # Recomputing Cl to properly scale weight matrix to perform data snooping
-    Cl = a_posteriori_variance_factor * Cl
-    
-    # Compute weight matrix P
-    P = np.linalg.inv(Cl)
+    a_posteriori_variance_factor = (weights * r) @ r / dof
+
+    # Rescale Cl (and therefore P and N) to perform data snooping
+    variances = a_posteriori_variance_factor * variances
+    weights = weights / a_posteriori_variance_factor
+    N_inv = N_inv * a_posteriori_variance_factor
 
     # Recompute a_posteriori_variance_factor
     # Should be equal to or near 1 after rescaling (Ensures none bias data analysis)
-    a_posteriori_variance_factor = ((r.transpose()) @ P @ r ) / dof
-    
-    # Recomputed N
-    N = (A.transpose()) @ P @ A
+    a_posteriori_variance_factor = (weights * r) @ r / dof
 
-    Cx_hat = a_posteriori_variance_factor * np.linalg.inv(N)
+    Cx_hat = a_posteriori_variance_factor * N_inv
 
-    Cl_hat = A @ Cx_hat @ A.transpose()
+    # diag(A @ Cx_hat @ A.T) without forming the n x n matrix
+    Cl_hat_diag = (
+        Cx_hat[0, 0] * A[:, 0]**2
+        + 2 * Cx_hat[0, 1] * A[:, 0] * A[:, 1]
+        + Cx_hat[1, 1] * A[:, 1]**2
+    )
 
-    Cr_hat = Cl - Cl_hat
+    Cr_hat_diag = variances - Cl_hat_diag
 
     # Plot data and adjusted target point
     print("\nEstimated post adjustment: ", "Easting: ", easting_target_est, "Northing: ", northing_target_est)
 
     # Data snooping
-    standardized_r_hat = r / np.sqrt(np.diag(Cr_hat))
-
-    # Computes critical values of student-t distribution
-    # Significance level (alpha)
-    alpha = 0.15
+    standardized_r_hat = r / np.sqrt(Cr_hat_diag)
 
     # Critical value for two-tailed test
-    critical_value = stats.t.ppf(1 - alpha/2, dof)
+    critical_value = stats.t.ppf(1 - SNOOPING_ALPHA/2, dof)
 
-    if (np.max(standardized_r_hat) > critical_value) or (np.min(standardized_r_hat) < -critical_value):
-        for i in range(standardized_r_hat.size):
-            if (standardized_r_hat[i] > critical_value) or (standardized_r_hat[i] < -critical_value):
-                obs_std[i] = obs_std[i] * 8
+    return easting_target_est, northing_target_est, standardized_r_hat, critical_value, converged
 
-        return parametric_adjustment(easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std)
-    
-    else:
-        return easting_target_est, northing_target_est
+def parametric_adjustment(easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std,
+                          max_outer_iterations=MAX_OUTLIER_ITERATIONS):
+    """
+    Least squares target estimate with iterative outlier rejection.
+
+    Observations flagged by data snooping have their standard deviation inflated and the adjustment is
+    re-run, warm started from the previous estimate, until no outliers remain or max_outer_iterations is hit.
+    If a re-run fails to converge, the previous estimate is returned.
+
+    Returns:
+    (easting_target_est, northing_target_est, report): report is a dict with the number of outer
+    iterations, the indices of rejected observations and whether the adjustment converged.
+    """
+    easting_target_est, northing_target_est, _, report = robust_adjustment(
+        easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std,
+        max_outer_iterations=max_outer_iterations
+    )
+    return easting_target_est, northing_target_est, report
+
+def robust_adjustment(easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std,
+                      easting_target_est=None, northing_target_est=None, max_outer_iterations=MAX_OUTLIER_ITERATIONS):
+    """
+    parametric_adjustment with an optional initial estimate, also returning the final (inflated) obs_std.
+
+    Returns:
+    (easting_target_est, northing_target_est, obs_std, report)
+    """
+    # Work on a copy so the caller's uncertainties are left untouched
+    obs_std = np.array(obs_std, dtype=float)
+    rejected = np.zeros(obs_std.size, dtype=bool)
+
+    converged = False
+    iteration = 0
+
+    while iteration < max_outer_iterations:
+        easting_est, northing_est, standardized_r_hat, critical_value, adjustment_converged = least_squares_adjustment(
+            easting_drone, northing_drone, agl_drone, easting_target, northing_target, obs_std,
+            easting_target_est, northing_target_est
+        )
+        iteration += 1
+
+        # Keep the last converged estimate rather than a diverged one
+        if not adjustment_converged:
+            print(f"Adjustment did not converge after {MAX_ADJUSTMENT_ITERATIONS} iterations.")
+            if easting_target_est is None:
+                easting_target_est, northing_target_est = easting_est, northing_est
+            break
+
+        easting_target_est, northing_target_est = easting_est, northing_est
+
+        outliers = np.abs(standardized_r_hat) > critical_value
+        if not np.any(outliers):
+            converged = True
+            break
+
+        obs_std[outliers] = obs_std[outliers] * OUTLIER_STD_INFLATION
+        rejected |= outliers
+
+    report = {
+        'iterations': iteration,
+        'rejected': np.flatnonzero(rejected).tolist(),
+        'converged': converged
+    }
+    return easting_target_est, northing_target_est, obs_std, report
 
-def retrieve_target_entries(target_object_key):
+def retrieve_target_entries(target_object_key, coord_store):
     """
-    Retrieve the most recent (last) target coordinates from the JSON file 
+    Retrieve the saved target coordinates from the coordinate store
     based on the target object key.
 
     Parameters:
-    target_object_key (str): The key for the target object in the JSON file.
+    target_object_key (str): The key for the target object in the saved coordinates.
+    coord_store (CoordinateStore): The session's saved coordinates.
 
     Returns:
     tuple: A tuple containing (latitude, longitude) of the last known target location.
@@ -334,19 +586,11 @@ def retrieve_target_entries(target_object_key):
         print(f"Valid target keys are: {sorted(valid_targets)}")
         raise ValueError(f"Invalid target key '{target_object_key}'. Must be one of: {sorted(valid_targets)}")
 
-    json_file_path = os.path.join(DATA_DIR, 'savedCoords.json')
-    if not os.path.exists(json_file_path):
-        print(f"JSON file not found at {json_file_path}. Please ensure the file exists.")
-        raise FileNotFoundError(f"JSON file not found at {json_file_path}")
-
-    with open(json_file_path, 'r') as json_file:
-        data = json.load(json_file)
-
-    if target_object_key not in data or not isinstance(data[target_object_key], list):
-        print(f"Target object '{target_object_key}' not found or has invalid format in JSON data.")
-        raise KeyError(f"Target object '{target_object_key}' not found or has invalid format in JSON data.")
+    target_entries = coord_store.get(target_object_key)
+    if target_entries is None:
+        print(f"Target object '{target_object_key}' not found in saved coordinates.")
+        raise KeyError(f"Target object '{target_object_key}' not found in saved coordinates.")
 
-    target_entries = data[target_object_key]
     if not target_entries:
         print(f"No entries found for target object '{target_object_key}'.")
         raise ValueError(f"No entries found for target object '{target_object_key}'.")
@@ -363,7 +607,7 @@ def parametric_model(target_object_key, target_entries):
     target_entries (list): A list of dictionaries containing target observations.
 
     Returns:
-    tuple: Estimated (latitude, longitude) after parametric adjustment.
+    tuple: Estimated (latitude, longitude, report) after parametric adjustment, see parametric_adjustment for the report.
     """
 
     # Extract vector data
@@ -379,42 +623,294 @@ def parametric_model(target_object_key, target_entries):
         'position_uncertainty': [entry['position_uncertainty'] for entry in target_entries]
     }
 
-    easting_drone = []
-    northing_drone = []
-    zone_drone = []
+    easting_drone, northing_drone, zone_drone = lat_long_to_utm_array(vectors['lat'], vectors['lon'])
 
-    for lat, lon in zip(vectors['lat'], vectors['lon']):
-        easting, northing, zone = lat_long_to_utm(lat, lon)
-        easting_drone.append(easting)
-        northing_drone.append(northing)
-        zone_drone.append(zone)
+    agl_drone = np.array(vectors['rel_alt'], dtype=float)
+    obs_std = np.array(vectors['position_uncertainty'], dtype=float) / 1000  # mm → meters
 
-    easting_target = []
-    northing_target = []
-    agl_drone = []
-    obs_std = []
-    
-    for easting_d, northing_d, agl, x_pix, y_pix, yaw, pitch, roll, pos_std in zip(
-        easting_drone, northing_drone, vectors['rel_alt'], vectors['x'], vectors['y'],
-        vectors['yaw'], vectors['pitch'], vectors['roll'], vectors['position_uncertainty']
-    ):
-        easting, northing = image_to_object_space(easting_d, northing_d, agl, x_pix, y_pix, yaw, pitch, roll)
-        easting_target.append(easting)
-        northing_target.append(northing)
-        agl_drone.append(agl)
-        obs_std.append(pos_std / 1000)  # mm → meters
+    easting_target, northing_target = image_to_object_space_batch(
+        easting_drone, northing_drone, agl_drone, vectors['x'], vectors['y'],
+        vectors['yaw'], vectors['pitch'], vectors['roll']
+    )
 
     # Parametric adjustment
-    easting_est, northing_est = parametric_adjustment(
-        np.array(easting_drone), np.array(northing_drone), np.array(agl_drone),
-        np.array(easting_target), np.array(northing_target), np.array(obs_std)
+    easting_est, northing_est, report = parametric_adjustment(
+        easting_drone, northing_drone, agl_drone,
+        easting_target, northing_target, obs_std
     )
 
     # Convert adjusted UTM to lat/lon
-    zone = zone_drone[0]  # Assuming consistent zone
+    zone = int(zone_drone[0])  # Assuming consistent zone
     lat, lon = utm_to_lat_long(easting_est, northing_est, zone, northern=True)
 
-    return lat, lon
+    return lat, lon, report
+
+# Distance (m) the accumulated correction may move the estimate away from its linearization point
+# before a full re-adjustment is run
+RELINEARIZE_DISTANCE = 1.0
+
+# Keys an observation entry needs to be georeferenced
+OBSERVATION_KEYS = ("lat", "lon", "rel_alt", "x", "y", "yaw", "pitch", "roll", "position_uncertainty")
+
+def locate_target(entry):
+    """
+    Georeference a single observation (image metadata plus pixel x and y) to geographic coordinates.
+
+    Parameters:
+    entry (dict): Observation with the keys in OBSERVATION_KEYS.
+
+    Returns:
+    tuple: (latitude, longitude) of the observed target.
+    """
+    easting, northing, zone = lat_long_to_utm(entry['lat'], entry['lon'])
+    easting_target, northing_target = image_to_object_space(
+        easting, northing, entry['rel_alt'], entry['x'], entry['y'], entry['yaw'], entry['pitch'], entry['roll']
+    )
+    return utm_to_lat_long(easting_target, northing_target, zone, northern=entry['lat'] >= 0)
+
+class TargetEstimator:
+    """
+    Incremental least squares estimate of a single target.
+
+    The normal equations N = A^T P A and U = A^T P w of the range model are accumulated at a fixed
+    linearization point (the last full adjustment), so each new observation updates the estimate in O(1).
+    The new observation is data snooped with the same t test robust_adjustment uses and, while flagged, its
+    standard deviation is inflated in place as robust_adjustment would, still O(1). A full robust_adjustment
+    only runs for a confirmed outlier (still flagged after MAX_OUTLIER_ITERATIONS inflations), which may have
+    pulled the estimate far enough to hide others, or when the estimate drifts more than RELINEARIZE_DISTANCE
+    from the linearization point.
+    """
+
+    def __init__(self):
+        self.fingerprints = []  # one per entry seen, including skipped ones, to detect edits (see TargetEstimates.sync)
+        self.zone = None
+        self.northern = True
+        self.easting_drone = []
+        self.northing_drone = []
+        self.agl_drone = []
+        self.easting_target = []
+        self.northing_target = []
+        self.obs_std = []
+        # Observation standard deviations used by the accumulators (outliers inflated by the last full adjustment)
+        self.weight_std = []
+        # Linearization point and accumulators
+        self.reference = None
+        self.N = np.zeros((2, 2))
+        self.U = np.zeros(2)
+        self.wPw = 0.0
+        self.full_adjustments = 0
+        self.adjusted_observations = 0
+        self.report = None
+
+    def add(self, entry):
+        """Add one observation and update the estimate."""
+        if not self.append_(entry):
+            return
+        n = len(self.obs_std)
+
+        # Need at least one degree of freedom for data snooping
+        if n <= 2:
+            return
+        if self.reference is None:
+            self.readjust()
+            return
+
+        a, w, p = self.linearize_(n - 1)
+        self.accumulate_(a, w, p)
+
+        correction = np.linalg.solve(self.N, self.U)
+        critical_value = stats.t.ppf(1 - SNOOPING_ALPHA/2, n - 2)
+        inflations = 0
+        while self.snooping_statistic_(a, w, p, correction) > critical_value:
+            if inflations == MAX_OUTLIER_ITERATIONS:
+                # A gross outlier can shift which others are outliers, let the full adjustment screen them all
+                self.readjust()
+                return
+            self.accumulate_(a, w, -p)
+            self.weight_std[-1] *= OUTLIER_STD_INFLATION
+            a, w, p = self.linearize_(n - 1)
+            self.accumulate_(a, w, p)
+            correction = np.linalg.solve(self.N, self.U)
+            inflations += 1
+
+        # The linearization is only valid close to the reference point, and the in place inflations only
+        # approximate a full robust pass, so also readjust each time the observations double (O(log n) in total)
+        if np.max(np.abs(correction)) > RELINEARIZE_DISTANCE or n >= 2 * self.adjusted_observations:
+            self.readjust()
+
+    def extend(self, entries):
+        """Add many observations with a single full adjustment."""
+        for entry in entries:
+            self.append_(entry)
+        if len(self.obs_std) > 2:
+            self.readjust()
+
+    def readjust(self):
+        """Run a full robust adjustment and re-seed the accumulators at its estimate."""
+        easting_drone = np.array(self.easting_drone)
+        northing_drone = np.array(self.northing_drone)
+        agl_drone = np.array(self.agl_drone)
+        easting_target = np.array(self.easting_target)
+        northing_target = np.array(self.northing_target)
+
+        easting_est, northing_est = self.utm_estimate_()
+        easting_est, northing_est, obs_std, self.report = robust_adjustment(
+            easting_drone, northing_drone, agl_drone, easting_target, northing_target, np.array(self.obs_std),
+            easting_est, northing_est
+        )
+        self.full_adjustments += 1
+        self.adjusted_observations = len(self.obs_std)
+        self.weight_std = obs_std.tolist()
+        self.reference = np.array([easting_est, northing_est])
+
+        # Accumulators at the new linearization point, the correction is zero by construction
+        A = design_matrix(easting_drone, northing_drone, agl_drone, easting_est, northing_est)
+        w = (model(easting_drone, northing_drone, easting_target, northing_target, agl_drone)
+             - model(easting_drone, northing_drone, easting_est, northing_est, agl_drone))
+        weights = 1 / obs_std**2
+        self.N = (A.T * weights) @ A
+        self.U = (A.T * weights) @ w
+        self.wPw = (weights * w) @ w
+
+    def estimate(self):
+        """
+        Current target estimate.
+
+        Returns:
+        dict: lat, lon, number of observations, number of full adjustments and the last adjustment report,
+        or None if there are no observations yet.
+        """
+        if not self.obs_std:
+            return None
+        lat, lon = utm_to_lat_long(*self.utm_estimate_(), self.zone, northern=self.northern)
+        return {
+            'lat': lat,
+            'lon': lon,
+            'observations': len(self.obs_std),
+            'full_adjustments': self.full_adjustments,
+            'report': self.report
+        }
+
+    def utm_estimate_(self):
+        if self.reference is None:
+            # Not enough observations to adjust, fall back to the mean of the georeferenced targets
+            return np.mean(self.easting_target), np.mean(self.northing_target)
+        correction = np.linalg.solve(self.N, self.U)
+        return self.reference[0] + correction[0], self.reference[1] + correction[1]
+
+    @property
+    def entries_seen(self):
+        return len(self.fingerprints)
+
+    def append_(self, entry):
+        self.fingerprints.append(fingerprint_(entry))
+        if any(entry.get(key) is None for key in OBSERVATION_KEYS):
+            print(f"Skipping observation with missing metadata: {entry.get('image')}")
+            return False
+
+        easting, northing, zone = lat_long_to_utm(entry['lat'], entry['lon'])
+        if self.zone is None:
+            self.zone = zone
+            self.northern = entry['lat'] >= 0
+        easting_target, northing_target = image_to_object_space(
+            easting, northing, entry['rel_alt'], entry['x'], entry['y'], entry['yaw'], entry['pitch'], entry['roll']
+        )
+
+        self.easting_drone.append(easting)
+        self.northing_drone.append(northing)
+        self.agl_drone.append(entry['rel_alt'])
+        self.easting_target.append(easting_target)
+        self.northing_target.append(northing_target)
+        self.obs_std.append(entry['position_uncertainty'] / 1000)  # mm → meters
+        self.weight_std.append(self.obs_std[-1])
+        return True
+
+    def accumulate_(self, a, w, p):
+        self.N += p * np.outer(a, a)
+        self.U += p * a * w
+        self.wPw += p * w * w
+
+    def linearize_(self, i):
+        """Design row, misclosure and weight of observation i at the linearization point."""
+        args = (self.easting_drone[i], self.northing_drone[i], self.reference[0], self.reference[1], self.agl_drone[i])
+        a = np.array([f_dx_target(*args), f_dy_target(*args)])
+        w = (model(self.easting_drone[i], self.northing_drone[i], self.easting_target[i], self.northing_target[i], self.agl_drone[i])
+             - model(*args))
+        return a, w, 1 / self.weight_std[i]**2
+
+    def snooping_statistic_(self, a, w, p, correction):
+        """Absolute standardized residual of the newest observation against the updated estimate, 0 if undefined."""
+        dof = len(self.obs_std) - 2
+        a_posteriori_variance_factor = (self.wPw - self.U @ correction) / dof
+        if a_posteriori_variance_factor <= 0:
+            return 0.0
+
+        r = w - a @ correction
+        Cr_hat = a_posteriori_variance_factor * (1 / p - a @ np.linalg.solve(self.N, a))
+        if Cr_hat <= 0:
+            return 0.0
+        return abs(r / np.sqrt(Cr_hat))
+
+def fingerprint_(entry):
+    """Content hash of an observation entry, so a changed or deleted entry is noticed."""
+    return hash(json.dumps(entry, sort_keys=True, default=str))
+
+class TargetEstimates:
+    """Thread-safe collection of TargetEstimators keyed by target object key."""
+
+    def __init__(self):
+        self.estimators = {}
+        self.lock = Lock()
+
+    def add(self, target_object_key, entry):
+        """Add an observation for a target and return its updated estimate."""
+        with self.lock:
+            estimator = self.estimators.setdefault(target_object_key, TargetEstimator())
+            estimator.add(entry)
+            return estimator.estimate()
+
+    def estimate(self, target_object_key):
+        """Return the current estimate for a target, or None if it has no observations."""
+        with self.lock:
+            estimator = self.estimators.get(target_object_key)
+            return estimator.estimate() if estimator else None
+
+    def rebuild(self, target_object_key, entries):
+        """Replace the observations of a target, e.g. after one was deleted."""
+        with self.lock:
+            estimator = TargetEstimator()
+            estimator.extend(entries)
+            self.estimators[target_object_key] = estimator
+            return estimator.estimate()
+
+    def sync(self, target_object_key, entries):
+        """
+        Return the estimate for a target after bringing it in step with entries.
+
+        If the entries the estimator has seen are still the leading entries, the new trailing entries are added
+        incrementally. Otherwise (an entry was deleted or edited, even if another was appended since) the
+        estimator is rebuilt from entries.
+        """
+        with self.lock:
+            estimator = self.estimators.get(target_object_key)
+            seen = estimator.entries_seen if estimator is not None else 0
+            if (estimator is None or seen > len(entries)
+                    or [fingerprint_(entry) for entry in entries[:seen]] != estimator.fingerprints):
+                estimator = TargetEstimator()
+                estimator.extend(entries)
+                self.estimators[target_object_key] = estimator
+            else:
+                for entry in entries[estimator.entries_seen:]:
+                    estimator.add(entry)
+            return estimator.estimate()
+
+    def reset(self, target_object_key=None):
+        """Drop the estimate for a target, or for all targets if no key is given."""
+        with self.lock:
+            if target_object_key is None:
+                self.estimators.clear()
+            else:
+                self.estimators.pop(target_object_key, None)
 
 def single_target_coordinate(target_object_key, target_entries):
     """
@@ -437,27 +933,33 @@ def single_target_coordinate(target_object_key, target_entries):
 
     return None, None
 
-def get_target_coordinates(target_object_key):
+def get_target_coordinates(target_object_key, coord_store, manual_estimates):
     """
     Get the target coordinates from the JSON file.
 
     Parameters:
     target_object_key (str): The key for the target object in the JSON file.
+    coord_store (CoordinateStore): The session's saved coordinates.
+    manual_estimates (TargetEstimates): The session's live estimates from saved coordinates.
 
     Returns:
-    tuple: A tuple containing (latitude, longitude) of the last known target location.
+    tuple: A tuple containing (latitude, longitude, report) of the last known target location.
+    report is the adjustment report from parametric_adjustment, or None if no adjustment was run.
     """
     
     # Pull list of target entries from JSON file    
-    target_entries = retrieve_target_entries(target_object_key)
+    target_entries = retrieve_target_entries(target_object_key, coord_store)
     if not target_entries:
         print(f"No entries found for target object '{target_object_key}'.")
-        return None, None
+        return None, None, None
 
     try:
         if len(target_entries) > 1:
-            lat, lon = parametric_model(target_object_key, target_entries)
-            return lat, lon
+            # Incremental estimate, only re-adjusted from scratch if savedCoords changed behind its back
+            estimate = manual_estimates.sync(target_object_key, target_entries)
+            if estimate is None:
+                return None, None, None
+            return estimate['lat'], estimate['lon'], estimate['report']
         else:
             lat, lon = single_target_coordinate(target_object_key, target_entries)
 
@@ -474,16 +976,19 @@ def get_target_coordinates(target_object_key):
         with open(output_path, 'w') as f:
             json.dump(output_data, f, indent=4)
         
-        return lat, lon
+        return lat, lon, None
 
     except Exception as e:
         print(f"Error retrieving target coordinates: {e}")
-        return None, None
+        return None, None, None
 
 if __name__ == "__main__":
+    from sessions import session_manager
     target_key = "car"
+    session = session_manager.active()
     try:
-        lat, lon = get_target_coordinates(target_key)
+        lat, lon, report = get_target_coordinates(target_key, session.coord_store, session.manual_estimates)
         print(f"Estimated coordinates for '{target_key}': Latitude: {lat}, Longitude: {lon}")
+        print(f"Adjustment report: {report}")
     except Exception as e:
         print(f"Error processing parametric model for '{target_key}': {e}")
@@ -0,0 +1,172 @@
+import numpy as np
+from threading import Lock
+
+HISTORY_CAPACITY = 4 * 60 * 60 * 2  # samples kept, 4 hours of heartbeats at 2 Hz (about 7 MB)
+MAX_GAP = 2.0  # seconds, samples further apart than this are not interpolated between (e.g. A link dropout)
+TIME_KEY = 'last_time'  # vehicle clock of a heartbeat, the same clock as last_time in the image JSON
+
+# Channels recorded from every heartbeat, in column order
+CHANNELS = ("lat", "lon", "rel_alt", "alt", "roll", "pitch", "yaw", "heading", "groundspeed", "climb",
+            "throttle", "battery_voltage", "battery_current", "battery_remaining")
+# Angles are interpolated along the shorter arc, by the value of a full turn
+ANGLE_CHANNELS = {"roll": 2 * np.pi, "pitch": 2 * np.pi, "yaw": 2 * np.pi, "heading": 360.0}
+# Image JSON keys replaced by the interpolated pose when an image carries its capture time
+POSE_KEYS = ("lat", "lon", "rel_alt", "alt", "roll", "pitch", "yaw")
+
+class TelemetryHistory:
+    """
+    Timestamped vehicle states in a fixed size ring buffer of NumPy arrays, fed by the telemetry poller.
+
+    One float64 row per heartbeat, the oldest rows are overwritten once capacity is reached. Every row is written
+    twice, capacity rows apart, so the samples are always a contiguous oldest first slice of the arrays and
+    queries never copy the buffer. Heartbeats that repeat or go back in time are ignored, so timestamps are
+    strictly increasing and queries binary search them. interpolate() looks up any number of times in one
+    vectorized call.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, channels=CHANNELS):
+        self.channels = tuple(channels)
+        self.columns = {channel: index for index, channel in enumerate(self.channels)}
+        self.capacity = capacity
+        self.lock = Lock()
+        self.times = np.zeros(2 * capacity, dtype=np.float64)
+        self.values = np.zeros((2 * capacity, len(self.channels)), dtype=np.float64)
+        self.head = 0  # next row written
+        self.count = 0
+
+    def __len__(self):
+        with self.lock:
+            return self.count
+
+    def append(self, vehicle_data):
+        """Record one heartbeat, returns False if it is not newer than the last one recorded."""
+        timestamp = vehicle_data.get(TIME_KEY)
+        if not timestamp:
+            return False
+        row = [vehicle_data.get(channel) for channel in self.channels]
+        row = [np.nan if value is None else value for value in row]
+        with self.lock:
+            if self.count and timestamp <= self.times[self.head - 1]:
+                return False
+            for index in (self.head, self.head + self.capacity):
+                self.times[index] = timestamp
+                self.values[index] = row
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.head = 0
+            self.count = 0
+
+    def ordered_(self):
+        """Views of the recorded times and values oldest first, the caller must hold the lock while using them."""
+        first = self.head if self.count == self.capacity else 0
+        return self.times[first:first + self.count], self.values[first:first + self.count]
+
+    def span(self):
+        """Return the (first, last) recorded time, or None if nothing has been recorded."""
+        with self.lock:
+            if not self.count:
+                return None
+            times, _ = self.ordered_()
+            return float(times[0]), float(times[-1])
+
+    def window(self, start=None, end=None, channels=None):
+        """
+        Return the samples recorded between start and end (inclusive, either may be None).
+
+        Returns:
+        tuple: (times array, dict of channel -> values array), oldest first.
+        """
+        channels = self.channels if channels is None else channels
+        columns = [self.columns[channel] for channel in channels]  # KeyError for an unknown channel
+        with self.lock:
+            times, values = self.ordered_()
+            first = 0 if start is None else np.searchsorted(times, start, side='left')
+            last = len(times) if end is None else np.searchsorted(times, end, side='right')
+            return (times[first:last].copy(),
+                    {channel: values[first:last, column].copy() for channel, column in zip(channels, columns)})
+
+    def interpolate(self, query_times, channels=None):
+        """
+        Interpolate channels at arbitrary times in one vectorized pass.
+
+        Times outside the recorded span, or between two samples more than MAX_GAP apart, give NaN.
+
+        Parameters:
+        query_times (array-like): Times on the vehicle clock.
+        channels (iterable): Channels to return, all by default.
+
+        Returns:
+        dict: channel -> array of values, one per query time.
+        """
+        channels = self.channels if channels is None else channels
+        columns = [self.columns[channel] for channel in channels]
+        query_times = np.atleast_1d(np.asarray(query_times, dtype=np.float64))
+        with self.lock:
+            times, values = self.ordered_()
+            if len(times) == 0:
+                return {channel: np.full(len(query_times), np.nan) for channel in channels}
+            if len(times) == 1:
+                exact = query_times == times[0]
+                return {channel: np.where(exact, values[0, column], np.nan) for channel, column in zip(channels, columns)}
+
+            # Index of the sample at or after each query, bracketed by the sample before it
+            after = np.clip(np.searchsorted(times, query_times, side='left'), 1, len(times) - 1)
+            before = after - 1
+            bracket_times = times[before], times[after]
+            # Fancy indexing copies the bracketing rows, the buffer is not used outside the lock
+            bracket_values = values[before][:, columns], values[after][:, columns]
+            valid = (query_times >= times[0]) & (query_times <= times[-1])
+
+        gap = bracket_times[1] - bracket_times[0]
+        fraction = (query_times - bracket_times[0]) / gap
+        valid &= gap <= MAX_GAP
+
+        result = {}
+        for index, channel in enumerate(channels):
+            start, stop = bracket_values[0][:, index], bracket_values[1][:, index]
+            delta = stop - start
+            full_turn = ANGLE_CHANNELS.get(channel)
+            if full_turn is not None:
+                # Shorter arc, then back into the range the vehicle reports
+                delta = (delta + full_turn / 2) % full_turn - full_turn / 2
+                interpolated = start + fraction * delta
+                low = -full_turn / 2 if channel != "heading" else 0.0
+                interpolated = (interpolated - low) % full_turn + low
+            else:
+                interpolated = start + fraction * delta
+            result[channel] = np.where(valid, interpolated, np.nan)
+        return result
+
+    def pose_at(self, capture_time):
+        """Return the interpolated pose (POSE_KEYS) at one time as a dict, or None if it is not covered."""
+        pose = self.interpolate([capture_time], POSE_KEYS)
+        pose = {key: float(values[0]) for key, values in pose.items()}
+        if any(np.isnan(value) for value in pose.values()):
+            return None
+        return pose
+
+    def align(self, entry):
+        """
+        Replace the pose of an image JSON entry with the pose interpolated at its capture_time.
+
+        The aircraft writes its latest telemetry snapshot into each image JSON, which can lag the shutter. If the
+        entry has a capture_time on the vehicle clock that the history covers, the pose at that instant is used
+        instead. Returns a new dict with pose_source set to 'history' or 'snapshot'.
+        """
+        entry = dict(entry)
+        capture_time = entry.get('capture_time')
+        pose = self.pose_at(capture_time) if capture_time else None
+        if pose is None:
+            entry['pose_source'] = 'snapshot'
+            return entry
+        entry.update(pose)
+        entry['pose_source'] = 'history'
+        return entry
+
+
+# Process-wide telemetry history fed by the telemetry poller and read by the AI workers and endpoints
+telemetry_history = TelemetryHistory()
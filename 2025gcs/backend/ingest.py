@@ -0,0 +1,175 @@
+import os
+import json
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from threading import Lock
+from werkzeug.utils import secure_filename
+from detection import notify_image
+from events import broker
+
+CHUNK_SIZE = 1024 * 1024  # bytes copied at a time from the upload to disk
+IMAGE_EXTENSION = '.jpg'
+DATA_EXTENSION = '.json'
+
+pair_lock = Lock()  # makes the rename and the check for the other half of a frame atomic
+
+class UploadError(Exception):
+    """An upload that cannot be stored, the message is returned to the client."""
+
+
+def write_atomic_(session, stream, folder, file_name, validate=None):
+    """
+    Stream an upload to a temp file, fsync it and rename it into place, so readers never see a partial file.
+
+    validate, if given, is called with the temp file path before the rename and may raise UploadError to
+    discard the upload.
+    """
+    final_path = os.path.join(folder, file_name)
+    temp_path = os.path.join(folder, f'.{file_name}.part')
+    try:
+        with open(temp_path, 'wb') as file:
+            shutil.copyfileobj(stream, file, CHUNK_SIZE)
+            file.flush()
+            os.fsync(file.fileno())
+        if validate is not None:
+            validate(temp_path)
+        with pair_lock:
+            os.replace(temp_path, final_path)
+            sync_directory_(folder)
+            return frame_complete_(session, file_name)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def validate_data_(file_name):
+    """Return a validator for write_atomic_ rejecting telemetry that is not a JSON object."""
+    def validate(path):
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except ValueError as e:
+            raise UploadError(f'{file_name}: telemetry is not valid JSON ({e})')
+        if not isinstance(data, dict):
+            raise UploadError(f'{file_name}: telemetry must be a JSON object')
+    return validate
+
+
+def sync_directory_(folder):
+    """fsync a directory so a rename survives power loss, not supported on Windows."""
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def frame_complete_(session, file_name):
+    """Return True if both the image and the telemetry of the frame are on disk, the caller must hold pair_lock."""
+    stem = os.path.splitext(file_name)[0]
+    return (os.path.exists(os.path.join(session.images_dir, stem + IMAGE_EXTENSION))
+            and os.path.exists(os.path.join(session.image_data_dir, stem + DATA_EXTENSION)))
+
+
+def announce_(session, stem):
+    """Hand a complete frame to the catalogue, the preview cache, the AI pipeline and stream clients."""
+    image_name = stem + IMAGE_EXTENSION
+    mtime = session.catalogue.add_image(image_name)
+    try:
+        session.catalogue.add_data(stem + DATA_EXTENSION)
+    except (OSError, ValueError) as e:
+        # Validated before it was stored, but it may have been replaced since. Index the image on its own
+        print(f"Skipping unreadable image data {stem + DATA_EXTENSION}: {e}")
+    session.footprints.add(image_name, session.catalogue.get_data(image_name))
+    session.previews.schedule(image_name)
+    notify_image(os.path.join(session.images_dir, image_name))
+    broker.publish('image', {'name': image_name, 'session': session.name, 'mtime': mtime})
+
+
+def ingest_file(session, file_name, stream, is_data=None):
+    """
+    Store one image or telemetry JSON of a session read from stream, returns the stored file name.
+
+    is_data selects the telemetry folder, by default it is inferred from the extension. The frame is announced
+    once both its image and its JSON have been stored, whichever arrives last. Raises UploadError if the file
+    name is unusable or the telemetry is not a JSON object, in which case nothing is stored.
+    """
+    file_name = secure_filename(os.path.basename(file_name or ''))
+    if not file_name:
+        raise UploadError('Missing file name')
+
+    if is_data is None:
+        is_data = file_name.endswith(DATA_EXTENSION)
+    if is_data:
+        if not file_name.endswith(DATA_EXTENSION):
+            raise UploadError(f'{file_name}: telemetry must be a {DATA_EXTENSION} file')
+        folder = session.image_data_dir
+        validate = validate_data_(file_name)
+    else:
+        if not file_name.endswith(IMAGE_EXTENSION):
+            raise UploadError(f'{file_name}: images must be {IMAGE_EXTENSION} files')
+        folder = session.images_dir
+        validate = None
+
+    os.makedirs(folder, exist_ok=True)
+    if write_atomic_(session, stream, folder, file_name, validate):
+        announce_(session, os.path.splitext(file_name)[0])
+    return file_name
+
+
+def ingest_upload(session, file):
+    """Store one file from a multipart upload, see ingest_file."""
+    is_data = file.mimetype == 'application/json' or (file.filename or '').endswith(DATA_EXTENSION)
+    return ingest_file(session, file.filename, file.stream, is_data)
+
+
+def ingest_member_(session, name, stream):
+    """Store one archive member, returns its result entry."""
+    try:
+        return {'name': ingest_file(session, name, stream), 'saved': True}
+    except UploadError as e:
+        return {'name': name, 'saved': False, 'error': str(e)}
+    except OSError as e:
+        print(f"Error saving archive member {name}: {e}")
+        return {'name': name, 'saved': False, 'error': str(e)}
+
+
+def ingest_tar(session, stream):
+    """
+    Unpack a tar archive (optionally gzip/bz2/xz compressed) member by member as it streams in.
+
+    Only regular files are stored, directories in member names are ignored. Returns a result per member.
+    """
+    results = []
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    results.append(ingest_member_(session, member.name, archive.extractfile(member)))
+    except (tarfile.TarError, EOFError) as e:
+        # Keep what was stored before the archive broke off, e.g. when the link dropped mid-upload
+        results.append({'name': None, 'saved': False, 'error': f'Archive truncated or corrupt: {e}'})
+    return results
+
+
+def ingest_zip(session, stream):
+    """
+    Unpack a zip archive. Zip keeps its index at the end, so the upload is spooled to a temporary file on disk
+    (never held in memory) before unpacking.
+    """
+    results = []
+    with tempfile.TemporaryFile(dir=session.root) as spool:
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        spool.seek(0)
+        try:
+            with zipfile.ZipFile(spool) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as member:
+                            results.append(ingest_member_(session, info.filename, member))
+        except zipfile.BadZipFile as e:
+            results.append({'name': None, 'saved': False, 'error': f'Archive truncated or corrupt: {e}'})
+    return results
@@ -0,0 +1,47 @@
+from threading import Lock
+
+class MissionState:
+    """
+    The operator's mission state: the target being flown to, the targets already dropped on and the camera state.
+
+    Shared by every request thread and the telemetry poller, so all access goes through a lock and readers get
+    copies. on_targets(current_target, completed_targets) is called after every target change, under the lock
+    so listeners see changes in the order they happened.
+    """
+
+    def __init__(self, on_targets=None):
+        self.lock = Lock()
+        self.current_target = None
+        self.completed_targets = []
+        self.camera_on = False
+        self.on_targets = on_targets
+
+    def targets(self):
+        """Return (current target, completed targets)."""
+        with self.lock:
+            return self.current_target, list(self.completed_targets)
+
+    def set_target(self, target):
+        with self.lock:
+            self.current_target = target
+            self.notify_()
+
+    def complete_target(self):
+        """Move the current target to the completed targets, returns it or None if no target was set."""
+        with self.lock:
+            target = self.current_target
+            if target is not None:
+                self.completed_targets.append(target)
+                self.current_target = None
+                self.notify_()
+            return target
+
+    def toggle_camera(self):
+        """Flip the camera state, returns the new state."""
+        with self.lock:
+            self.camera_on = not self.camera_on
+            return self.camera_on
+
+    def notify_(self):
+        if self.on_targets is not None:
+            self.on_targets(self.current_target, list(self.completed_targets))
@@ -10,11 +10,12 @@ fi
 LOWER_INDEX=$1
 UPPER_INDEX=$2
 
-# Set variables
-USER_NAME="$USER"
-TARGET_DIR="/Users/${USER_NAME}/Documents/datasets/code"
-PYTHON_EXEC="/opt/anaconda3/bin/python"
-PYTHON_SCRIPT="/Users/liammah/Desktop/University/Schulich UAV/2025/2025GCS/2025gcs/backend/odm/odm_filter.py"
+# Set variables, DATASETS_DIR and PYTHON can be overridden from the environment
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+DATASETS_DIR="${DATASETS_DIR:-$HOME/Documents/datasets}"
+TARGET_DIR="${DATASETS_DIR}/code"
+PYTHON_EXEC="${PYTHON:-python3}"
+PYTHON_SCRIPT="${SCRIPT_DIR}/odm_filter.py"
 
 # Step 1: Clean the target directory
 rm -rf "${TARGET_DIR:?}"/*
@@ -27,13 +28,13 @@ echo "✅ Directory cleaned and folders created."
 
 # Step 3: Run the Python filter script with the provided range
 echo "🚀 Running Python script with image bounds $LOWER_INDEX to $UPPER_INDEX..."
-"$PYTHON_EXEC" "$PYTHON_SCRIPT" "$LOWER_INDEX" "$UPPER_INDEX"
+"$PYTHON_EXEC" "$PYTHON_SCRIPT" "$LOWER_INDEX" "$UPPER_INDEX" --output-dir "$TARGET_DIR"
 echo "✅ Python script completed."
 
 
 # Step 4: Run ODM with Docker
 # echo "🐳 Starting ODM Docker container..."
-docker run -ti --rm -v "/Users/liammah/Documents/datasets:/datasets" \
+docker run -ti --rm -v "${DATASETS_DIR}:/datasets" \
  opendronemap/odm:latest \
  --project-path /datasets \
  --geo /datasets/code/odm_geotags.txt \
@@ -50,6 +51,6 @@ docker run -ti --rm -v "/Users/liammah/Documents/datasets:/datasets" \
 
 echo "✅ ODM processing complete."
 
-cp /Users/liammah/Documents/datasets/code/opensfm/stats/ortho.png /Users/liammah/Desktop/University/"Schulich UAV"/2025/2025GCS/2025gcs/backend/odm/map.png
+cp "${TARGET_DIR}/opensfm/stats/ortho.png" "${SCRIPT_DIR}/map.png"
 
 echo "✅ Orthophoto copied to odm_ortho.png in geo folder."
\ No newline at end of file
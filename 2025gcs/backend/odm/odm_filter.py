@@ -1,139 +1,208 @@
+"""
+Preprocessing for ODM mapping: picks frames at least DISTANCE_THRESHOLD metres apart, copies them into the ODM
+project and writes their geotags file. Run it before running the ODM mapping (see odm.bash).
+
+Usage: python odm_filter.py <lower_index> <upper_index> [--output-dir DIR] [--json-dir DIR] [--images-dir DIR]
+                            [--threshold METRES] [--link] [--workers N]
+
+Can also be imported, e.g. thin_frames() on frames from load_frames().
+"""
 import os
 import sys
 import json
 import shutil
-from geopy.distance import geodesic
-
-"""
-Preprocessing file for ODM mapping. This script needs to be manually run before running the ODM mapping.
-"""
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pyproj import Geod, Transformer
 
-# Handle CLI args
-try:
-    lower_index = int(sys.argv[1])
-    upper_index = int(sys.argv[2])
-    print(f"Filtering images from index {lower_index} to {upper_index}")
-except (IndexError, ValueError):
-    print("Usage: python odm_filter.py <lower_index> <upper_index>")
-    sys.exit(1)
-
-# Directory paths
-user = "liammah"
-json_directory = f"/Users/{user}/Desktop/University/Schulich UAV/2025/2025GCS/2025gcs/backend/data/imageData"
-source_images_directory = f"/Users/{user}/Desktop/University/Schulich UAV/2025/2025GCS/2025gcs/backend/data/images"
-filtered_images_directory = f"/Users/{user}/Documents/datasets/code/images"
-output_file = f"/Users/{user}/Documents/datasets/code/odm_geotags.txt"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JSON_DIRECTORY = os.path.join(BACKEND_DIR, 'data', 'imageData')
+IMAGES_DIRECTORY = os.path.join(BACKEND_DIR, 'data', 'images')
+OUTPUT_DIRECTORY = os.path.join(BACKEND_DIR, 'data', 'odm_project')  # gets images/ and odm_geotags.txt
 
 # Distance threshold (meters)
 DISTANCE_THRESHOLD = 10
-
-# Ensure filtered images directory is clean
-if os.path.exists(filtered_images_directory):
-    shutil.rmtree(filtered_images_directory)
-os.makedirs(filtered_images_directory, exist_ok=True)
-
-# Initialize geotags file with EPSG declaration
-lines = ["EPSG:4326"]
-filtered_images = []
-used_coords = []
-
-# Load and sort JSON files
-json_files = sorted(
-    [f for f in os.listdir(json_directory) if f.lower().endswith(".json")]
-)
-
-# Apply index filtering
-json_files = json_files[lower_index:upper_index]
-
-# Process each selected JSON file
-for filename in json_files:
-    filepath = os.path.join(json_directory, filename)
-    try:
-        with open(filepath, "r", encoding="utf-8") as json_file:
-            data = json.load(json_file)
-
-            base_name = os.path.splitext(filename)[0]
-            possible_extensions = [".jpg", ".JPG", ".jpeg", ".JPEG"]
-            capture_name = None
-
-            # Try to find corresponding image
-            for ext in possible_extensions:
-                temp_capture_name = base_name + ext
-                image_path = os.path.join(source_images_directory, temp_capture_name)
-                if os.path.isfile(image_path):
-                    capture_name = temp_capture_name
-                    break
-
-            if not capture_name:
-                print(f"Warning: Image file for {filename} not found. Skipping.")
-                continue
-
-            # Extract GPS and orientation
-            lat = data.get("lat", 0.0)
-            lon = data.get("lon", 0.0)
-            alt = data.get("rel_alt", 0.0)
-            yaw = data.get("yaw", 0.0)
-            pitch = data.get("pitch", 0.0)
-            roll = data.get("roll", 0.0)
-
-            if any(not isinstance(v, (int, float)) for v in [lat, lon, alt, yaw, pitch, roll]):
-                print(f"Warning: Invalid data in {filename}. Skipping.")
+CELL_MARGIN = 1.01  # grid cells are slightly larger than the threshold to absorb the projection's scale error
+TRANSFER_WORKERS = 8  # threads copying or linking images
+IMAGE_EXTENSIONS = [".jpg", ".JPG", ".jpeg", ".JPEG"]
+
+WGS84_GEOD = Geod(ellps='WGS84')  # same ellipsoid and geodesic as geopy.distance.geodesic
+
+def load_frames(json_directory=JSON_DIRECTORY, images_directory=IMAGES_DIRECTORY, lower_index=None, upper_index=None):
+    """
+    Read the pose of every frame whose image exists, in file name order.
+
+    lower_index and upper_index slice the sorted JSON files like list indices. Frames with a missing image, JSON
+    that is not an object or a non-numeric pose are skipped with a warning.
+
+    Returns:
+    list: (capture name, lat, lon, alt, yaw, pitch, roll) tuples, values as they appear in the JSON.
+    """
+    json_files = sorted(f for f in os.listdir(json_directory) if f.lower().endswith(".json"))
+    json_files = json_files[lower_index:upper_index]
+
+    frames = []
+    for filename in json_files:
+        filepath = os.path.join(json_directory, filename)
+        try:
+            with open(filepath, "r", encoding="utf-8") as json_file:
+                data = json.load(json_file)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON from {filepath}: {e}")
+            continue
+        except Exception as e:
+            print(f"Unexpected error processing {filepath}: {e}")
+            continue
+        if not isinstance(data, dict):
+            print(f"Warning: {filename} is not a JSON object. Skipping.")
+            continue
+
+        base_name = os.path.splitext(filename)[0]
+        capture_name = next((base_name + ext for ext in IMAGE_EXTENSIONS
+                             if os.path.isfile(os.path.join(images_directory, base_name + ext))), None)
+        if not capture_name:
+            print(f"Warning: Image file for {filename} not found. Skipping.")
+            continue
+
+        # Extract GPS and orientation
+        pose = [data.get(key, 0.0) for key in ("lat", "lon", "rel_alt", "yaw", "pitch", "roll")]
+        if any(not isinstance(v, (int, float)) for v in pose):
+            print(f"Warning: Invalid data in {filename}. Skipping.")
+            continue
+        frames.append((capture_name, *pose))
+    return frames
+
+
+def thin_frames(frames, threshold=DISTANCE_THRESHOLD):
+    """
+    Keep a frame only if it is at least threshold metres (geodesic) from every frame kept before it.
+
+    Frames are projected to a local azimuthal equidistant plane centred on the first frame and hashed into
+    a grid of threshold sized cells, so each frame is only compared with kept frames in the 3x3 cells around
+    it: O(n) instead of comparing against every kept frame. The candidates are then checked with the exact
+    WGS84 geodesic, so the frames kept are the same as with a full geodesic comparison.
+    """
+    if not frames:
+        return []
+    lat0, lon0 = frames[0][1], frames[0][2]
+    to_local = Transformer.from_crs('EPSG:4326', f'+proj=aeqd +lat_0={lat0} +lon_0={lon0} +ellps=WGS84', always_xy=True)
+    xs, ys = to_local.transform([frame[2] for frame in frames], [frame[1] for frame in frames])
+
+    cell_size = threshold * CELL_MARGIN
+    grid = defaultdict(list)  # (column, row) -> kept (lat, lon)
+    kept = []
+    for frame, x, y in zip(frames, xs, ys):
+        lat, lon = frame[1], frame[2]
+        column, row = int(x // cell_size), int(y // cell_size)
+        candidates = [coord for dc in (-1, 0, 1) for dr in (-1, 0, 1) for coord in grid.get((column + dc, row + dr), ())]
+        if candidates:
+            _, _, distances = WGS84_GEOD.inv([lon] * len(candidates), [lat] * len(candidates),
+                                             [coord[1] for coord in candidates], [coord[0] for coord in candidates])
+            if min(distances) < threshold:
                 continue
-
-            # Filter based on distance
-            keep = True
-            for coord in used_coords:
-                if geodesic((lat, lon), coord).meters < DISTANCE_THRESHOLD:
-                    keep = False
-                    break
-
-            if keep:
-                used_coords.append((lat, lon))
-                filtered_images.append(capture_name)
-                line = f"{capture_name} {lat} {lon} {alt} {yaw} {pitch} {roll}"
-                lines.append(line)
-
-                src_image_path = os.path.join(source_images_directory, capture_name)
-                dst_image_path = os.path.join(filtered_images_directory, capture_name)
-                shutil.copy2(src_image_path, dst_image_path)
-                print(f"Copied {capture_name} to {filtered_images_directory}")
-
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {filepath}: {e}")
-    except Exception as e:
-        print(f"Unexpected error processing {filepath}: {e}")
-
-# Ensure some images were copied
-if not os.listdir(filtered_images_directory):
-    print("No filtered images were copied. Check JSON and image paths!")
-else:
-    print(f"Filtered images successfully moved to {filtered_images_directory}")
-
-# Write geotags file
-try:
-    with open(output_file, "w", encoding="utf-8", newline='\n') as output:
-        output.write("\n".join(lines))
-    print(f"Filtered geotags written to {output_file}")
-except Exception as e:
-    print(f"Error writing geotags file: {e}")
-
-# Validate geotags
-invalid_entries = []
-try:
-    with open(output_file, "r", encoding="utf-8") as f:
+        grid[(column, row)].append((lat, lon))
+        kept.append(frame)
+    return kept
+
+
+def geotag_lines(frames):
+    """ODM geotags file lines: the EPSG declaration, then one 'name lat lon alt yaw pitch roll' line per frame."""
+    return ["EPSG:4326"] + [f"{name} {lat} {lon} {alt} {yaw} {pitch} {roll}" for name, lat, lon, alt, yaw, pitch, roll in frames]
+
+
+def transfer_images(names, source_directory, target_directory, link=False, workers=TRANSFER_WORKERS):
+    """
+    Copy (or hard link) images into target_directory in parallel, returns the names transferred.
+
+    Hard links cost no space or time but need both folders on the same file system, otherwise the image is copied.
+    """
+    def transfer(name):
+        source, target = os.path.join(source_directory, name), os.path.join(target_directory, name)
+        try:
+            if link:
+                try:
+                    os.link(source, target)
+                    return name
+                except OSError:
+                    pass  # e.g. another drive, fall back to copying
+            shutil.copy2(source, target)
+            return name
+        except OSError as e:
+            print(f"Error copying {name}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [name for name in pool.map(transfer, names) if name is not None]
+
+
+def validate_geotags(path):
+    """Return (line number, line) for every geotag line ODM would reject."""
+    invalid_entries = []
+    with open(path, "r", encoding="utf-8") as f:
         for line_number, line in enumerate(f, start=1):
             if line_number == 1:
                 continue
             if "NaN" in line or len(line.strip().split()) != 7:
                 invalid_entries.append((line_number, line.strip()))
-except Exception as e:
-    print(f"Error validating geotags file: {e}")
-
-if invalid_entries:
-    print("Invalid entries found in geotags file:")
-    for line_number, entry in invalid_entries:
-        print(f"Line {line_number}: {entry}")
-else:
+    return invalid_entries
+
+
+def filter_for_odm(output_directory=OUTPUT_DIRECTORY, json_directory=JSON_DIRECTORY, images_directory=IMAGES_DIRECTORY,
+                   lower_index=None, upper_index=None, threshold=DISTANCE_THRESHOLD, link=False, workers=TRANSFER_WORKERS):
+    """
+    Prepare an ODM project: output_directory/images holds the kept frames and output_directory/odm_geotags.txt
+    their geotags. The images folder is emptied first. Returns the path of the geotags file.
+    """
+    filtered_images_directory = os.path.join(output_directory, "images")
+    output_file = os.path.join(output_directory, "odm_geotags.txt")
+
+    # Ensure filtered images directory is clean
+    if os.path.exists(filtered_images_directory):
+        shutil.rmtree(filtered_images_directory)
+    os.makedirs(filtered_images_directory, exist_ok=True)
+
+    frames = load_frames(json_directory, images_directory, lower_index, upper_index)
+    kept = thin_frames(frames, threshold)
+    print(f"Kept {len(kept)} of {len(frames)} frames at least {threshold} m apart")
+
+    transferred = transfer_images([frame[0] for frame in kept], images_directory, filtered_images_directory, link, workers)
+    if not transferred:
+        print("No filtered images were copied. Check JSON and image paths!")
+    else:
+        print(f"{'Linked' if link else 'Copied'} {len(transferred)} images to {filtered_images_directory}")
+
+    with open(output_file, "w", encoding="utf-8", newline='\n') as output:
+        output.write("\n".join(geotag_lines(kept)))
+    print(f"Filtered geotags written to {output_file}")
+    return output_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Select frames for ODM mapping and write their geotags")
+    parser.add_argument('lower_index', type=int, help="first JSON file (sorted by name) to consider")
+    parser.add_argument('upper_index', type=int, help="JSON file to stop before")
+    parser.add_argument('--output-dir', default=OUTPUT_DIRECTORY, help="ODM project folder, gets images/ and odm_geotags.txt")
+    parser.add_argument('--json-dir', default=JSON_DIRECTORY)
+    parser.add_argument('--images-dir', default=IMAGES_DIRECTORY)
+    parser.add_argument('--threshold', type=float, default=DISTANCE_THRESHOLD, help="minimum metres between kept frames")
+    parser.add_argument('--link', action='store_true', help="hard link images instead of copying them")
+    parser.add_argument('--workers', type=int, default=TRANSFER_WORKERS)
+    args = parser.parse_args(argv)
+    print(f"Filtering images from index {args.lower_index} to {args.upper_index}")
+
+    output_file = filter_for_odm(args.output_dir, args.json_dir, args.images_dir, args.lower_index, args.upper_index,
+                                 args.threshold, args.link, args.workers)
+
+    invalid_entries = validate_geotags(output_file)
+    if invalid_entries:
+        print("Invalid entries found in geotags file:")
+        for line_number, entry in invalid_entries:
+            print(f"Line {line_number}: {entry}")
+        return 1
     print("Geotags file is valid for ODM.")
+    return 0
+
 
-print("Processing complete. Filtered images exist in '/datasets/code/images/'")
+if __name__ == "__main__":
+    sys.exit(main())
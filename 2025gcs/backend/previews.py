@@ -0,0 +1,173 @@
+import os
+import cv2
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+PREVIEW_SIZES = {'thumb': 192, 'preview': 960}  # longest side in px
+PREVIEW_JPEG_QUALITY = 80
+PREVIEW_WORKERS = 2  # threads generating previews, cv2 releases the GIL while decoding and encoding
+DISK_BUDGET = 512 * 1024 * 1024  # bytes per session, least recently used previews are evicted beyond this
+
+# JPEG can be decoded directly at 1/2, 1/4 or 1/8 scale, which is much faster than decoding in full
+REDUCED_READ_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+class PreviewCache:
+    """
+    Downscaled copies of captured images, generated on ingest in a worker pool and stored on disk.
+
+    Each size lives in its own folder under the cache directory with the same file name as the image. A preview
+    older than its image is regenerated. Total size is bounded by disk_budget, evicting the least recently
+    served previews first.
+    """
+
+    def __init__(self, images_dir, cache_dir, disk_budget=DISK_BUDGET):
+        self.images_dir = images_dir
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_budget
+        self.lock = Lock()
+        self.usage = OrderedDict()  # preview path -> size in bytes, least recently used first
+        self.total_bytes = 0
+        self.pending = {}  # (size, image name) -> Future
+        self.pool = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="PreviewWorker")
+        self.load_()
+
+    def load_(self):
+        """Index previews already on disk, oldest access first."""
+        found = []
+        for size in PREVIEW_SIZES:
+            folder = os.path.join(self.cache_dir, size)
+            os.makedirs(folder, exist_ok=True)
+            with os.scandir(folder) as scan:
+                for item in scan:
+                    if item.name.endswith('.tmp.jpg'):
+                        os.remove(item.path)  # left over from a crash mid-write
+                    elif item.is_file():
+                        stat = item.stat()
+                        found.append((stat.st_atime, item.path, stat.st_size))
+        for _, path, file_size in sorted(found):
+            self.usage[path] = file_size
+            self.total_bytes += file_size
+        self.evict_()
+
+    def reset(self):
+        """Forget every preview after the cache folder has been cleared."""
+        with self.lock:
+            self.usage.clear()
+            self.total_bytes = 0
+            self.load_()
+
+    def path(self, size, image_name):
+        return os.path.join(self.cache_dir, size, image_name)
+
+    # ========================= Generation =========================
+    def generate_(self, size, image_name):
+        """Write the preview for one image, returns its path."""
+        source = os.path.join(self.images_dir, image_name)
+        target = self.path(size, image_name)
+        max_side = PREVIEW_SIZES[size]
+
+        # Decode at the smallest reduced scale that is still at least max_side
+        height, width = read_dimensions_(source)
+        image = None
+        for factor, flag in REDUCED_READ_FLAGS:
+            if max(height, width) / factor >= max_side:
+                image = cv2.imread(source, flag)
+                break
+        if image is None:
+            image = cv2.imread(source, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not decode {image_name}")
+
+        scale = max_side / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+        temp = target[:-len('.jpg')] + '.tmp.jpg'
+        if not cv2.imwrite(temp, image, [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY]):
+            raise ValueError(f"Could not write preview for {image_name}")
+        os.replace(temp, target)
+
+        with self.lock:
+            self.total_bytes -= self.usage.pop(target, 0)
+            self.usage[target] = os.path.getsize(target)
+            self.total_bytes += self.usage[target]
+            self.evict_()
+        return target
+
+    def submit_(self, size, image_name):
+        """Queue generation of one preview unless it is already queued, returns its Future."""
+        with self.lock:
+            future = self.pending.get((size, image_name))
+            if future is not None:
+                return future
+            future = self.pool.submit(self.generate_, size, image_name)
+            self.pending[(size, image_name)] = future
+        # Outside the lock, the callback runs immediately if the preview is already done
+        future.add_done_callback(lambda _: self.finished_(size, image_name))
+        return future
+
+    def finished_(self, size, image_name):
+        with self.lock:
+            self.pending.pop((size, image_name), None)
+
+    def schedule(self, image_name):
+        """Generate every preview size for a newly ingested image in the background."""
+        for size in PREVIEW_SIZES:
+            self.submit_(size, image_name)
+
+    # ========================= Lookup =========================
+    def get(self, size, image_name):
+        """Return the path of an up to date preview, generating it now if needed. Raises FileNotFoundError."""
+        if size not in PREVIEW_SIZES:
+            raise ValueError(f"Unknown preview size {size!r}, expected one of {tuple(PREVIEW_SIZES)}")
+        source = os.path.join(self.images_dir, image_name)
+        target = self.path(size, image_name)
+        source_mtime = os.path.getmtime(source)  # FileNotFoundError if the image does not exist
+
+        with self.lock:
+            fresh = target in self.usage and os.path.exists(target) and os.path.getmtime(target) >= source_mtime
+            if fresh:
+                self.usage.move_to_end(target)
+                return target
+        return self.submit_(size, image_name).result()
+
+    def remove(self, image_name):
+        """Delete every preview of an image."""
+        with self.lock:
+            for size in PREVIEW_SIZES:
+                target = self.path(size, image_name)
+                self.total_bytes -= self.usage.pop(target, 0)
+                if os.path.exists(target):
+                    os.remove(target)
+
+    def evict_(self):
+        """Delete least recently used previews until under budget, the caller must hold the lock."""
+        while self.total_bytes > self.disk_budget and len(self.usage) > 1:
+            path, file_size = self.usage.popitem(last=False)
+            self.total_bytes -= file_size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def read_dimensions_(path):
+    """Read the (height, width) of A JPEG from its header without decoding it."""
+    with open(path, 'rb') as file:
+        data = file.read(262144)
+    index = 2
+    while index + 9 < len(data):
+        if data[index] != 0xFF:
+            index += 1
+            continue
+        marker = data[index + 1]
+        if marker == 0xFF:
+            index += 1  # fill byte
+            continue
+        # Start of frame markers hold the dimensions, all others are skipped by their length
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            return int.from_bytes(data[index + 5:index + 7], 'big'), int.from_bytes(data[index + 7:index + 9], 'big')
+        index += 2 + int.from_bytes(data[index + 2:index + 4], 'big')
+    return 0, 0  # unknown, decode at full size
+
@@ -0,0 +1,53 @@
+"""
+Production entry point: serves the ground station with waitress, a multi-threaded WSGI server that also runs on
+Windows, instead of the Flask development server.
+
+Usage: python serve.py [--host 0.0.0.0] [--port 80] [--threads 32] [--connection-limit 256]
+                       [--preprocess-mode original|resize|png]
+Every option can also be set through the environment: GCS_HOST, GCS_PORT, GCS_THREADS, GCS_CONNECTION_LIMIT and
+GCS_PREPROCESS_MODE.
+
+The server is one process with a pool of request threads. The telemetry poller, the event stream, the session
+stores and the AI workers live in that process and are shared by every thread, separate worker processes would
+each get their own copy. Every open /stream connection holds a thread for as long as the browser is open, so
+all but RESERVED_THREADS threads may be taken by streams and further /stream requests get 503 until one closes.
+Raise --threads above the number of connected operator laptops plus RESERVED_THREADS.
+"""
+import os
+import argparse
+from waitress import serve
+from server import app, start_services
+from events import broker
+from detection import PREPROCESS_MODES, preprocess_mode, set_preprocess_mode
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 80
+DEFAULT_THREADS = 32  # request threads, each /stream client holds one
+RESERVED_THREADS = 8  # threads never taken by /stream clients, left for the other endpoints
+DEFAULT_CONNECTION_LIMIT = 256  # open connections before new ones wait
+CHANNEL_TIMEOUT = 60  # seconds before an idle connection is closed, /stream sends a keep-alive every 15
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the ground station backend with waitress")
+    parser.add_argument('--host', default=os.getenv('GCS_HOST', DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=int(os.getenv('GCS_PORT', DEFAULT_PORT)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('GCS_THREADS', DEFAULT_THREADS)))
+    parser.add_argument('--connection-limit', type=int,
+                        default=int(os.getenv('GCS_CONNECTION_LIMIT', DEFAULT_CONNECTION_LIMIT)))
+    parser.add_argument('--preprocess-mode', choices=PREPROCESS_MODES, default=preprocess_mode,
+                        help="how images are encoded for inference")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.threads <= RESERVED_THREADS or args.connection_limit < args.threads:
+        raise SystemExit(f"--threads must be more than {RESERVED_THREADS} and --connection-limit at least --threads")
+
+    set_preprocess_mode(args.preprocess_mode)
+    broker.max_subscribers = args.threads - RESERVED_THREADS
+    start_services()
+    print(f"Serving on http://{args.host}:{args.port} with {args.threads} threads, "
+          f"at most {broker.max_subscribers} event streams")
+    serve(app, host=args.host, port=args.port, threads=args.threads, connection_limit=args.connection_limit,
+          channel_timeout=CHANNEL_TIMEOUT, ident='2025GCS')
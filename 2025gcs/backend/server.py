@@ -1,10 +1,23 @@
 import os
 import logging
 import json
-from flask import Flask, jsonify, request, send_from_directory
+import numpy as np
+from flask import Flask, Response, jsonify, request, send_file, send_from_directory
+from werkzeug.utils import secure_filename
 from flask_cors import CORS
 import requests
 from geo import get_target_coordinates
+from detection import ai_workers, forget_images
+from telemetry import TelemetryPoller
+from history import telemetry_history, CHANNELS
+from downsample import downsample, lttb, DOWNSAMPLE_METHODS
+from vehicle import VehicleClient
+from events import broker, SubscriberLimitError
+from sessions import session_manager, SessionNotFound
+from previews import PREVIEW_SIZES
+from ingest import ingest_upload, ingest_tar, ingest_zip, UploadError, pair_lock
+from trash import trash_collector
+from mission import MissionState
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -19,43 +32,30 @@ class FilterSpecificLogs(logging.Filter):
 log = logging.getLogger('werkzeug')
 log.addFilter(FilterSpecificLogs())
 
-completed_targets = []
-current_target = None
-
 ENDPOINT_IP = "192.168.1.67" # make sure to configure this to whatever your IP is before you start
 VEHICLE_API_URL = f"http://{ENDPOINT_IP}:5000/"
-CAMERA_STATE = False
+vehicle = VehicleClient(VEHICLE_API_URL)  # Pooled keep-alive connection shared by every proxy endpoint
 
 # Utilities
-DATA_DIR = os.path.join(os.path.dirname(__file__), '.', 'data')
-IMAGES_DIR = os.path.join(DATA_DIR, 'images')
-IMAGEDATA_DIR = os.path.join(DATA_DIR, 'imageData')
-
-# Dictionary to maintain vehicle state
-vehicle_data = {
-    "last_time": 0,
-    "lat": 0,
-    "lon": 0,
-    "rel_alt": 0,
-    "alt": 0,
-    "roll": 0,
-    "pitch": 0,
-    "yaw": 0,
-    "dlat": 0,
-    "dlon": 0,
-    "dalt": 0,
-    "heading": 0,
-    "groundspeed": 0,
-    "throttle": 0,
-    "climb": 0,
-    "flight_mode": 0,
-    "battery_voltage": 0,
-    "battery_current": 0,
-    "battery_remaining": 0,
-    "is_dropped": False
-}
 
 # ========================= Common Utilities ========================
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # seconds a versioned image URL is cached for
+
+def revalidated(response):
+    """Make browsers revalidate a cached image every time, its ETag and Last-Modified make that a cheap 304.
+    Image names are reused after /deleteImage and in every session, so a max-age would show stale frames."""
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = None
+    return response
+
+def immutable(response):
+    """Let browsers keep an image for good without revalidating. Only for URLs carrying the session and the
+    image's mtime as v, a replaced frame gets a new URL."""
+    response.cache_control.no_cache = None
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
 def load_json(file_path):
     """Utility to load JSON data from a file."""
     try:
@@ -70,46 +70,196 @@ def save_json(file_path, data):
         json.dump(data, file, indent=4)
 # ========================= Common Utilities ========================
 
+# ========================= Sessions ========================
+def requested_session():
+    """The session named by the session query parameter, or the active one. Raises SessionNotFound."""
+    name = request.args.get('session')
+    return session_manager.get(name) if name else session_manager.active()
+
+@app.errorhandler(SessionNotFound)
+def session_not_found(e):
+    return jsonify({'success': False, 'error': f"Session '{e.args[0]}' does not exist"}), 404
+
+def watch_session(session):
+    """Stream every store mutation of a session to clients, the journal record is the delta."""
+    session.detection_store.add_listener(lambda record: broker.publish('detections', {**record, 'session': session.name}))
+    session.coord_store.add_listener(lambda record: broker.publish('coords', {**record, 'session': session.name}))
+
+session_manager.add_loader(watch_session)
+
+@app.get('/sessions')
+def list_sessions():
+    """List every flight session on disk and the active one. Other endpoints read a past session with ?session=<name>."""
+    return jsonify({'success': True, 'sessions': session_manager.list(), 'active': session_manager.active_name}), 200
+
+@app.post('/sessions')
+def create_session():
+    """Create a new session, {"name": ..., "activate": true} also makes it the active one."""
+    data = request.get_json(silent=True) or {}
+    try:
+        session = session_manager.create(data.get('name'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if data.get('activate'):
+        activate_session(session.name)
+    return jsonify({'success': True, 'session': session.name, 'active': session_manager.active_name}), 201
+
+@app.post('/sessions/active')
+def set_active_session():
+    """Switch uploads, the AI watcher and every endpoint without ?session= to another session."""
+    data = request.get_json(silent=True) or {}
+    activate_session(data.get('name') or '')
+    return jsonify({'success': True, 'active': session_manager.active_name}), 200
+
+def activate_session(name):
+    session_manager.activate(name)
+    broker.publish('session', {'active': name})
+# ========================= Sessions ========================
+
+def publish_targets(current_target, completed_targets):
+    """Push the current and completed targets to stream clients."""
+    broker.publish('targets', {'current_target': current_target, 'completed_targets': completed_targets})
+
+# Current target, completed targets and camera state, shared by every request thread
+mission = MissionState(on_targets=publish_targets)
+
+def publish_telemetry(changes, connected):
+    """Called by the telemetry poller with the vehicle values that changed since the last poll."""
+    broker.publish('telemetry', {'vehicle_data': changes, 'connected': connected})
+
+# Polls the vehicle heartbeat in the background, started with the server
+telemetry = TelemetryPoller(vehicle, 'heartbeat-validate', on_dropped=mission.complete_target, on_update=publish_telemetry,
+                            history=telemetry_history)
+
+def start_services():
+    """Start the background services, once per process before serving requests (see serve.py)."""
+    telemetry.start()
+
 @app.get('/get_heartbeat')
 def get_heartbeat():
     '''This function is continuously called by the frontend to check if there's a connection to the drone'''
-    try:
-        headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
-        response = requests.get(VEHICLE_API_URL + 'heartbeat-validate', headers=headers, timeout=5)
-        heartbeat_data = response.json()
+    snapshot = telemetry.snapshot()
+    response = {
+        'success': snapshot['connected'],
+        'vehicle_data': snapshot['vehicle_data'],
+        'age': snapshot['age'],
+        'link': snapshot['link'],
+    }
+    if not snapshot['connected']:
+        response['error'] = snapshot['link']['last_error'] or 'No heartbeat received from the vehicle'
+    return jsonify(response), 200
 
-        if heartbeat_data.get("is_dropped") == True:
-            completed_targets.append(current_target)
-            current_target = None
+STREAM_RETRY_AFTER = 5  # seconds a refused stream client should wait before reconnecting
 
-        vehicle_data.update(heartbeat_data)
-        return jsonify({'success': True, 'vehicle_data': vehicle_data}), 200
+@app.get('/stream')
+def stream():
+    '''Server-Sent Events stream of telemetry, image and detection changes. The GET endpoints remain the fallback.
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({'success': False, 'error': str(e)}), 200
+    Events: telemetry (changed vehicle values and link state), image, images_deleted, detections and coords
+    (store journal records), targets, session (active session switched), and reset (missed too much, refetch
+    everything). Image and store events carry the name of their session. The stream opens with
+    a full telemetry snapshot. Browsers resume from the Last-Event-ID header automatically on reconnect.
+    Each stream holds a server thread, beyond the broker's max_subscribers the request gets 503 with Retry-After.
+    '''
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+
+    try:
+        subscription, missed = broker.subscribe(last_event_id)
+    except SubscriberLimitError as e:
+        # Every stream holds a server thread, refuse rather than starve the other endpoints
+        response = jsonify({'error': f'{e}, retry in {STREAM_RETRY_AFTER} s'})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response, 503
+
+    snapshot = telemetry.snapshot()
+    initial = [('telemetry', {'vehicle_data': snapshot['vehicle_data'], 'connected': snapshot['connected']})]
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(broker.stream(subscription, missed, initial), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+# ======================== Telemetry History ========================
+HISTORY_CHANNELS = ('rel_alt', 'groundspeed', 'battery_voltage', 'battery_current')  # returned by default
+HISTORY_POINTS = 500  # default points per series
+MAX_HISTORY_POINTS = 5000
+
+def history_args():
+    """Parse the telemetry history query parameters, raises ValueError for invalid values."""
+    start, end, last = (request.args.get(key) for key in ('start', 'end', 'last'))
+    start = float(start) if start is not None else None
+    end = float(end) if end is not None else None
+    if last is not None:
+        span = telemetry_history.span()
+        start = span[1] - float(last) if span is not None else None
+    points = int(request.args.get('points', HISTORY_POINTS))
+    if not 3 <= points <= MAX_HISTORY_POINTS:
+        raise ValueError(f'points must be between 3 and {MAX_HISTORY_POINTS}')
+    method = request.args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f'method must be one of {list(DOWNSAMPLE_METHODS)}')
+    channels = request.args.get('channels')
+    channels = tuple(channels.split(',')) if channels else HISTORY_CHANNELS
+    unknown = [channel for channel in channels if channel not in CHANNELS]
+    if unknown:
+        raise ValueError(f'unknown channels {unknown}, expected any of {list(CHANNELS)}')
+    return start, end, points, method, channels
+
+@app.get('/telemetry/history')
+def get_telemetry_history():
+    """Flight track and telemetry channels recorded from heartbeats, downsampled on the server.
+
+    Query parameters: start and end (vehicle clock in seconds) or last (seconds before the newest sample),
+    channels (comma separated, default altitude, groundspeed and battery), points (per series, default 500)
+    and method (lttb, or minmax to keep the extremes of every bucket). The track is always downsampled with
+    LTTB in the horizontal plane, each channel on its own, so every series carries its own times.
+    """
+    try:
+        start, end, points, method, channels = history_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query parameter: {e}'}), 400
+
+    times, values = telemetry_history.window(start, end, ('lat', 'lon') + channels)
+    lat, lon = values['lat'], values['lon']
+    fixed = ~np.isnan(lat) & ~np.isnan(lon) & ((lat != 0) | (lon != 0))  # 0, 0 until the GPS has a fix
+    track_times, lat, lon = times[fixed], lat[fixed], lon[fixed]
+    # Scale longitude so triangle areas are in proportion to ground distance
+    scale = np.cos(np.radians(np.mean(lat))) if len(lat) else 1.0
+    kept = lttb(lon * scale, lat, points)
+
+    series = {}
+    for channel in channels:
+        recorded = ~np.isnan(values[channel])
+        channel_times, channel_values = times[recorded], values[channel][recorded]
+        channel_kept = downsample(channel_times, channel_values, points, method)
+        series[channel] = {'t': channel_times[channel_kept].tolist(), 'values': channel_values[channel_kept].tolist()}
+
+    return jsonify({
+        'success': True,
+        'start': float(times[0]) if len(times) else None,
+        'end': float(times[-1]) if len(times) else None,
+        'samples': len(times),
+        'track': {'t': track_times[kept].tolist(), 'lat': lat[kept].tolist(), 'lon': lon[kept].tolist()},
+        'channels': series,
+    }), 200
+# ======================== Telemetry History ========================
 
 # ======================== Camera ========================
 def get_existing_image_count():
     ''' This function will return the number images under backend\images '''
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    IMAGES_DIR = os.path.join(current_dir, "data/images")
-    if not os.path.exists(IMAGES_DIR):
-        print(f"Warning: Directory '{IMAGES_DIR}' does not exist. Exiting function.")
-    else:
-        image_count = len([image for image in os.listdir(IMAGES_DIR) if image.endswith('.jpg')])
-        return image_count
+    return session_manager.active().catalogue.image_count()
 
 @app.post('/toggle_camera_state')
 def toggle_camera_state():
-    global CAMERA_STATE
-    CAMERA_STATE = not CAMERA_STATE
+    camera_on = mission.toggle_camera()
     image_count = get_existing_image_count()
-    data = json.dumps({"is_camera_on": CAMERA_STATE, "image_count": image_count})
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
+    data = {"is_camera_on": camera_on, "image_count": image_count}
     try:
-        response = requests.post(VEHICLE_API_URL + 'toggle_camera', data=data, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return jsonify({'success': True, 'cameraState': CAMERA_STATE}), 200
+        vehicle.post('toggle_camera', data)
+        return jsonify({'success': True, 'cameraState': camera_on}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)  # Default to 500 if no response
         print(f"Request Error ({status_code}): {str(e)}")
@@ -117,23 +267,97 @@ def toggle_camera_state():
 # ======================== Camera ========================
 
 # ======================== Image Management ========================
+def catalogue_args():
+    """Parse the since, offset and limit query parameters, raises ValueError if they are not integers."""
+    since = request.args.get('since')
+    limit = request.args.get('limit')
+    since = int(since) if since is not None else None
+    offset = int(request.args.get('offset', '0'))
+    limit = int(limit) if limit is not None else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError('offset and limit must not be negative')
+    return since, offset, limit
+
+def catalogue_response(result, key, entries, session):
+    """Build the JSON response for a catalogue query, session is the one the entries belong to."""
+    response = {'success': True, key: entries, 'revision': result['revision'], 'total': result['total'],
+                'session': session.name}
+    if 'deleted' in result:
+        response['deleted'] = result['deleted']
+        response['reset'] = result['reset']
+    return jsonify(response)
+
 @app.get('/getImages')
 def get_images():
-    """Endpoint to get the list of images in the images folder."""
-    if not os.path.exists(IMAGES_DIR):
+    """Endpoint to get the sorted list of images in the images folder.
+
+    Optional query parameters: since (revision from a previous response, only images added after it are
+    returned along with the names deleted since), offset and limit (pagination), details (include size and mtime),
+    session (a past session instead of the active one).
+    """
+    session = requested_session()
+    if not os.path.exists(session.images_dir):
         return jsonify({'success': False, 'error': 'Images directory does not exist'}), 404
+    try:
+        since, offset, limit = catalogue_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query parameter: {e}'}), 400
 
-    image_files = sorted([f for f in os.listdir(IMAGES_DIR) if f.endswith('.jpg') and os.path.isfile(os.path.join(IMAGES_DIR, f))])
-    return jsonify({'success': True, 'images': image_files})
+    result = session.catalogue.images(since, offset, limit)
+    if request.args.get('details') in ('1', 'true'):
+        images = result['entries']
+    else:
+        images = [entry['image'] for entry in result['entries']]
+    return catalogue_response(result, 'images', images, session)
+
+@app.get('/getImagesAt')
+def get_images_at():
+    """Frames whose ground footprint contains a point, closest to directly overhead first.
+
+    Query parameters: lat and lon (required), limit, session. Each frame comes with the pixel x and y the point
+    appears at, so the operator can jump straight to it.
+    """
+    try:
+        lat, lon = float(request.args['lat']), float(request.args['lon'])
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'lat and lon are required numbers, limit an integer'}), 400
+    frames = requested_session().footprints.query(lat, lon, limit)
+    return jsonify({'success': True, 'frames': frames}), 200
 
 @app.get('/images/<filename>')
 def serve_image(filename):
-    """Endpoint to serve an image file."""
-    return send_from_directory(IMAGES_DIR, filename)
+    """Endpoint to serve an image file, or with size=thumb|preview a cached downscaled copy of it.
+
+    With v (the mtime from /getImages?details=1 or the image event) and session, the URL names one version of
+    the file and is cached without revalidation, otherwise browsers revalidate it on every use.
+    """
+    session = requested_session()
+    size = request.args.get('size')
+    cache = immutable if 'v' in request.args and 'session' in request.args else revalidated
+    if size is None:
+        return cache(send_from_directory(session.images_dir, filename, conditional=True, etag=True))
+    if size not in PREVIEW_SIZES:
+        return jsonify({'success': False, 'error': f'Unknown size, expected one of {list(PREVIEW_SIZES)}'}), 400
+
+    filename = secure_filename(filename)
+    try:
+        path = session.previews.get(size, filename)
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    except Exception as e:
+        print(f"Error generating {size} for {filename}: {e}")
+        return jsonify({'success': False, 'error': 'Could not generate preview'}), 500
+    # ETag and Last-Modified come from the preview file, which is rewritten whenever the image changes
+    return cache(send_file(path, mimetype='image/jpeg', conditional=True, etag=True))
 
 @app.delete('/deleteImage')
 def delete_image():
-    """Delete all images and their associated JSON data"""
+    """Delete all images and their associated JSON data of the active session.
+
+    The folders are swapped for empty ones immediately and the old files are deleted in the background,
+    see /deleteImage/status for progress.
+    """
     data = request.get_json(silent=True) or {}
     image_name = data.get("imageName")
 
@@ -145,54 +369,38 @@ def delete_image():
         }), 400
 
     # Verify directories exist
-    if not os.path.exists(IMAGES_DIR):
+    session = session_manager.active()
+    if not os.path.exists(session.images_dir):
         return jsonify({'success': False, 'error': 'Images directory does not exist'}), 404
-    if not os.path.exists(IMAGEDATA_DIR):
+    if not os.path.exists(session.image_data_dir):
         return jsonify({'success': False, 'error': 'JSON data directory does not exist'}), 404
 
-    results = {
-        'images_deleted': 0,
-        'jsons_deleted': 0,
-        'errors': []
-    }
-
-    # Process all JPG files
-    for filename in os.listdir(IMAGES_DIR):
-        if not filename.endswith('.jpg'):
-            continue
-
-        # Delete image
-        image_path = os.path.join(IMAGES_DIR, filename)
-        try:
-            os.remove(image_path)
-            results['images_deleted'] += 1
-        except Exception as e:
-            results['errors'].append(f'Image {filename}: {str(e)}')
-            continue  # Skip JSON if image deletion failed
-
-        # Delete corresponding JSON
-        json_filename = os.path.splitext(filename)[0] + '.json'
-        json_path = os.path.join(IMAGEDATA_DIR, json_filename)
-        if os.path.exists(json_path):
-            try:
-                os.remove(json_path)
-                results['jsons_deleted'] += 1
-            except Exception as e:
-                results['errors'].append(f'JSON {json_filename}: {str(e)}')
-
-    # Prepare response
-    if results['errors']:
-        return jsonify({
-            'success': results['images_deleted'] > 0,
-            'message': f"Deleted {results['images_deleted']} images and {results['jsons_deleted']} JSON files",
-            'warnings': results['errors']
-        }), 207 if results['images_deleted'] > 0 else 500
+    images_deleted = session.catalogue.image_count()
+    jsons_deleted = session.catalogue.data_count()
+    try:
+        with pair_lock:  # no upload is renamed into place during the swap
+            generation = trash_collector.discard([session.images_dir, session.image_data_dir, session.cache_dir])
+    except OSError as e:
+        print(f"[Error] Failed to clear images: {e}")
+        return jsonify({'success': False, 'error': f'Failed to clear images: {e}'}), 500
+
+    session.catalogue.rebuild()
+    session.footprints.reset()
+    session.previews.reset()
+    forget_images(session.images_dir)
+    broker.publish('images_deleted', {'all': True, 'session': session.name})
 
     return jsonify({
         'success': True,
-        'message': f"Cleared all images ({results['images_deleted']} images and {results['jsons_deleted']} JSON files)"
+        'message': f"Cleared all images ({images_deleted} images and {jsons_deleted} JSON files)",
+        'generation': generation
     }), 200
 
+@app.get('/deleteImage/status')
+def delete_image_status():
+    """Progress of the background deletion of cleared images."""
+    return jsonify({'success': True, **trash_collector.status()}), 200
+
 @app.delete('/deleteSingleImage')
 def delete_single_image():
     """Delete a single image and its associated JSON data"""
@@ -208,9 +416,10 @@ def delete_single_image():
         return jsonify({'success': False, 'error': 'Invalid file name format'}), 400
 
     # Use your existing paths
-    image_path = os.path.join(IMAGES_DIR, image_name)
+    session = session_manager.active()
+    image_path = os.path.join(session.images_dir, image_name)
     json_filename = os.path.splitext(image_name)[0] + '.json'
-    json_path = os.path.join(IMAGEDATA_DIR, json_filename)
+    json_path = os.path.join(session.image_data_dir, json_filename)
 
     # Track deletion success
     results = {
@@ -224,6 +433,10 @@ def delete_single_image():
         try:
             os.remove(image_path)
             results['image_deleted'] = True
+            session.catalogue.remove(image_name, data=False)
+            session.footprints.remove(image_name)
+            session.previews.remove(image_name)
+            broker.publish('images_deleted', {'names': [image_name], 'session': session.name})
         except Exception as e:
             results['errors'].append(f'Image deletion failed: {str(e)}')
     else:
@@ -234,6 +447,7 @@ def delete_single_image():
         try:
             os.remove(json_path)
             results['json_deleted'] = True
+            session.catalogue.remove(image_name)
         except Exception as e:
             results['errors'].append(f'JSON deletion failed: {str(e)}')
 
@@ -242,7 +456,7 @@ def delete_single_image():
         message = f"{image_name} deleted"
         if results['json_deleted']:
             message += " with associated data"
-        elif os.path.exists(IMAGEDATA_DIR):  # Only mention JSON if directory exists
+        elif os.path.exists(session.image_data_dir):  # Only mention JSON if directory exists
             message += " (no associated data found)"
         
         if results['errors']:
@@ -260,28 +474,71 @@ def delete_single_image():
 
 @app.get('/getImageData')
 def get_image_data():
-    """Get the image data for display in the image data table"""
-    image_data_dir = os.path.join(DATA_DIR, 'imageData')
-    image_data = []
-    for filename in sorted(os.listdir(image_data_dir)):
-        if filename.endswith('.json'):
-            with open(os.path.join(image_data_dir, filename), 'r') as file:
-                data = json.load(file)
-                data['image'] = filename.replace('.json', '.jpg')
-                image_data.append(data)
-
-    return jsonify({'success': True, 'imageData': image_data})
+    """Get the image data for display in the image data table, accepts the same since, offset, limit and session as /getImages"""
+    session = requested_session()
+    try:
+        since, offset, limit = catalogue_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query parameter: {e}'}), 400
+
+    result = session.catalogue.image_data(since, offset, limit)
+    return catalogue_response(result, 'imageData', result['entries'], session)
 
 @app.post('/submit/')
 def submit_data():
-    """POST request to accept an image or json upload - no arguments are taken, image is presumed to contain all data"""
-    file = request.files["file"]
-    if file.mimetype == "application/json":
-        file.save('./data/imageData/' + file.filename)
-    else:
-        file.save('./data/images/' + file.filename) 
-    print('Saved file', file.filename)
+    """POST request to accept image and json uploads - no arguments are taken, image is presumed to contain all data.
+
+    Any number of files may be sent in one multipart request. Each is written atomically, and a frame is passed
+    on to the AI pipeline and the gallery once both its image and its json have arrived. Uploads always go to
+    the active session.
+    """
+    session = session_manager.active()
+    files = [file for key in request.files for file in request.files.getlist(key)]
+    if not files:
+        return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+
+    saved, errors = [], []
+    for file in files:
+        try:
+            saved.append(ingest_upload(session, file))
+        except UploadError as e:
+            errors.append(str(e))
+        except OSError as e:
+            print(f"Error saving upload {file.filename}: {e}")
+            errors.append(f'{file.filename}: {e}')
+    if saved:
+        print('Saved', ', '.join(saved))
+
+    if errors:
+        return jsonify({'success': False, 'saved': saved, 'errors': errors}), 207 if saved else 400
     return 'ok'
+
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+
+@app.post('/submit-bulk/')
+def submit_bulk():
+    """POST a tar (optionally compressed) or zip archive of NNNNN.jpg/NNNNN.json pairs, unpacked as it streams in.
+
+    The archive is the raw request body (Content-Type application/x-tar, application/gzip or application/zip),
+    or the first file of a multipart upload. format=tar|zip overrides the content type. Returns a result per file.
+    """
+    if request.files:
+        upload = next(request.files.values())
+        stream, content_type = upload.stream, upload.mimetype
+    else:
+        stream, content_type = request.stream, request.mimetype
+    archive_format = request.args.get('format') or ('zip' if content_type in ZIP_TYPES else 'tar')
+    if archive_format not in ('tar', 'zip'):
+        return jsonify({'success': False, 'error': 'format must be tar or zip'}), 400
+
+    session = session_manager.active()
+    results = ingest_zip(session, stream) if archive_format == 'zip' else ingest_tar(session, stream)
+    saved = sum(1 for result in results if result['saved'])
+    failed = len(results) - saved
+    print(f"Bulk upload: saved {saved} files, {failed} failed")
+
+    status = 200 if not failed else (207 if saved else 400)
+    return jsonify({'success': not failed, 'saved': saved, 'failed': failed, 'results': results}), status
 # ======================== Image Management ========================
 
 # ======================== Payload ========================
@@ -289,11 +546,9 @@ def submit_data():
 def payload_release():
     """Release the payload for a specified bay."""
     data = request.get_json()
-    send_data = json.dumps({"bay": data.get("bay")})
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
+    send_data = {"bay": data.get("bay")}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_release', data=send_data, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_release', send_data)
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)  # Default to 500 if no response
@@ -303,10 +558,8 @@ def payload_release():
 @app.post('/payload_release_all')
 def payload_release_all():
     """Release all payloads."""
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_release_all', headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_release_all')
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)
@@ -316,10 +569,8 @@ def payload_release_all():
 @app.post('/payload_open_all')
 def payload_open_all():
     """Open all payloads."""
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_open_all', headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_open_all')
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)
@@ -329,10 +580,8 @@ def payload_open_all():
 @app.post('/payload_close_all')
 def payload_close_all():
     """Close all payloads."""
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_close_all', headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_close_all')
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)
@@ -343,11 +592,9 @@ def payload_close_all():
 def payload_open():
     """Open the payload for a specified bay."""
     data = request.get_json()
-    send_data = json.dumps({"bay": data.get("bay")})
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
+    send_data = {"bay": data.get("bay")}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_open', data=send_data, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_open', send_data)
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)
@@ -358,11 +605,9 @@ def payload_open():
 def payload_close():
     """Close the payload for a specified bay."""
     data = request.get_json()
-    send_data = json.dumps({"bay": data.get("bay")})
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
+    send_data = {"bay": data.get("bay")}
     try:
-        response = requests.post(VEHICLE_API_URL + 'payload_close', data=send_data, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('payload_close', send_data)
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)
@@ -376,28 +621,24 @@ def payload_close():
 def manual_selection_save():
     """Save the coordinates of a manually selected target with image metadata."""
     data = request.get_json()
-    saved_coords = os.path.join(DATA_DIR, 'savedCoords.json')
-    coords_data = load_json(saved_coords)
 
     file_name = data['file_name']
     object_name = data.get('object')
 
-    if object_name not in coords_data:
-        coords_data[object_name] = []
-
     # Remove .jpg extension and construct path to the .json metadata file in imageData directory
+    session = session_manager.active()
     base_name = os.path.splitext(file_name)[0]
-    json_path = os.path.join(IMAGEDATA_DIR, base_name + '.json')
+    json_path = os.path.join(session.image_data_dir, base_name + '.json')
 
-    # Load metadata from corresponding .json file
+    # Load metadata from corresponding .json file, with the pose at the capture time if the history covers it
     metadata = {}
     if os.path.exists(json_path):
-        metadata = load_json(json_path)
+        metadata = telemetry_history.align(load_json(json_path))
     else:
         print(f"[Warning] Metadata file not found: {json_path}")
 
     # Append all data including the new fields
-    coords_data[object_name].append({
+    entry = {
         'image': file_name,
         'x': data['selected_x'],
         'y': data['selected_y'],
@@ -410,35 +651,33 @@ def manual_selection_save():
         'yaw': metadata.get('yaw'),
         'position_uncertainty': metadata.get('position_uncertainty'),
         'alt_uncertainty': metadata.get('alt_uncertainty'),
-    })
+    }
+    entries = session.coord_store.append(object_name, entry)
 
-    save_json(saved_coords, coords_data)
-    return jsonify({'success': True, 'message': 'Coordinates and metadata saved successfully'}), 200
+    # Update the live estimate for this target
+    estimate = session.manual_estimates.sync(object_name, entries)
+    return jsonify({'success': True, 'message': 'Coordinates and metadata saved successfully', 'estimate': estimate}), 200
 
 @app.post('/manualSelection-calc')
 def manual_selection_geo_calc():
     """Perform geomatics calculations for all manually selected targets."""
     try:
-        saved_coords_path = os.path.join(DATA_DIR, 'savedCoords.json')
-        with open(saved_coords_path, "r") as file:
-            saved_coords = json.load(file)
-
         data = request.get_json()
         requested_object = data.get('object')
-        if requested_object is None or requested_object not in saved_coords:
+        session = session_manager.active()
+        entries = session.coord_store.get(requested_object)
+        if requested_object is None or entries is None:
             print(f"Requested object '{requested_object}' not found in saved coordinates.")
             return jsonify({'success': False, 'error': 'Object has no saved entries'}), 500
 
-        count = len(saved_coords[requested_object])  # count of number of saved coords processed for averaging
+        count = len(entries)  # count of number of saved coords processed for averaging
         if count > 0:
-            lat, lon = get_target_coordinates(requested_object)
-            print(f"Calculated coordinates for {requested_object}: lat={lat}, lon={lon}")
-            headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
-            data = json.dumps({"latitude": lat, "longitude": lon})
+            lat, lon, report = get_target_coordinates(requested_object, session.coord_store, session.manual_estimates)
+            print(f"Calculated coordinates for {requested_object}: lat={lat}, lon={lon}, adjustment={report}")
+            data = {"latitude": lat, "longitude": lon}
 
             try:
-                response = requests.post(VEHICLE_API_URL + 'payload_drop_mission', data=data, headers=headers)
-                response.raise_for_status()  # Raise an exception for HTTP errors
+                vehicle.post('payload_drop_mission', data)
                 print("Successfully sent mission upload.")
             except requests.exceptions.RequestException as e:
                 status_code = getattr(e.response, "status_code", 500)
@@ -451,7 +690,7 @@ def manual_selection_geo_calc():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     
-    return jsonify({'success': True, 'message': 'Mission upload completed successfully.'}), 200
+    return jsonify({'success': True, 'message': 'Mission upload completed successfully.', 'adjustment': report}), 200
 
 @app.post('/monitor_and_drop')
 def monitor_and_drop():
@@ -460,10 +699,7 @@ def monitor_and_drop():
     bay = received_data['bay']
 
     try:
-        headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
-        data = json.dumps({"bay": bay})
-        response = requests.post(VEHICLE_API_URL + 'monitor_mission_and_drop', data=data, headers=headers)
-        response.raise_for_status()
+        vehicle.post('monitor_mission_and_drop', {"bay": bay})
 
         return jsonify({'success': True, 'message': f'Payload drop initiated for bay {bay}'}), 200
 
@@ -472,21 +708,31 @@ def monitor_and_drop():
         print(f"Request Error ({status_code}): {str(e)}")
         return jsonify({'success': False, 'error': f"Error {status_code}: {str(e)}"}), status_code
 
+@app.get('/target-estimate')
+def get_target_estimate():
+    """Get the live estimate for a target, from manually saved coordinates (default) or AI detections."""
+    requested_object = request.args.get('object')
+    source = request.args.get('source', 'manual')
+    session = requested_session()
+    estimates = session.detection_estimates if source == 'ai' else session.manual_estimates
+
+    estimate = estimates.estimate(requested_object)
+    if estimate is None:
+        return jsonify({'success': False, 'error': 'No estimate available for the requested object'}), 404
+    return jsonify({'success': True, 'estimate': estimate}), 200
+
 @app.get('/get_saved_coords')
 def get_saved_coords():
     """Get the saved coordinates for display in the saved coordinates data table"""
-    saved_coords_path = os.path.join(DATA_DIR, 'savedCoords.json')
-    coords_data = load_json(saved_coords_path)
-    return jsonify({'success': True, 'coordinates': coords_data})
+    return jsonify({'success': True, 'coordinates': requested_session().coord_store.get_all()})
 
 @app.post('/clear_saved_coords')
 def clear_saved_coords():
     """Clear all manually saved coordinates."""
-    saved_coords_path = os.path.join(DATA_DIR, 'savedCoords.json')
-
     try:
-        # Overwrite with an empty dictionary
-        save_json(saved_coords_path, {})
+        session = session_manager.active()
+        session.coord_store.clear()
+        session.manual_estimates.reset()
         return jsonify({'success': True, 'message': 'Saved coordinates cleared'})
     except Exception as e:
         print(f"[Error] Failed to clear saved coordinates: {e}")
@@ -498,27 +744,23 @@ def delete_coord():
     data = request.get_json(silent=True) or {}
     req_object = data.get('object')
     index = data.get('index')
-
-    saved_coords_path = os.path.join(DATA_DIR, 'savedCoords.json')
-    coords_data = load_json(saved_coords_path) or {}
+    session = session_manager.active()
+    coord_store, manual_estimates = session.coord_store, session.manual_estimates
 
     if req_object is None:
-        save_json(saved_coords_path, {})
+        coord_store.clear()
+        manual_estimates.reset()
         return jsonify({'success': True, 'message': 'All coordinates deleted successfully'})
 
     if req_object and index is None:
-        if req_object in coords_data:
-            del coords_data[req_object]
-            save_json(saved_coords_path, coords_data)
+        if coord_store.delete_object(req_object):
+            manual_estimates.reset(req_object)
             return jsonify({'success': True, 'message': 'All coordinates for object deleted successfully'})
         else:
             return jsonify({'success': False, 'error': 'Object not found'}), 404
 
-    if req_object in coords_data and isinstance(index, int) and 0 <= index < len(coords_data[req_object]):
-        del coords_data[req_object][index]
-        if not coords_data[req_object]:
-            del coords_data[req_object]
-        save_json(saved_coords_path, coords_data)
+    if coord_store.delete(req_object, index):
+        manual_estimates.rebuild(req_object, coord_store.get(req_object) or [])
         return jsonify({'success': True, 'message': 'Coordinate deleted successfully'})
     else:
         return jsonify({'success': False, 'error': 'Coordinate not found'}), 404
@@ -529,8 +771,11 @@ def delete_coord():
 def start_AI_workers():
     """Starts the worker threads, which run infinitely until shutdown."""
     try:
-        start_threads()
+        if not ai_workers.start():
+            return jsonify({"message": "AI processing already running"}), 200
         return jsonify({"message": "AI processing started"}), 200
+    except RuntimeError as e:
+        return jsonify({"message": f"AI processing is still stopping: {e}, try again shortly"}), 409
     except Exception as e:
         return jsonify({"message": f"Error starting AI processing: {e}"}), 500
 
@@ -538,7 +783,8 @@ def start_AI_workers():
 def shutdown_workers():
     """Stops all running worker threads."""
     try:
-        stop_threads()
+        if not ai_workers.stop():
+            return jsonify({"message": "AI processing was not running"}), 200
         return jsonify({"message": "AI processing stopped"}), 200
     except Exception as e:
         return jsonify({"message": f"Error stopping AI processing: {e}"}), 500
@@ -547,11 +793,9 @@ def shutdown_workers():
 # ======================== Detections ========================
 @app.get('/fetch-TargetInformation')
 def fetch_TargetInformation():
-    """Get the list of detections from the cache file."""
-    global completed_targets
-    global current_target
-    target_info_path = os.path.join(DATA_DIR, 'TargetInformation.json')
-    data = load_json(target_info_path)
+    """Get the list of detections from the detection store."""
+    current_target, completed_targets = mission.targets()
+    data = requested_session().detection_store.get_all()
     return jsonify({'targets': data, 'completed_targets': completed_targets, 'current_target': current_target}), 200
 
 @app.delete('/delete-prediction')
@@ -560,79 +804,71 @@ def delete_prediction():
     data = request.get_json(silent=True) or {}
     class_name = data.get('class_name')
     index = data.get('index')
-    target_info_path = os.path.join(DATA_DIR, 'TargetInformation.json')
+    session = session_manager.active()
+    detection_store, detection_estimates = session.detection_store, session.detection_estimates
 
     # No class or index provided, clear the cache
     if class_name is None or index is None:
-        save_json(target_info_path, {})
+        detection_store.clear()
+        detection_estimates.reset()
         return jsonify({"message": "TargetInformation cache cleared"}), 200
 
-    coords_data = load_json(target_info_path)
-    if class_name in coords_data:
-        if 0 <= index < len(coords_data[class_name]):
-            del coords_data[class_name][index]
-            if not coords_data[class_name]:
-                del coords_data[class_name]
-
-            save_json(target_info_path, coords_data)
+    if detection_store.has_class(class_name):
+        if detection_store.delete(class_name, index):
+            # The cache only keeps lat/lon, so the estimate restarts from the next detection
+            detection_estimates.reset(class_name)
             return jsonify({'success': True}), 200
 
         return jsonify({'success': False, 'message': 'Invalid index'}), 400
     return jsonify({'success': False, 'message': 'Class not found'}), 404
 
+@app.get('/target-hypotheses')
+def get_target_hypotheses():
+    """Detections grouped into target hypotheses, for one class (class=...) or all, best first.
+
+    Each hypothesis has a confidence weighted centroid, its covariance in m^2, the number of detections and
+    whether they form a cluster or are a lone detection.
+    """
+    class_name = request.args.get('class')
+    hypotheses = requested_session().detection_clusters.hypotheses(class_name)
+    return jsonify({'success': True, 'hypotheses': hypotheses}), 200
+
 @app.route('/current-target', methods=['GET', 'POST'])
 def current_target_handler():
-    """Get or set the current target."""
-    data = load_json(os.path.join(DATA_DIR, 'TargetInformation.json'))
-    global current_target
+    """Get or set the current target, located at the best cluster of its detections."""
     if request.method == 'POST':
         current_target = request.get_json().get('target')
+        mission.set_target(current_target)
 
-        # Get the location data for the current target
-        target_data = data.get(current_target, [])
-        if not target_data:
+        # Fly to the cluster with the highest total confidence, so a stray false positive does not move the drop point
+        hypothesis = session_manager.active().detection_clusters.best(current_target)
+        if hypothesis is None:
             return jsonify({'success': False, 'error': 'No data available for the current target'}), 404
 
-        # Calculate the average latitude and longitude
-        total_lat = sum(item['lat'] for item in target_data)
-        total_lon = sum(item['lon'] for item in target_data)
-        count = len(target_data)
-
-        avg_lat = total_lat / count
-        avg_lon = total_lon / count
-
         # Set the mission to this target location
-        headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
-        data = json.dumps({"latitude": avg_lat, "longitude": avg_lon})
-        response = requests.post(VEHICLE_API_URL, '/payload_drop_mission', data=data, headers=headers)
-
-        if response.status_code == 200:
-            return jsonify({'success': True, 'message': f'Current target set to {current_target}'}), 200
-        else:
+        try:
+            vehicle.post('payload_drop_mission', {"latitude": hypothesis['lat'], "longitude": hypothesis['lon']})
+            return jsonify({'success': True, 'message': f'Current target set to {current_target}', 'hypothesis': hypothesis}), 200
+        except requests.exceptions.RequestException as e:
+            print(f"Request Error: {str(e)}")
             return jsonify({'success': False, 'message': f'Vehicle failed to set the mission for the target: {current_target}'}), 500
     elif request.method == 'GET':
-        avg_lat, avg_lon = 0, 0
-        if current_target in data:
-            target_data = data[current_target]
-            total_lat = sum(item['lat'] for item in target_data)
-            total_lon = sum(item['lon'] for item in target_data)
-            count = len(target_data)
-            
-            avg_lat = total_lat / count if count > 0 else 0
-            avg_lon = total_lon / count if count > 0 else 0
-
-        return jsonify({'success': True, 'coords': [avg_lat, avg_lon]}), 200
+        lat, lon = 0, 0
+        current_target, _ = mission.targets()
+        hypothesis = requested_session().detection_clusters.best(current_target)
+        if hypothesis is not None:
+            lat, lon = hypothesis['lat'], hypothesis['lon']
+
+        return jsonify({'success': True, 'coords': [lat, lon], 'hypothesis': hypothesis}), 200
 # ======================== Detections ========================
 
 @app.route('/set_flight_mode', methods=['POST'])
 def set_flight_mode():
     data = request.get_json()
-    send_data = json.dumps({"mode_id" : data.get("mode_id")})
-    headers = {"Content-Type": "application/json", "Host": "localhost", "Connection": "close"}
+    send_data = {"mode_id" : data.get("mode_id")}
 
     try:
-        response = requests.post(VEHICLE_API_URL + 'set_flight_mode', data=send_data, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        vehicle.post('set_flight_mode', send_data)
         return jsonify({'success': True}), 200
     except requests.exceptions.RequestException as e:
         status_code = getattr(e.response, "status_code", 500)  # Default to 500 if no response
@@ -642,5 +878,7 @@ def set_flight_mode():
 if __name__ == '__main__':
     '''
     May need to run this server with sudo (admin) permissions if you encounter blocked networking issues when making API requests to the flight controller.
+    This is the Flask development server, use serve.py when several operator laptops are connected.
     '''
+    start_services()
     app.run(debug=False, host='0.0.0.0', port=80)
@@ -0,0 +1,169 @@
+import os
+import re
+from threading import Lock
+from store import CoordinateStore, DetectionStore
+from catalogue import ImageCatalogue
+from previews import PreviewCache
+from geo import TargetEstimates
+from clustering import DetectionClusters
+from footprints import FootprintIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SESSIONS_DIR = os.path.join(DATA_DIR, 'sessions')
+DEFAULT_SESSION = 'default'  # the flat data directory from before sessions existed
+SESSION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+class SessionNotFound(KeyError):
+    """Raised when a session name does not exist on disk."""
+
+
+class Session:
+    """
+    One flight's data: its images, telemetry, saved coordinates, detections and the indexes built on them.
+
+    Each session lives in its own directory, so listings, scans and stores only ever cover that flight.
+    """
+
+    def __init__(self, name, root):
+        self.name = name
+        self.root = root
+        self.images_dir = os.path.join(root, 'images')
+        self.image_data_dir = os.path.join(root, 'imageData')
+        self.cache_dir = os.path.join(root, 'cache')
+        os.makedirs(self.images_dir, exist_ok=True)
+        os.makedirs(self.image_data_dir, exist_ok=True)
+
+        self.coord_store = CoordinateStore(os.path.join(root, 'savedCoords.json'))
+        self.detection_store = DetectionStore(os.path.join(root, 'TargetInformation.json'))
+        self.catalogue = ImageCatalogue(self.images_dir, self.image_data_dir)
+        self.footprints = FootprintIndex()
+        self.footprints.rebuild(self.catalogue.image_data()['entries'])
+        self.previews = PreviewCache(self.images_dir, self.cache_dir)
+        # Live estimates from manually saved coordinates and from AI detections
+        self.manual_estimates = TargetEstimates()
+        self.detection_estimates = TargetEstimates()
+        # Detections grouped into target hypotheses, kept in step with the detection store
+        self.detection_clusters = DetectionClusters()
+        self.detection_clusters.rebuild(self.detection_store.get_all())
+        self.detection_store.add_listener(self.detection_clusters.apply)
+
+
+class SessionManager:
+    """
+    Knows every session on disk, loads them on first use and tracks which one is active.
+
+    New uploads, AI detections and saved coordinates go to the active session. Older sessions are only loaded
+    when queried and have their own stores and locks, so reading them never slows the live one down. The active
+    session is remembered across restarts.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, sessions_dir=SESSIONS_DIR):
+        self.data_dir = data_dir
+        self.sessions_dir = sessions_dir
+        self.active_file = os.path.join(sessions_dir, 'active')
+        self.lock = Lock()
+        self.loading_lock = Lock()  # one session is loaded at a time
+        self.sessions = {}  # name -> loaded Session
+        self.loaders = []  # callbacks run once for every session loaded
+        os.makedirs(sessions_dir, exist_ok=True)
+
+        self.active_name = DEFAULT_SESSION
+        if os.path.exists(self.active_file):
+            with open(self.active_file, 'r') as file:
+                name = file.read().strip()
+            if self.exists(name):
+                self.active_name = name
+
+    def root_(self, name):
+        return self.data_dir if name == DEFAULT_SESSION else os.path.join(self.sessions_dir, name)
+
+    def exists(self, name):
+        return name == DEFAULT_SESSION or (bool(SESSION_NAME.match(name or '')) and os.path.isdir(self.root_(name)))
+
+    def names(self):
+        """Every session on disk, the default session first."""
+        names = sorted(entry.name for entry in os.scandir(self.sessions_dir)
+                       if entry.is_dir() and SESSION_NAME.match(entry.name) and entry.name != DEFAULT_SESSION)
+        return [DEFAULT_SESSION] + names
+
+    def get(self, name):
+        """Return a session, loading it on first use. Raises SessionNotFound if it does not exist."""
+        with self.lock:
+            session = self.sessions.get(name)
+        if session is not None:
+            return session
+        if not self.exists(name):
+            raise SessionNotFound(name)
+
+        # Loading indexes the whole session, so it happens outside the lock the live session is looked up under
+        with self.loading_lock:
+            with self.lock:
+                session = self.sessions.get(name)
+            if session is None:
+                session = Session(name, self.root_(name))
+                with self.lock:
+                    self.sessions[name] = session
+                    loaders = list(self.loaders)
+                for loader in loaders:
+                    loader(session)
+        return session
+
+    def active(self):
+        return self.get(self.active_name)
+
+    def create(self, name):
+        """Create a new empty session. Raises ValueError if the name is invalid or taken."""
+        if not SESSION_NAME.match(name or '') or name == DEFAULT_SESSION:
+            raise ValueError("Session names are 1-64 letters, digits, '-' or '_'")
+        if self.exists(name):
+            raise ValueError(f"Session '{name}' already exists")
+        os.makedirs(self.root_(name))
+        return self.get(name)
+
+    def activate(self, name):
+        """Make a session the active one. Raises SessionNotFound if it does not exist."""
+        session = self.get(name)
+        with self.lock:
+            self.active_name = name
+            temp_path = self.active_file + '.tmp'
+            with open(temp_path, 'w') as file:
+                file.write(name)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.active_file)
+        return session
+
+    def session_for(self, path):
+        """Return the loaded session an image path belongs to, or the active session."""
+        folder = os.path.abspath(os.path.dirname(path))
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            if os.path.abspath(session.images_dir) == folder:
+                return session
+        return self.active()
+
+    def add_loader(self, callback):
+        """Call callback(session) for every session loaded so far and every session loaded later."""
+        with self.lock:
+            self.loaders.append(callback)
+            loaded = list(self.sessions.values())
+        for session in loaded:
+            callback(session)
+
+    def list(self):
+        """Info for every session on disk, with the active one flagged. Sessions are not loaded to list them."""
+        sessions = []
+        for name in self.names():
+            root = self.root_(name)
+            sessions.append({
+                'name': name,
+                'active': name == self.active_name,
+                'created': os.path.getctime(root),
+                'loaded': name in self.sessions,
+            })
+        return sessions
+
+
+# Process-wide session manager shared by the Flask endpoints and the AI workers
+session_manager = SessionManager()
@@ -0,0 +1,244 @@
+import os
+import json
+from threading import Lock
+
+# Number of journal records before the snapshot is rewritten and the journal truncated
+COMPACT_EVERY = 200
+
+class JournaledStore:
+    """
+    In-memory state persisted as A JSON snapshot plus an append-only JSON Lines journal.
+
+    Every mutation is applied in memory and appended to the journal under a single lock, so requests never
+    re-read or rewrite the whole file. Every COMPACT_EVERY records the snapshot is rewritten atomically
+    (temp file, fsync, rename) and the journal starts over. Subclasses implement empty_() and apply_(record).
+
+    Compaction writes the temp snapshot, then renames the journal to *.compacting, then renames the temp
+    snapshot into place and finally deletes *.compacting. On load, a leftover *.compacting next to a temp
+    snapshot means the crash happened between the two renames: the temp snapshot is complete and already holds
+    every record of *.compacting, so the rename is finished before loading.
+    """
+
+    def __init__(self, snapshot_path, compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + '.journal'
+        self.compacting_path = self.journal_path + '.compacting'
+        self.temp_path = snapshot_path + '.tmp'
+        self.compact_every = compact_every
+        self.lock = Lock()
+        self.data = self.empty_()
+        self.journal = None
+        self.journal_records = 0
+        self.listeners = []
+        self.load_()
+
+    # ========================= Subclass hooks =========================
+    def empty_(self):
+        """Return the empty in-memory state."""
+        raise NotImplementedError
+
+    def apply_(self, record):
+        """Apply a journal record to the in-memory state."""
+        raise NotImplementedError
+
+    def loaded_(self):
+        """Called once the snapshot and journal have been loaded, e.g. to build indexes."""
+
+    # ========================= Persistence =========================
+    def load_(self):
+        if os.path.exists(self.compacting_path):
+            # Temp snapshot still present: the crash happened before it replaced the old snapshot. It was fsynced
+            # before the journal was renamed, so finish the compaction instead of replaying in memory only
+            if os.path.exists(self.temp_path):
+                os.replace(self.temp_path, self.snapshot_path)
+            os.remove(self.compacting_path)
+        if os.path.exists(self.temp_path):
+            # Torn temp snapshot from a crash before the journal was renamed, the journal is still authoritative
+            os.remove(self.temp_path)
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as file:
+                self.data = json.load(file)
+
+        self.journal_records = self.replay_(self.journal_path)
+        self.loaded_()
+
+    def replay_(self, path):
+        """Apply every record in a journal file, returns the number of records applied."""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        valid_bytes = 0
+        with open(path, 'rb') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    print(f"Skipping corrupt journal record in {path}")
+                    break
+                self.apply_(record)
+                count += 1
+                valid_bytes += len(line)
+
+        # Drop the torn tail so new records are not appended onto it
+        if valid_bytes < os.path.getsize(path):
+            with open(path, 'r+b') as file:
+                file.truncate(valid_bytes)
+        return count
+
+    def record_(self, record):
+        """Append a record to the journal and apply it, the caller must hold the lock."""
+        # Journal first, so a failed write leaves memory as it is on disk
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a')
+        self.journal.write(json.dumps(record) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.apply_(record)
+        self.journal_records += 1
+        for listener in self.listeners:
+            listener(record)
+        if self.journal_records >= self.compact_every:
+            self.compact_()
+
+    def compact_(self):
+        """Rewrite the snapshot from memory and start a new journal, the caller must hold the lock."""
+        with open(self.temp_path, 'w') as file:
+            json.dump(self.data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.compacting_path)
+
+        os.replace(self.temp_path, self.snapshot_path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+        self.journal_records = 0
+
+    def compact(self):
+        """Force a compaction, e.g. on shutdown."""
+        with self.lock:
+            self.compact_()
+
+    def add_listener(self, callback):
+        """Call callback(record) after every mutation, e.g. to push changes to clients. Runs under the lock."""
+        self.listeners.append(callback)
+
+
+class CoordinateStore(JournaledStore):
+    """Manually saved target coordinates, keyed by object name (the contents of savedCoords.json)."""
+
+    def empty_(self):
+        return {}
+
+    def apply_(self, record):
+        op = record['op']
+        if op == 'append':
+            self.data.setdefault(record['object'], []).append(record['entry'])
+        elif op == 'delete':
+            entries = self.data[record['object']]
+            del entries[record['index']]
+            if not entries:
+                del self.data[record['object']]
+        elif op == 'delete_object':
+            self.data.pop(record['object'], None)
+        elif op == 'clear':
+            self.data = {}
+
+    def get_all(self):
+        """Return a copy of all saved coordinates."""
+        with self.lock:
+            return {name: list(entries) for name, entries in self.data.items()}
+
+    def get(self, object_name):
+        """Return a copy of the saved coordinates for an object, or None if it has none."""
+        with self.lock:
+            entries = self.data.get(object_name)
+            return list(entries) if entries is not None else None
+
+    def append(self, object_name, entry):
+        """Save a coordinate and return the object's entries after the append."""
+        with self.lock:
+            self.record_({'op': 'append', 'object': object_name, 'entry': entry})
+            return list(self.data[object_name])
+
+    def delete(self, object_name, index):
+        """Delete one coordinate, returns False if it does not exist."""
+        with self.lock:
+            entries = self.data.get(object_name)
+            if entries is None or not isinstance(index, int) or not 0 <= index < len(entries):
+                return False
+            self.record_({'op': 'delete', 'object': object_name, 'index': index})
+            return True
+
+    def delete_object(self, object_name):
+        """Delete all coordinates for an object, returns False if it has none."""
+        with self.lock:
+            if object_name not in self.data:
+                return False
+            self.record_({'op': 'delete_object', 'object': object_name})
+            return True
+
+    def clear(self):
+        """Delete all saved coordinates."""
+        with self.lock:
+            self.record_({'op': 'clear'})
+
+
+class DetectionStore(JournaledStore):
+    """AI detections (lat, lon, confidence) indexed by class name (the contents of TargetInformation.json)."""
+
+    def empty_(self):
+        return {}
+
+    def apply_(self, record):
+        op = record['op']
+        if op == 'append':
+            self.data.setdefault(record['class'], []).append(record['detection'])
+        elif op == 'delete':
+            detections = self.data[record['class']]
+            del detections[record['index']]
+            if not detections:
+                del self.data[record['class']]
+        elif op == 'clear':
+            self.data = {}
+
+    def get_all(self):
+        """Return a copy of all detections."""
+        with self.lock:
+            return {class_name: list(detections) for class_name, detections in self.data.items()}
+
+    def get(self, class_name):
+        """Return a copy of the detections for a class, or an empty list."""
+        with self.lock:
+            return list(self.data.get(class_name, []))
+
+    def append(self, class_name, detection):
+        """Append one detection in O(1)."""
+        with self.lock:
+            self.record_({'op': 'append', 'class': class_name, 'detection': detection})
+
+    def delete(self, class_name, index):
+        """Delete one detection, returns False if it does not exist."""
+        with self.lock:
+            detections = self.data.get(class_name)
+            if detections is None or not isinstance(index, int) or not 0 <= index < len(detections):
+                return False
+            self.record_({'op': 'delete', 'class': class_name, 'index': index})
+            return True
+
+    def has_class(self, class_name):
+        """Return True if there are detections for a class."""
+        with self.lock:
+            return class_name in self.data
+
+    def clear(self):
+        """Delete all detections."""
+        with self.lock:
+            self.record_({'op': 'clear'})
+
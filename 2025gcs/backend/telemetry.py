@@ -0,0 +1,155 @@
+import time
+import requests
+from threading import Thread, Event, Lock
+
+HEARTBEAT_INTERVAL = 0.5  # seconds between heartbeat polls
+STALE_AFTER = 3  # seconds without a successful poll before the link is reported down
+LATENCY_SMOOTHING = 0.2  # weight of the newest sample in the average latency
+
+# Vehicle state before the first heartbeat arrives
+DEFAULT_VEHICLE_DATA = {
+    "last_time": 0,
+    "lat": 0,
+    "lon": 0,
+    "rel_alt": 0,
+    "alt": 0,
+    "roll": 0,
+    "pitch": 0,
+    "yaw": 0,
+    "dlat": 0,
+    "dlon": 0,
+    "dalt": 0,
+    "heading": 0,
+    "groundspeed": 0,
+    "throttle": 0,
+    "climb": 0,
+    "flight_mode": 0,
+    "battery_voltage": 0,
+    "battery_current": 0,
+    "battery_remaining": 0,
+    "is_dropped": False
+}
+
+class TelemetryPoller:
+    """
+    Polls the vehicle heartbeat on a background thread and caches the latest vehicle state.
+
+    Requests for telemetry read the cached snapshot and never wait on the radio link. on_dropped() is called
+    from the poller thread once each time is_dropped goes from False to True, and on_update(changes, connected)
+    whenever vehicle values change or the link goes up or down, with only the changed values. Polls are sent as circuit breaker
+    probes, so the shared vehicle client notices as soon as the link comes back. Every new vehicle state is also
+    recorded in history (A TelemetryHistory) if one is given.
+    """
+
+    def __init__(self, client, endpoint='heartbeat-validate', interval=HEARTBEAT_INTERVAL, on_dropped=None, on_update=None,
+                 history=None):
+        self.client = client
+        self.endpoint = endpoint
+        self.interval = interval
+        self.on_dropped = on_dropped
+        self.on_update = on_update
+        self.history = history
+        self.reported_connected = False  # link state last passed to on_update
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+
+        self.vehicle_data = dict(DEFAULT_VEHICLE_DATA)
+        self.last_success = None  # time.time() of the last successful poll
+        self.polls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None  # seconds, smoothed
+        self.last_error = None
+
+    def poll(self):
+        """Fetch one heartbeat and update the cached state, returns True on success."""
+        start = time.monotonic()
+        try:
+            # No retries, the next poll is the retry
+            response = self.client.get(self.endpoint, idempotent=False, probe=True)
+            heartbeat_data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self.lock:
+                self.polls += 1
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+            return False
+
+        elapsed = time.monotonic() - start
+        with self.lock:
+            was_dropped = self.vehicle_data.get("is_dropped", False)
+            changes = {key: value for key, value in heartbeat_data.items() if self.vehicle_data.get(key) != value}
+            self.vehicle_data.update(heartbeat_data)
+            self.last_success = time.time()
+            self.polls += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+            vehicle_data = dict(self.vehicle_data)
+
+        if self.history is not None:
+            self.history.append(vehicle_data)
+
+        if heartbeat_data.get("is_dropped") == True and not was_dropped and self.on_dropped is not None:
+            self.on_dropped()
+        self.report_(changes)
+        return True
+
+    def report_(self, changes):
+        """Pass changed values and link state transitions to on_update."""
+        if self.on_update is None:
+            return
+        connected = self.snapshot()['connected']
+        if changes or connected != self.reported_connected:
+            self.reported_connected = connected
+            self.on_update(changes, connected)
+
+    def snapshot(self):
+        """Return the cached vehicle state, its age in seconds and link statistics."""
+        with self.lock:
+            age = time.time() - self.last_success if self.last_success is not None else None
+            return {
+                'connected': age is not None and age < STALE_AFTER,
+                'vehicle_data': dict(self.vehicle_data),
+                'age': age,
+                'link': {
+                    'polls': self.polls,
+                    'failures': self.failures,
+                    'consecutive_failures': self.consecutive_failures,
+                    'loss_rate': self.failures / self.polls if self.polls else None,
+                    'latency': self.latency,
+                    'last_error': self.last_error,
+                    'breaker': self.client.state(),
+                },
+            }
+
+    def run_(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                if not self.poll():
+                    self.report_({})  # the link may have just gone stale
+            except Exception as e:
+                print(f"Error in telemetry poller: {e}")
+            # Poll on a fixed schedule, a slow response is not followed by an extra wait
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """Start the poller thread if it is not already running."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run_, daemon=True, name="TelemetryPoller")
+        self.thread.start()
+
+    def stop(self):
+        """Stop the poller thread and wait for it to finish."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
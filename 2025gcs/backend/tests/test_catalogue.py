@@ -0,0 +1,44 @@
+import json
+import pytest
+from catalogue import ImageCatalogue
+
+
+def make_catalogue(tmp_path, data):
+    """A catalogue over one image, 00001.jpg, with data written as its telemetry JSON."""
+    images_dir = tmp_path / 'images'
+    data_dir = tmp_path / 'imageData'
+    images_dir.mkdir()
+    data_dir.mkdir()
+    (images_dir / '00001.jpg').write_bytes(b'jpeg')
+    (data_dir / '00001.json').write_text(json.dumps(data))
+    return ImageCatalogue(str(images_dir), str(data_dir)), data_dir
+
+
+def test_telemetry_is_indexed_with_its_image(tmp_path):
+    catalogue, _ = make_catalogue(tmp_path, {'lat': 51.0, 'lon': -113.5})
+    assert catalogue.get_data('00001.jpg') == {'lat': 51.0, 'lon': -113.5}
+    assert catalogue.image_data()['entries'] == [{'lat': 51.0, 'lon': -113.5, 'image': '00001.jpg'}]
+
+
+def test_telemetry_that_is_not_an_object_is_ignored(tmp_path):
+    catalogue, data_dir = make_catalogue(tmp_path, [51.0, -113.5])
+    assert catalogue.get_data('00001.jpg') is None
+    assert catalogue.image_data()['entries'] == []
+    assert catalogue.images()['total'] == 1
+
+    # Same when it arrives after startup, and data without an image leaves no entry behind
+    (data_dir / '00002.json').write_text(json.dumps("not telemetry"))
+    catalogue.add_data('00002.json')
+    assert catalogue.get_data('00002.jpg') is None
+    assert '00002' not in catalogue.entries
+    assert catalogue.data_count() == 0
+
+
+def test_unparseable_telemetry_leaves_no_partial_entry(tmp_path):
+    catalogue, data_dir = make_catalogue(tmp_path, {'lat': 51.0})
+    revision = catalogue.revision
+    (data_dir / '00002.json').write_text('{"lat": 51.0,')
+    with pytest.raises(ValueError):
+        catalogue.add_data('00002.json')
+    assert '00002' not in catalogue.entries
+    assert catalogue.revision == revision
@@ -0,0 +1,90 @@
+import pytest
+from clustering import ClassClusters, DetectionClusters, CLUSTER_RADIUS, MIN_DETECTIONS
+
+LAT, LON = 51.0, -113.5
+METRE = 1 / 111_320  # degrees of latitude
+
+
+def detection(north_m, confidence):
+    return {'lat': LAT + north_m * METRE, 'lon': LON, 'confidence': confidence}
+
+
+def clusters_of(detections_by_class):
+    clusters = DetectionClusters()
+    clusters.rebuild(detections_by_class)
+    return clusters
+
+
+def test_dense_detections_form_one_cluster():
+    clusters = clusters_of({'car': [detection(offset, 0.5) for offset in (0, 1, 2, 3)] + [detection(300, 0.9)]})
+    best = clusters.best('car')
+    assert best['clustered']
+    assert best['count'] == 4
+    assert best['lat'] == pytest.approx(LAT + 1.5 * METRE, abs=0.1 * METRE)
+    assert len(clusters.hypotheses('car')) == 2
+
+
+def test_agreeing_pair_beats_a_stray_false_positive():
+    """Fewer than MIN_DETECTIONS agreeing detections must still outrank a single, more confident one."""
+    assert MIN_DETECTIONS > 2
+    clusters = clusters_of({'car': [detection(0, 0.8), detection(2, 0.8), detection(200, 0.9)]})
+    best = clusters.best('car')
+    assert not best['clustered']
+    assert best['count'] == 2
+    assert best['confidence'] == pytest.approx(1.6)
+    assert best['lat'] == pytest.approx(LAT + METRE, abs=0.1 * METRE)
+
+
+def test_detections_further_apart_than_the_radius_stay_separate():
+    clusters = clusters_of({'car': [detection(0, 0.5), detection(CLUSTER_RADIUS * 3, 0.6)]})
+    hypotheses = clusters.hypotheses('car')
+    assert [hypothesis['count'] for hypothesis in hypotheses] == [1, 1]
+    assert hypotheses[0]['confidence'] == pytest.approx(0.6)
+
+
+def test_incremental_adds_match_a_rebuild():
+    detections = [detection(offset, 0.1 * (index + 1)) for index, offset in enumerate((0, 40, 1, 41, 2, 90, 3))]
+    incremental = DetectionClusters()
+    for item in detections:
+        incremental.apply({'op': 'append', 'class': 'car', 'detection': item})
+    assert incremental.hypotheses('car') == clusters_of({'car': detections}).hypotheses('car')
+
+
+def test_delete_and_clear_follow_the_store():
+    detections = [detection(0, 0.5), detection(1, 0.5), detection(2, 0.5)]
+    clusters = clusters_of({'car': detections})
+    assert clusters.best('car')['clustered']
+
+    clusters.apply({'op': 'delete', 'class': 'car', 'index': 0})
+    assert not clusters.best('car')['clustered']
+    assert clusters.best('car')['count'] == 2
+
+    clusters.apply({'op': 'clear'})
+    assert clusters.best('car') is None
+    assert clusters.best(None) is None
+
+
+def test_zero_confidence_uses_an_unweighted_centroid():
+    classes = ClassClusters(12, True)
+    for offset in (0, 2):
+        item = detection(offset, 0.0)
+        classes.add(item['lat'], item['lon'], 0.0)
+    hypothesis = classes.hypotheses()[0]
+    assert hypothesis['lat'] == pytest.approx(LAT + METRE, abs=0.1 * METRE)
+
+
+def test_confident_group_outranks_a_weak_cluster():
+    weak = [detection(offset, 0.1) for offset in range(MIN_DETECTIONS)]
+    confident = [detection(200, 0.95), detection(201, 0.9)]
+    clusters = clusters_of({'car': weak + confident})
+    best = clusters.best('car')
+    assert not best['clustered']
+    assert best['count'] == 2
+    assert [hypothesis['clustered'] for hypothesis in clusters.hypotheses('car')] == [False, True]
+
+
+def test_cluster_wins_a_tie_on_confidence():
+    cluster = [detection(offset, 0.5) for offset in range(MIN_DETECTIONS)]
+    group = [detection(200 + offset, 0.5 * MIN_DETECTIONS / 2) for offset in (0, 1)]
+    best = clusters_of({'car': group + cluster}).best('car')
+    assert best['clustered']
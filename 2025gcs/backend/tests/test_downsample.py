@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from downsample import lttb, min_max, downsample
+
+
+def test_lttb_keeps_endpoints_and_count():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[321] = 10.0
+    assert 321 in lttb(x, y, 20)
+
+
+def test_lttb_returns_everything_when_short():
+    x = np.arange(5, dtype=float)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_min_max_keeps_both_extremes_of_every_bucket():
+    y = np.array([5, 1, 9, 3, 7, 0, 8, 2], dtype=float)
+    kept = min_max(y, 4)
+    assert kept.tolist() == [1, 2, 5, 6]
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        downsample(np.arange(3.0), np.arange(3.0), 2, method="mean")
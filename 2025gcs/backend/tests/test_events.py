@@ -0,0 +1,32 @@
+import pytest
+from events import EventBroker, SubscriberLimitError
+
+
+def test_reconnect_receives_missed_events_or_a_reset():
+    broker = EventBroker(history=3)
+    for number in range(5):
+        broker.publish('image', {'number': number})
+
+    _, missed = broker.subscribe(last_event_id=3)
+    assert [data['number'] for _, _, data in missed] == [3, 4]
+    _, missed = broker.subscribe(last_event_id=1)
+    assert missed is None
+
+
+def test_subscribers_are_capped_until_one_leaves():
+    broker = EventBroker(max_subscribers=2)
+    first, _ = broker.subscribe()
+    broker.subscribe()
+    with pytest.raises(SubscriberLimitError):
+        broker.subscribe()
+
+    broker.unsubscribe(first)
+    broker.subscribe()
+
+
+def test_closing_a_stream_unsubscribes():
+    broker = EventBroker(max_subscribers=1)
+    stream = broker.stream(*broker.subscribe(), initial=[('telemetry', {})])
+    assert next(stream).startswith('event: telemetry')
+    stream.close()
+    assert not broker.subscribers
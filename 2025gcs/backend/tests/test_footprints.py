@@ -0,0 +1,47 @@
+import pytest
+from footprints import FootprintIndex
+from geo import image_to_object_space, lat_long_to_utm, utm_to_lat_long, IMAGE_WIDTH, IMAGE_HEIGHT
+
+FRAME = {'lat': 51.0, 'lon': -113.5, 'rel_alt': 40.0, 'yaw': 0.3, 'pitch': 0.0, 'roll': 0.0}
+
+
+def ground_point(frame, x, y):
+    """Latitude and longitude of the ground seen at pixel x, y of a frame."""
+    easting, northing, zone = lat_long_to_utm(frame['lat'], frame['lon'])
+    target = image_to_object_space(easting, northing, frame['rel_alt'], x, y, frame['yaw'], frame['pitch'], frame['roll'])
+    return utm_to_lat_long(*target, zone, northern=True)
+
+
+def test_query_round_trips_a_pixel():
+    index = FootprintIndex()
+    assert index.add('00001.jpg', FRAME)
+    lat, lon = ground_point(FRAME, 1000.0, 700.0)
+
+    [found] = index.query(lat, lon)
+    assert found['image'] == '00001.jpg'
+    assert found['x'] == pytest.approx(1000.0, abs=0.5)
+    assert found['y'] == pytest.approx(700.0, abs=0.5)
+
+
+def test_point_outside_every_footprint_finds_nothing():
+    index = FootprintIndex()
+    index.add('00001.jpg', FRAME)
+    assert index.query(FRAME['lat'] + 0.01, FRAME['lon']) == []
+
+
+def test_closest_nadir_first_and_remove():
+    index = FootprintIndex()
+    index.add('00001.jpg', FRAME)
+    index.add('00002.jpg', dict(FRAME, lat=FRAME['lat'] + 5 / 111_320))
+    lat, lon = ground_point(FRAME, IMAGE_WIDTH / 2, IMAGE_HEIGHT / 2)
+
+    assert [found['image'] for found in index.query(lat, lon)][0] == '00001.jpg'
+    index.remove('00001.jpg')
+    assert [found['image'] for found in index.query(lat, lon)] == ['00002.jpg']
+
+
+@pytest.mark.parametrize('data', [None, [], 'null', {'lat': 51.0}, dict(FRAME, rel_alt=1.0)])
+def test_unusable_telemetry_is_not_indexed(data):
+    index = FootprintIndex()
+    assert index.add('00001.jpg', data) is False
+    assert len(index) == 0
@@ -0,0 +1,184 @@
+import os
+import json
+import numpy as np
+import pytest
+from geo import (image_to_object_space, image_to_object_space_batch, object_to_image_space_batch, lat_long_to_utm,
+                 lat_long_to_utm_array, utm_to_lat_long, model, design_matrix, solve_normal_equations,
+                 least_squares_adjustment, parametric_adjustment, TargetEstimator, TargetEstimates,
+                 ADJUSTMENT_THRESHOLD, MAX_ADJUSTMENT_ITERATIONS)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+rng = np.random.default_rng(2025)
+
+
+@pytest.fixture
+def saved_coords():
+    """Manually saved target observations from a test flight (a copy of data/savedCoords.json)."""
+    with open(os.path.join(DATA_DIR, 'saved_coords.json')) as file:
+        return json.load(file)
+
+
+def reference_image_to_object_space(easting_drone, northing_drone, agl, x_pix, y_pix, yaw, pitch, roll):
+    """The original one observation at a time projection, kept here to check the vectorized path against."""
+    focal_length = 0.002845
+    pixel_spacing = 0.00345
+    pitch += 0.04
+    roll += 0.02
+    x_fiducial = 2.5116
+    y_fiducial = -1.8768
+    scale = agl / focal_length
+    image = np.array([(x_pix * pixel_spacing) - x_fiducial, ((-y_pix * pixel_spacing) - y_fiducial)])
+    obj = np.array([((scale * image[0]) / 1000), ((scale * image[1]) / 1000) - 9, agl])
+    Rx = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
+    Ry = np.array([[np.cos(roll), 0, np.sin(roll)], [0, 1, 0], [-np.sin(roll), 0, np.cos(roll)]])
+    Rz = np.array([[np.cos(yaw), np.sin(yaw), 0], [-np.sin(yaw), np.cos(yaw), 0], [0, 0, 1]])
+    target = (Rz @ Ry @ Rx) @ obj
+    t = agl / target[2]
+    return easting_drone + target[0] * t, northing_drone + target[1] * t
+
+
+def random_observations(n):
+    return (rng.uniform(300_000, 700_000, n), rng.uniform(5_600_000, 5_700_000, n), rng.uniform(20, 120, n),
+            rng.uniform(0, 1456, n), rng.uniform(0, 1088, n), rng.uniform(-np.pi, np.pi, n),
+            rng.uniform(-0.3, 0.3, n), rng.uniform(-0.3, 0.3, n))
+
+
+def test_batch_matches_the_original_scalar_projection():
+    observations = random_observations(500)
+    easting, northing = image_to_object_space_batch(*observations)
+    for i in range(500):
+        expected = reference_image_to_object_space(*(values[i] for values in observations))
+        assert easting[i] == pytest.approx(expected[0], abs=1e-6)
+        assert northing[i] == pytest.approx(expected[1], abs=1e-6)
+
+
+def test_scalar_wrapper_matches_batch():
+    observations = random_observations(20)
+    easting, northing = image_to_object_space_batch(*observations)
+    for i in range(20):
+        assert image_to_object_space(*(values[i] for values in observations)) == pytest.approx((easting[i], northing[i]))
+
+
+def fixture_vectors(target, saved_coords):
+    entries = saved_coords[target]
+    easting, northing, _ = lat_long_to_utm_array([e['lat'] for e in entries], [e['lon'] for e in entries])
+    agl = np.array([e['rel_alt'] for e in entries], dtype=float)
+    easting_target, northing_target = image_to_object_space_batch(
+        easting, northing, agl, [e['x'] for e in entries], [e['y'] for e in entries],
+        [e['yaw'] for e in entries], [e['pitch'] for e in entries], [e['roll'] for e in entries])
+    obs_std = np.array([e['position_uncertainty'] for e in entries], dtype=float) / 1000
+    return easting, northing, agl, easting_target, northing_target, obs_std
+
+
+def dense_adjustment(easting, northing, agl, easting_target, northing_target, obs_std):
+    """Gauss-Newton with a full n x n weight matrix, the formulation least_squares_adjustment replaced."""
+    P = np.linalg.inv(np.diag(obs_std**2))
+    estimate = np.array([np.mean(easting_target), np.mean(northing_target)])
+    observed = model(easting, northing, easting_target, northing_target, agl)
+    for _ in range(MAX_ADJUSTMENT_ITERATIONS):
+        A = design_matrix(easting, northing, agl, *estimate)
+        w = observed - model(easting, northing, *estimate, agl)
+        d = np.linalg.inv(A.T @ P @ A) @ A.T @ P @ w
+        estimate = estimate + d
+        if np.max(np.abs(d)) <= ADJUSTMENT_THRESHOLD:
+            break
+    return estimate
+
+
+def test_closed_form_normal_equations_match_a_dense_solve():
+    A = rng.normal(size=(40, 2))
+    w = rng.normal(size=40)
+    weights = rng.uniform(0.5, 2.0, 40)
+    d_hat, N_inv = solve_normal_equations(A, w, weights)
+    N = A.T @ np.diag(weights) @ A
+    assert d_hat == pytest.approx(np.linalg.solve(N, A.T @ np.diag(weights) @ w))
+    assert N_inv == pytest.approx(np.linalg.inv(N))
+
+
+@pytest.mark.parametrize('target', ['bed', 'car', 'snowboard', 'tennis racket', 'sports ball', 'boat'])
+def test_vector_adjustment_matches_the_dense_formulation(target, saved_coords):
+    vectors = fixture_vectors(target, saved_coords)
+    easting, northing, _, _, converged = least_squares_adjustment(*vectors)
+    assert converged
+    assert (easting, northing) == pytest.approx(tuple(dense_adjustment(*vectors)), abs=1e-6)
+
+
+def test_skis_outlier_pass_falls_back_to_the_previous_estimate(saved_coords):
+    """Documented divergence: after rejecting observation 4 the skis re-run oscillates and never converges."""
+    vectors = fixture_vectors('skis', saved_coords)
+    first_easting, first_northing, _, _, first_converged = least_squares_adjustment(*vectors)
+    assert first_converged
+
+    easting, northing, report = parametric_adjustment(*vectors)
+    assert report == {'iterations': 2, 'rejected': [4], 'converged': False}
+    assert (easting, northing) == (first_easting, first_northing)
+
+
+def test_outlier_rejection_is_bounded(saved_coords):
+    vectors = fixture_vectors('bed', saved_coords)
+    obs_std = vectors[-1].copy()
+    _, _, report = parametric_adjustment(*vectors)
+    assert report['converged'] and report['iterations'] == 5
+    assert np.array_equal(vectors[-1], obs_std)  # the caller's uncertainties are not inflated in place
+
+    _, _, report = parametric_adjustment(*vectors, max_outer_iterations=2)
+    assert report['iterations'] == 2 and not report['converged']
+
+
+def synthetic_entries(n, outliers=()):
+    """Observations of a target at (51, -113.5) from random drone positions, with 2 pixels of noise."""
+    easting_target, northing_target, zone = lat_long_to_utm(51.0, -113.5)
+    easting = easting_target + rng.uniform(-30, 30, n)
+    northing = northing_target + rng.uniform(-30, 30, n)
+    yaw = rng.uniform(-np.pi, np.pi, n)
+    x, y = object_to_image_space_batch(easting, northing, np.full(n, 40.0), np.full(n, easting_target),
+                                       np.full(n, northing_target), yaw, np.zeros(n), np.zeros(n))
+    x = x + rng.normal(0, 2, n)
+    y = y + rng.normal(0, 2, n)
+    x[list(outliers)] += 400
+    entries = []
+    for i in range(n):
+        lat, lon = utm_to_lat_long(easting[i], northing[i], zone)
+        entries.append(dict(lat=lat, lon=lon, rel_alt=40.0, x=x[i], y=y[i], yaw=yaw[i], pitch=0.0, roll=0.0,
+                            position_uncertainty=100, image=f"{i:05d}.jpg"))
+    return entries
+
+
+def distance(first, second):
+    first_easting, first_northing, _ = lat_long_to_utm(first['lat'], first['lon'])
+    second_easting, second_northing, _ = lat_long_to_utm(second['lat'], second['lon'])
+    return np.hypot(first_easting - second_easting, first_northing - second_northing)
+
+
+def test_incremental_estimate_tracks_the_batch_adjustment():
+    entries = synthetic_entries(200, outliers=(40, 130))
+    incremental = TargetEstimator()
+    for entry in entries:
+        incremental.add(entry)
+    batch = TargetEstimator()
+    batch.extend(entries)
+
+    assert distance(incremental.estimate(), batch.estimate()) < 0.1
+    # One full adjustment per doubling plus the first, not one per flagged observation
+    assert incremental.estimate()['full_adjustments'] <= 10
+
+
+def test_sync_drops_a_deleted_observation_even_if_the_count_is_unchanged():
+    entries = synthetic_entries(80, outliers=(5,))
+    estimates = TargetEstimates()
+    estimates.sync('car', entries[:60])
+    for end in range(61, 70):
+        estimates.sync('car', entries[:end])
+
+    # Delete the outlier and append the next observation, the length stays the same
+    edited = entries[:5] + entries[6:70]
+    assert len(edited) == 69
+    assert estimates.sync('car', edited) == TargetEstimates().rebuild('car', edited)
+
+    for end in range(71, 80):
+        edited = edited + [entries[end]]
+        estimate = estimates.sync('car', edited)
+    batch = TargetEstimates().rebuild('car', edited)
+    assert estimate['observations'] == batch['observations'] == 78
+    assert distance(estimate, batch) < 0.1
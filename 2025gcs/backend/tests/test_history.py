@@ -0,0 +1,85 @@
+import math
+import numpy as np
+import pytest
+from history import TelemetryHistory, MAX_GAP
+
+
+def heartbeat(time, **values):
+    return {'last_time': time, **values}
+
+
+def test_interpolates_between_samples():
+    history = TelemetryHistory(capacity=8)
+    history.append(heartbeat(10.0, lat=51.0, rel_alt=30.0))
+    history.append(heartbeat(11.0, lat=51.1, rel_alt=40.0))
+
+    result = history.interpolate([10.0, 10.25, 11.0], ["lat", "rel_alt"])
+    assert result["lat"] == pytest.approx([51.0, 51.025, 51.1])
+    assert result["rel_alt"] == pytest.approx([30.0, 32.5, 40.0])
+
+
+def test_outside_span_and_gaps_are_nan():
+    history = TelemetryHistory(capacity=8)
+    history.append(heartbeat(10.0, lat=51.0))
+    history.append(heartbeat(10.5, lat=51.0))
+    history.append(heartbeat(10.5 + MAX_GAP + 1, lat=52.0))
+
+    lat = history.interpolate([9.0, 10.25, 11.0, 100.0], ["lat"])["lat"]
+    assert lat[1] == pytest.approx(51.0)
+    assert np.isnan(lat[[0, 2, 3]]).all()
+
+
+def test_angles_take_the_shorter_arc():
+    history = TelemetryHistory(capacity=8)
+    history.append(heartbeat(1.0, yaw=math.pi - 0.1, heading=350.0))
+    history.append(heartbeat(2.0, yaw=-math.pi + 0.2, heading=10.0))
+
+    result = history.interpolate([1.5], ["yaw", "heading"])
+    assert result["yaw"][0] == pytest.approx(-math.pi + 0.05)
+    assert result["heading"][0] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_ring_buffer_keeps_the_newest_samples_in_order():
+    history = TelemetryHistory(capacity=4)
+    for second in range(1, 11):
+        history.append(heartbeat(float(second), lat=float(second)))
+
+    times, values = history.window()
+    assert times.tolist() == [7.0, 8.0, 9.0, 10.0]
+    assert values["lat"].tolist() == [7.0, 8.0, 9.0, 10.0]
+    assert history.span() == (7.0, 10.0)
+    assert history.interpolate([8.5], ["lat"])["lat"][0] == pytest.approx(8.5)
+
+
+def test_repeated_or_older_heartbeats_are_ignored():
+    history = TelemetryHistory(capacity=4)
+    assert history.append(heartbeat(5.0, lat=1.0))
+    assert not history.append(heartbeat(5.0, lat=2.0))
+    assert not history.append(heartbeat(4.0, lat=3.0))
+    assert not history.append({'lat': 4.0})
+    assert len(history) == 1
+
+
+def test_window_bounds_are_inclusive():
+    history = TelemetryHistory(capacity=8)
+    for second in range(1, 6):
+        history.append(heartbeat(float(second), lat=float(second)))
+    times, _ = history.window(1.0, 3.0, ["lat"])
+    assert times.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_align_uses_the_pose_at_capture_time():
+    history = TelemetryHistory(capacity=8)
+    pose = dict(lat=51.0, lon=-114.0, rel_alt=30.0, alt=1100.0, roll=0.0, pitch=0.0, yaw=0.0)
+    history.append(heartbeat(10.0, **pose))
+    history.append(heartbeat(11.0, **dict(pose, lat=51.001, rel_alt=40.0)))
+
+    aligned = history.align(dict(pose, lat=50.0, capture_time=10.5, image='00001.jpg'))
+    assert aligned['pose_source'] == 'history'
+    assert aligned['lat'] == pytest.approx(51.0005)
+    assert aligned['rel_alt'] == pytest.approx(35.0)
+    assert aligned['image'] == '00001.jpg'
+
+    snapshot = history.align(dict(pose, capture_time=99.0))
+    assert snapshot['pose_source'] == 'snapshot'
+    assert snapshot['lat'] == 51.0
@@ -0,0 +1,76 @@
+import json
+import numpy as np
+import pytest
+from odm.odm_filter import load_frames, filter_for_odm, DISTANCE_THRESHOLD
+
+geodesic = pytest.importorskip('geopy.distance').geodesic
+
+rng = np.random.default_rng(25)
+
+
+def reference_filter(json_directory, images_directory, lower_index, upper_index):
+    """
+    The original script's selection loop, kept here to check the grid-indexed version against. Returns the
+    geotags lines and the images kept.
+    """
+    lines = ["EPSG:4326"]
+    filtered_images = []
+    used_coords = []
+    json_files = sorted(f.name for f in json_directory.iterdir() if f.name.lower().endswith(".json"))
+    for filename in json_files[lower_index:upper_index]:
+        try:
+            data = json.loads((json_directory / filename).read_text(encoding="utf-8"))
+            base_name = filename[:-len(".json")]
+            capture_name = next((base_name + ext for ext in [".jpg", ".JPG", ".jpeg", ".JPEG"]
+                                 if (images_directory / (base_name + ext)).is_file()), None)
+            if not capture_name:
+                continue
+            lat, lon, alt, yaw, pitch, roll = (data.get(key, 0.0) for key in ("lat", "lon", "rel_alt", "yaw", "pitch", "roll"))
+            if any(not isinstance(v, (int, float)) for v in [lat, lon, alt, yaw, pitch, roll]):
+                continue
+            if all(geodesic((lat, lon), coord).meters >= DISTANCE_THRESHOLD for coord in used_coords):
+                used_coords.append((lat, lon))
+                filtered_images.append(capture_name)
+                lines.append(f"{capture_name} {lat} {lon} {alt} {yaw} {pitch} {roll}")
+        except Exception:
+            continue  # the original logged and skipped anything that failed, including JSON that is not an object
+    return lines, filtered_images
+
+
+@pytest.fixture
+def flight(tmp_path):
+    """A survey flight over 200 m, many frames closer than the threshold, plus the broken files seen in practice."""
+    json_directory = tmp_path / 'imageData'
+    images_directory = tmp_path / 'images'
+    json_directory.mkdir()
+    images_directory.mkdir()
+    for i in range(400):
+        data = {'lat': 51.0 + rng.uniform(0, 0.0018), 'lon': -113.5 + rng.uniform(0, 0.0028),
+                'rel_alt': rng.uniform(30, 40), 'yaw': rng.uniform(-3, 3), 'pitch': 0.01, 'roll': -0.02}
+        (json_directory / f'{i:05d}.json').write_text(json.dumps(data))
+        (images_directory / f'{i:05d}.{"JPG" if i % 7 == 0 else "jpg"}').write_bytes(b'jpeg')
+    for name, text in [('00401', '[51.0, -113.5]'), ('00402', '"telemetry"'), ('00403', '{"lat": 51.0,'),
+                       ('00404', json.dumps({'lat': 'unknown', 'lon': -113.5}))]:
+        (json_directory / f'{name}.json').write_text(text)
+        (images_directory / f'{name}.jpg').write_bytes(b'jpeg')
+    (json_directory / '00405.json').write_text(json.dumps({'lat': 51.0, 'lon': -113.5}))  # no image
+    return json_directory, images_directory
+
+
+def test_json_that_is_not_an_object_is_skipped(flight):
+    json_directory, images_directory = flight
+    assert load_frames(str(json_directory), str(images_directory), 400, None) == []
+
+
+@pytest.mark.parametrize('lower_index, upper_index', [(0, 410), (50, 300)])
+def test_selection_and_geotags_match_the_original_script(flight, tmp_path, lower_index, upper_index):
+    json_directory, images_directory = flight
+    output_directory = tmp_path / 'odm_project'
+    output_file = filter_for_odm(str(output_directory), str(json_directory), str(images_directory),
+                                 lower_index, upper_index)
+
+    lines, filtered_images = reference_filter(json_directory, images_directory, lower_index, upper_index)
+    with open(output_file, encoding='utf-8') as file:
+        assert file.read() == "\n".join(lines)
+    assert sorted(path.name for path in (output_directory / 'images').iterdir()) == sorted(filtered_images)
+    assert 1 < len(filtered_images) < upper_index - lower_index
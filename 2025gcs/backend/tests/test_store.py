@@ -0,0 +1,112 @@
+import os
+import json
+import pytest
+from store import CoordinateStore, DetectionStore
+
+
+def detection(lat, confidence=0.5):
+    return {'lat': lat, 'lon': -114.0, 'confidence': confidence}
+
+
+def test_reload_replays_journal(tmp_path):
+    path = str(tmp_path / 'targets.json')
+    store = DetectionStore(path)
+    store.append('tent', detection(51.0))
+    store.append('tent', detection(51.1))
+    store.delete('tent', 0)
+
+    reloaded = DetectionStore(path)
+    assert reloaded.get('tent') == [detection(51.1)]
+
+
+def test_compaction_truncates_journal(tmp_path):
+    path = str(tmp_path / 'targets.json')
+    store = DetectionStore(path, compact_every=3)
+    for index in range(4):
+        store.append('tent', detection(51.0 + index))
+
+    with open(path) as file:
+        assert len(json.load(file)['tent']) == 3
+    with open(store.journal_path) as file:
+        assert len(file.readlines()) == 1
+    assert len(DetectionStore(path).get('tent')) == 4
+
+
+def test_crash_between_renames_keeps_compacted_records(tmp_path):
+    """Crash after the journal became *.compacting but before the temp snapshot replaced the old one."""
+    path = str(tmp_path / 'targets.json')
+    store = DetectionStore(path)
+    store.append('tent', detection(51.0))
+    store.compact()
+    store.append('tent', detection(51.1))
+    store.append('tent', detection(51.2))
+    store.journal.close()
+
+    with open(store.temp_path, 'w') as file:
+        json.dump(store.data, file)
+    os.replace(store.journal_path, store.compacting_path)
+
+    recovered = DetectionStore(path)
+    expected = [detection(51.0), detection(51.1), detection(51.2)]
+    assert recovered.get('tent') == expected
+    assert not os.path.exists(recovered.compacting_path)
+    assert not os.path.exists(recovered.temp_path)
+
+    # Disk alone must hold the records, with no compaction in between
+    assert DetectionStore(path).get('tent') == expected
+    # Index based deletes after recovery land on the same entries
+    again = DetectionStore(path)
+    again.delete('tent', 2)
+    assert DetectionStore(path).get('tent') == expected[:2]
+
+
+def test_crash_after_snapshot_rename_drops_stale_journal(tmp_path):
+    path = str(tmp_path / 'targets.json')
+    store = DetectionStore(path)
+    store.append('tent', detection(51.0))
+    store.journal.close()
+    os.replace(store.journal_path, store.compacting_path)
+    with open(path, 'w') as file:
+        json.dump(store.data, file)
+
+    assert DetectionStore(path).get('tent') == [detection(51.0)]
+
+
+def test_torn_temp_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / 'targets.json')
+    store = DetectionStore(path)
+    store.append('tent', detection(51.0))
+    with open(store.temp_path, 'w') as file:
+        file.write('{"tent": [')
+
+    recovered = DetectionStore(path)
+    assert recovered.get('tent') == [detection(51.0)]
+    assert not os.path.exists(recovered.temp_path)
+
+
+def test_torn_journal_line_is_truncated(tmp_path):
+    path = str(tmp_path / 'coords.json')
+    store = CoordinateStore(path)
+    store.append('bucket', {'lat': 51.0, 'lon': -114.0})
+    store.journal.close()
+    with open(store.journal_path, 'a') as file:
+        file.write('{"op": "app')
+
+    recovered = CoordinateStore(path)
+    assert recovered.get('bucket') == [{'lat': 51.0, 'lon': -114.0}]
+    recovered.append('bucket', {'lat': 51.1, 'lon': -114.0})
+    assert len(CoordinateStore(path).get('bucket')) == 2
+
+
+def test_failed_journal_write_leaves_memory_unchanged(tmp_path):
+    path = str(tmp_path / 'coords.json')
+    store = CoordinateStore(path)
+
+    class BrokenJournal:
+        def write(self, text):
+            raise OSError("disk full")
+
+    store.journal = BrokenJournal()
+    with pytest.raises(OSError):
+        store.append('bucket', {'lat': 51.0, 'lon': -114.0})
+    assert store.get('bucket') is None
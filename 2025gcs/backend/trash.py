@@ -0,0 +1,95 @@
+import os
+import time
+import shutil
+from queue import Queue
+from threading import Thread, Lock
+
+TRASH_DIR = os.path.join(os.path.dirname(__file__), 'data', 'trash')
+PROGRESS_EVERY = 100  # files deleted between progress updates
+
+class TrashCollector:
+    """
+    Clears folders in constant time by renaming them into a trash generation, then deletes them in the background.
+
+    Each discard() moves the folders under TRASH_DIR/<generation>/ and recreates them empty, so the caller
+    never waits on the file system. A single background thread deletes one generation at a time and records
+    its progress. Generations left over from a previous run are deleted on startup.
+    """
+
+    def __init__(self, trash_dir=TRASH_DIR):
+        self.trash_dir = trash_dir
+        self.lock = Lock()
+        self.queue = Queue()
+        self.progress = {}  # generation -> progress dict
+        self.thread = None
+        os.makedirs(self.trash_dir, exist_ok=True)
+        for generation in sorted(os.listdir(self.trash_dir)):
+            self.enqueue_(generation)
+
+    def enqueue_(self, generation):
+        with self.lock:
+            self.progress[generation] = {'generation': generation, 'state': 'queued', 'total': None,
+                                         'deleted': 0, 'started': None, 'finished': None}
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run_, daemon=True, name="TrashCollector")
+                self.thread.start()
+        self.queue.put(generation)
+
+    def discard(self, folders):
+        """Move the folders into a new trash generation and recreate them empty, returns the generation."""
+        generation = time.strftime('%Y%m%d-%H%M%S') + f'-{time.time_ns() % 1000000:06d}'
+        destination = os.path.join(self.trash_dir, generation)
+        os.makedirs(destination)
+        for index, folder in enumerate(folders):
+            if os.path.exists(folder):
+                # Prefixed with the index in case two folders share a name
+                os.replace(folder, os.path.join(destination, f'{index}-{os.path.basename(os.path.normpath(folder))}'))
+            os.makedirs(folder, exist_ok=True)
+        self.enqueue_(generation)
+        return generation
+
+    def run_(self):
+        while True:
+            generation = self.queue.get()
+            try:
+                self.reclaim_(generation)
+            except Exception as e:
+                print(f"Error deleting trash generation {generation}: {e}")
+                self.update_(generation, state='failed', error=str(e))
+            finally:
+                self.queue.task_done()
+
+    def reclaim_(self, generation):
+        """Delete every file of a generation, then the generation folder itself."""
+        root = os.path.join(self.trash_dir, generation)
+        files = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+        self.update_(generation, state='deleting', total=len(files), started=time.time())
+
+        deleted = 0
+        for path in files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            deleted += 1
+            if deleted % PROGRESS_EVERY == 0:
+                self.update_(generation, deleted=deleted)
+        shutil.rmtree(root, ignore_errors=True)
+        self.update_(generation, state='done', deleted=deleted, finished=time.time())
+
+    def update_(self, generation, **changes):
+        with self.lock:
+            self.progress[generation].update(changes)
+
+    def status(self):
+        """Return the progress of every generation seen since startup, oldest first."""
+        with self.lock:
+            generations = [dict(progress) for progress in self.progress.values()]
+        return {
+            'busy': any(progress['state'] in ('queued', 'deleting') for progress in generations),
+            'generations': generations,
+        }
+
+
+# Process-wide trash collector shared by the Flask endpoints
+trash_collector = TrashCollector()
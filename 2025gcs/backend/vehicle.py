@@ -0,0 +1,129 @@
+import json
+import time
+import requests
+from threading import Lock
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 2  # seconds to open a connection to the vehicle
+DEFAULT_TIMEOUT = 5  # seconds to wait for a response
+POOL_SIZE = 8  # keep-alive connections kept open to the vehicle
+MAX_RETRIES = 2  # retries for idempotent calls after the first attempt
+RETRY_BACKOFF = 0.25  # seconds, doubled after every failed attempt
+RETRY_STATUSES = (502, 503, 504)
+BREAKER_THRESHOLD = 3  # consecutive link failures before calls fail fast
+BREAKER_COOLDOWN = 5  # seconds before a failed link is tried again
+
+# Response timeouts for vehicle endpoints that differ from DEFAULT_TIMEOUT
+ENDPOINT_TIMEOUTS = {
+    'heartbeat-validate': 2,
+    'payload_drop_mission': 10,
+    'monitor_mission_and_drop': 10,
+}
+
+# Endpoints that are safe to repeat, every other call is sent exactly once
+IDEMPOTENT_ENDPOINTS = {
+    'heartbeat-validate',
+    'payload_open',
+    'payload_close',
+    'payload_open_all',
+    'payload_close_all',
+    'payload_drop_mission',
+    'set_flight_mode',
+}
+
+
+class VehicleUnavailable(requests.exceptions.ConnectionError):
+    """Raised without contacting the vehicle while the circuit breaker is open."""
+
+
+class VehicleClient:
+    """
+    Shared client for the vehicle API over a pooled keep-alive requests.Session.
+
+    Idempotent endpoints are retried with exponential backoff on connection errors, timeouts and gateway
+    errors. After BREAKER_THRESHOLD consecutive link failures the breaker opens and calls raise
+    VehicleUnavailable until BREAKER_COOLDOWN has passed, then a single call is let through to test the link.
+    Probe calls (the heartbeat poller) always go through, so the breaker closes as soon as the link is back.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", "Host": "localhost"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0  # time.monotonic() until which the breaker stays open
+
+    # ========================= Circuit breaker =========================
+    def allow_(self):
+        with self.lock:
+            if self.consecutive_failures < BREAKER_THRESHOLD:
+                return True
+            now = time.monotonic()
+            if now < self.open_until:
+                return False
+            # Half open: let this call test the link and hold everyone else off for another cooldown
+            self.open_until = now + BREAKER_COOLDOWN
+            return True
+
+    def record_(self, success):
+        with self.lock:
+            if success:
+                self.consecutive_failures = 0
+                self.open_until = 0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= BREAKER_THRESHOLD:
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def state(self):
+        """Return 'closed' while the link is healthy, 'open' while calls fail fast."""
+        with self.lock:
+            if self.consecutive_failures < BREAKER_THRESHOLD:
+                return 'closed'
+            return 'open' if time.monotonic() < self.open_until else 'half-open'
+
+    # ========================= Requests =========================
+    def request(self, method, endpoint, payload=None, timeout=None, idempotent=None, probe=False):
+        """
+        Send a request to a vehicle endpoint and return the response, raising for HTTP errors.
+
+        payload is sent as JSON. timeout defaults to the endpoint's entry in ENDPOINT_TIMEOUTS, idempotent to
+        its membership of IDEMPOTENT_ENDPOINTS. Raises requests.exceptions.RequestException on failure.
+        """
+        if timeout is None:
+            timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        if idempotent is None:
+            idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+        data = json.dumps(payload) if payload is not None else None
+        attempts = MAX_RETRIES + 1 if idempotent else 1
+        backoff = RETRY_BACKOFF
+
+        for attempt in range(attempts):
+            if not probe and not self.allow_():
+                raise VehicleUnavailable(f"Vehicle link is down, not sending {endpoint}")
+            try:
+                response = self.session.request(method, self.base_url + endpoint, data=data,
+                                                timeout=(CONNECT_TIMEOUT, timeout))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.record_(False)
+                if attempt == attempts - 1:
+                    raise
+            else:
+                # Any response means the link is up, even if the vehicle rejected the call
+                self.record_(True)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    response.raise_for_status()
+                    return response
+            time.sleep(backoff)
+            backoff *= 2
+
+    def get(self, endpoint, **kwargs):
+        return self.request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint, payload=None, **kwargs):
+        return self.request('POST', endpoint, payload=payload, **kwargs)
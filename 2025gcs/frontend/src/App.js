@@ -5,13 +5,22 @@ import Home from "./Components/Home/Home";
 import DataPage from "./Components/Data/DataPage";
 import { ENDPOINT_IP } from "./config";
 import axios from 'axios';
+import { subscribe, isStreamConnected } from "./utils/stream";
 
 function App() {
   const [bgColor, setBgColor] = useState("#FF7F7F");    // State for background color
   const [vehicleData, setVehicleData] = useState(null); // store the heartbeat vehicle data
 
   useEffect(() => {
+    // Telemetry is pushed over the event stream, only changed values are sent
+    const unsubscribe = subscribe("telemetry", (data) => {
+      setBgColor(data.connected ? "#90EE90" : "#FF7F7F");
+      setVehicleData((previous) => ({ ...previous, ...data.vehicle_data }));
+    });
+
+    // Fall back to polling while the stream is down
     const checkHeartbeat = async () => {
+      if (isStreamConnected()) return;
       try {
         const response = await axios.get(`http://${ENDPOINT_IP}/get_heartbeat`);
         const data = response.data;
@@ -30,7 +39,10 @@ function App() {
       }
     };
     const intervalId = setInterval(checkHeartbeat, 1000);
-    return () => clearInterval(intervalId);
+    return () => {
+      clearInterval(intervalId);
+      unsubscribe();
+    };
   }, []);
 
   return (
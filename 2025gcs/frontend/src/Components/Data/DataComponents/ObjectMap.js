@@ -5,6 +5,9 @@ import 'leaflet/dist/leaflet.css';
 import axios from "axios";
 import { ENDPOINT_IP } from "../../../config";
 import { calculateDistance, outlierSeverity, computeMedian } from '../../../utils/common.js';
+import { subscribe } from '../../../utils/stream.js';
+
+const REFETCH_DELAY = 500; // ms without detection events before the detections are refetched
 
 const getOutlierColor = (severity) => {
     switch (severity) {
@@ -238,6 +241,23 @@ const MapComponent = () => {
 
     useEffect(() => {
         fetchData();
+        // Refetch when detections, targets or the active session change on the backend. A batch of frames sends
+        // one detections event per detection, so bursts are collapsed into a single refetch
+        let timeoutId = null;
+        const scheduleFetch = () => {
+            clearTimeout(timeoutId);
+            timeoutId = setTimeout(fetchData, REFETCH_DELAY);
+        };
+        const unsubscribes = [
+            subscribe("detections", scheduleFetch),
+            subscribe("targets", scheduleFetch),
+            subscribe("session", fetchData),
+            subscribe("reset", fetchData), // this client missed events the backend could not replay
+        ];
+        return () => {
+            clearTimeout(timeoutId);
+            unsubscribes.forEach((unsubscribe) => unsubscribe());
+        };
     }, [showCompleted]);
 
     const defaultCenter = [50.976600, -114.071400];     // (Calgary)(for testing)
@@ -1,7 +1,8 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import { ENDPOINT_IP } from "../../../config";
 import { objectList } from "../../../utils/common";
+import { subscribe, isStreamConnected } from "../../../utils/stream";
 
 const PhotoPanel = () => {
   const visibleImagesCount = 10;
@@ -9,6 +10,9 @@ const PhotoPanel = () => {
   const [visiblePhotos, setVisiblePhotos] = useState([]);
   const [currentStartIndex, setCurrentStartIndex] = useState(0);
   const [mainPhoto, setMainPhoto] = useState(null);
+  const [session, setSession] = useState(null); // session the photos belong to, image names restart in every session
+  const sessionRef = useRef(null); // the same, for the stream handlers
+  const [versions, setVersions] = useState({}); // image name -> mtime, changes whenever the file is replaced
   const [isCameraOn, setIsCameraOn] = useState(false);
   const [selectedPoint, setSelectedPoint] = useState(null);
   const [selectedSaveObject, setSelectedSaveObject] = useState(""); // for Save dropdown
@@ -29,33 +33,72 @@ const PhotoPanel = () => {
   useEffect(() => {
     const fetchImages = async () => {
       try {
-        const response = await axios.get(`http://${ENDPOINT_IP}/getImages`);
+        const response = await axios.get(`http://${ENDPOINT_IP}/getImages?details=1`);
         if (response.data.success) {
-          const loadedPhotos = response.data.images;
-          setPhotos(loadedPhotos);
-          setVisiblePhotos(
-            loadedPhotos.slice(
-              currentStartIndex,
-              currentStartIndex + visibleImagesCount
-            )
-          ); // Preserve current start index
-          if (!mainPhoto) {
-            setMainPhoto(loadedPhotos[0]);
-          }
+          sessionRef.current = response.data.session;
+          setSession(response.data.session);
+          setVersions(Object.fromEntries(response.data.images.map((entry) => [entry.image, entry.mtime])));
+          setPhotos(response.data.images.map((entry) => entry.image));
         }
       } catch (error) {}
     };
+    // Apply the names the backend announces instead of refetching the whole list for every frame
+    const isOtherSession = (data) => sessionRef.current && data.session !== sessionRef.current;
+    const addImage = (data) => {
+      if (isOtherSession(data)) return;
+      const { name } = data;
+      setVersions((current) => ({ ...current, [name]: data.mtime }));
+      setPhotos((current) => {
+        if (current.includes(name)) return current;
+        const index = current.findIndex((photo) => photo > name); // same order as /getImages
+        return index === -1 ? [...current, name] : [...current.slice(0, index), name, ...current.slice(index)];
+      });
+    };
+    const removeImages = (data) => {
+      if (isOtherSession(data)) return;
+      setPhotos((current) => (data.all ? [] : current.filter((photo) => !data.names.includes(photo))));
+    };
 
     fetchImages();
-    const intervalId = setInterval(fetchImages, 10000); // Fetch images every 10 seconds
-    return () => clearInterval(intervalId);
-  }, [mainPhoto, currentStartIndex]);
+    const unsubscribes = [
+      subscribe("image", addImage),
+      subscribe("images_deleted", removeImages),
+      // A new session, or the backend could not replay the events this client missed: fetch the full list
+      subscribe("session", fetchImages),
+      subscribe("reset", fetchImages),
+    ];
+    const intervalId = setInterval(() => {
+      if (!isStreamConnected()) fetchImages();
+    }, 10000); // Fall back to fetching images every 10 seconds while the stream is down
+    return () => {
+      clearInterval(intervalId);
+      unsubscribes.forEach((unsubscribe) => unsubscribe());
+    };
+  }, []);
+
+  useEffect(() => {
+    // Keep the thumbnail bar and main photo in step with the list, preserving the current start index
+    setVisiblePhotos(photos.slice(currentStartIndex, currentStartIndex + visibleImagesCount));
+    if (!mainPhoto || !photos.includes(mainPhoto)) {
+      setMainPhoto(photos[0] || null);
+    }
+  }, [photos, currentStartIndex]);
 
   useEffect(() => {
     // Reset selected point when main photo changes
     setSelectedPoint(null);
   }, [mainPhoto]);
 
+  // The session and the file's mtime are part of every image URL, so the browser never mixes up same-named
+  // frames of two flights or a replaced frame, and the backend lets it cache each URL without revalidating
+  const imageUrl = (photo, size) => {
+    const params = new URLSearchParams();
+    if (session) params.set("session", session);
+    if (versions[photo] != null) params.set("v", versions[photo]);
+    if (size) params.set("size", size);
+    return `http://${ENDPOINT_IP}/images/${photo}?${params}`;
+  };
+
   const handleJumpToImage = () => {
     const imageNumber = imageNumberInput.trim();
     if (!imageNumber) {
@@ -370,7 +413,7 @@ const PhotoPanel = () => {
             {mainPhoto ? (
               <>
                 <img
-                  src={`http://${ENDPOINT_IP}/images/${mainPhoto}`}
+                  src={imageUrl(mainPhoto)}
                   alt={mainPhoto}
                   className="object-fit w-full h-full"
                   onClick={handleImageClick}
@@ -417,7 +460,7 @@ const PhotoPanel = () => {
                   }`}
                 >
                   <img
-                    src={`http://${ENDPOINT_IP}/images/${photo}`}
+                    src={imageUrl(photo, "thumb")}
                     alt={photo}
                     className="w-16 h-16 object-cover rounded"
                   />
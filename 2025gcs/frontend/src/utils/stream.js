@@ -0,0 +1,49 @@
+import { ENDPOINT_IP } from "../config";
+
+// Shared Server-Sent Events connection to the backend /stream endpoint.
+// Components subscribe to event types and keep their polling as a fallback while the stream is down.
+let source = null;
+let connected = false;
+const handlers = {};        // event type -> Set of handlers
+const attached = new Set(); // event types with a listener on the current EventSource
+const RETRY_DELAY = 5000;   // ms before reopening a stream the server refused, e.g. 503 when too many are open
+
+const dispatch = (type) => (event) => {
+    const data = JSON.parse(event.data);
+    (handlers[type] || []).forEach((handler) => handler(data));
+};
+
+const connect = () => {
+    if (source || typeof EventSource === "undefined") return;
+    const current = new EventSource(`http://${ENDPOINT_IP}/stream`);
+    source = current;
+    source.onopen = () => { connected = true; };
+    source.onerror = () => {
+        connected = false;
+        // EventSource reconnects by itself with Last-Event-ID, unless the server refused the stream
+        if (current.readyState === EventSource.CLOSED) {
+            source = null;
+            setTimeout(connect, RETRY_DELAY);
+        }
+    };
+    attached.clear();
+    Object.keys(handlers).forEach((type) => {
+        source.addEventListener(type, dispatch(type));
+        attached.add(type);
+    });
+};
+
+// Subscribe to an event type, returns a function that unsubscribes
+export const subscribe = (type, handler) => {
+    if (!handlers[type]) handlers[type] = new Set();
+    handlers[type].add(handler);
+    connect();
+    if (source && !attached.has(type)) {
+        source.addEventListener(type, dispatch(type));
+        attached.add(type);
+    }
+    return () => handlers[type].delete(handler);
+};
+
+// True while the stream is open, components skip their fallback polls
+export const isStreamConnected = () => connected;